@@ -0,0 +1,110 @@
+"""
+Cold-start benchmark for cli-mcp-server.
+
+Launches the server over stdio the way MCP clients do and measures the time from
+process spawn to the `initialize` response, and to the first `tools/list`
+response (which includes building the executors).
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs N] [--allowed-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+INITIALIZE = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2025-06-18",
+        "capabilities": {},
+        "clientInfo": {"name": "bench-cold-start", "version": "1.0"},
+    },
+}
+INITIALIZED = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+LIST_TOOLS = {"jsonrpc": "2.0", "id": 2, "method": "tools/list"}
+
+SERVER_COMMAND = [
+    sys.executable,
+    "-c",
+    "import cli_mcp_server; cli_mcp_server.main()",
+]
+
+
+def _send(process: subprocess.Popen, message: dict) -> None:
+    process.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+    process.stdin.flush()
+
+
+def _receive(process: subprocess.Popen, request_id: int) -> dict:
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("Server exited before responding")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+
+
+def measure_once(env: dict) -> tuple[float, float]:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        SERVER_COMMAND,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=env,
+    )
+    try:
+        _send(process, INITIALIZE)
+        _receive(process, 1)
+        initialized = time.perf_counter() - started
+        _send(process, INITIALIZED)
+        _send(process, LIST_TOOLS)
+        _receive(process, 2)
+        first_list = time.perf_counter() - started
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return initialized, first_list
+
+
+def _summary(values: list) -> str:
+    ordered = sorted(values)
+    p95 = ordered[max(0, round(0.95 * len(ordered)) - 1)]
+    return (
+        f"min {ordered[0] * 1000:7.1f} ms  median {statistics.median(ordered) * 1000:7.1f} ms"
+        f"  p95 {p95 * 1000:7.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--allowed-dir", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        env = dict(os.environ, ALLOWED_DIR=args.allowed_dir or tempdir)
+        # Warm the OS page cache and bytecode caches so runs are comparable
+        measure_once(env)
+        results = [measure_once(env) for _ in range(args.runs)]
+
+    print(f"cold start over {args.runs} runs")
+    print(f"  initialize response: {_summary([r[0] for r in results])}")
+    print(f"  first tools/list:    {_summary([r[1] for r in results])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Process spawn benchmark for cli-mcp-server.
+
+Runs a trivial command through CommandExecutor.execute with each spawn backend
+while the server process holds a growing heap, and measures the time per
+command. Starting commands from a large process can slow down as the heap grows
+(when the platform forks and copies page tables); the forkserver backend starts
+commands from a small helper process instead.
+
+Usage:
+    python benchmarks/bench_spawn.py [--runs N] [--heap-mb 0,512,2048] [--command CMD]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cli_mcp_server.server import build_executor  # noqa: E402
+from cli_mcp_server.spawn import SPAWN_BACKENDS  # noqa: E402
+
+
+def measure(executor, command: str, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        executor.execute(command)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(values: list) -> str:
+    ordered = sorted(values)
+    p95 = ordered[max(0, round(0.95 * len(ordered)) - 1)]
+    return (
+        f"min {ordered[0] * 1000:7.2f} ms  median {statistics.median(ordered) * 1000:7.2f} ms"
+        f"  p95 {p95 * 1000:7.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--heap-mb", default="0,512,2048", help="Comma-separated heap sizes to test")
+    parser.add_argument("--command", default="true")
+    args = parser.parse_args()
+
+    heap_sizes = [int(size) for size in args.heap_mb.split(",")]
+    ballast = []
+    with tempfile.TemporaryDirectory() as tempdir:
+        env = dict(os.environ, ALLOWED_DIR=tempdir, ALLOWED_COMMANDS=args.command.split()[0])
+        env.pop("EXECUTOR_SOCKET", None)
+        executors = {backend: build_executor(dict(env, SPAWN_BACKEND=backend)) for backend in SPAWN_BACKENDS}
+        for executor in executors.values():
+            measure(executor, args.command, 5)
+
+        for heap_mb in sorted(heap_sizes):
+            # Touch every page so the heap is resident, like a long-running server's
+            missing = heap_mb - len(ballast)
+            ballast.extend(bytearray(b"x" * (1024 * 1024)) for _ in range(max(0, missing)))
+            print(f"heap {heap_mb} MB, {args.runs} runs of {args.command!r}")
+            for backend, executor in executors.items():
+                print(f"  {backend:<11} {_summary(measure(executor, args.command, args.runs))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,77 @@
+import argparse
 import asyncio
+import importlib
+import logging
+import sys
+import time
 
-from . import server
+
+def _startup_profile() -> None:
+    """Reports how long each startup phase takes, to stderr."""
+    phases = []
+    started = time.perf_counter()
+
+    def phase(name: str, func) -> None:
+        phase_started = time.perf_counter()
+        func()
+        phases.append((name, time.perf_counter() - phase_started))
+
+    phase("import mcp", lambda: importlib.import_module("mcp.server"))
+    phase("import mcp stdio transport", lambda: importlib.import_module("mcp.server.stdio"))
+    phase("import cli_mcp_server.server", lambda: importlib.import_module("cli_mcp_server.server"))
+    server = sys.modules["cli_mcp_server.server"]
+    phase("build executors", server.get_executors)
+    phase("list tools", lambda: asyncio.run(server.handle_list_tools()))
+    total = time.perf_counter() - started
+
+    print("Startup profile:", file=sys.stderr)
+    for name, seconds in phases:
+        print(f"  {name:<32} {seconds * 1000:8.1f} ms", file=sys.stderr)
+    print(f"  {'total':<32} {total * 1000:8.1f} ms", file=sys.stderr)
 
 
 def main():
     """Main entry point for the package."""
+    parser = argparse.ArgumentParser(prog="cli-mcp-server")
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="report import and initialization times to stderr and exit",
+    )
+    parser.add_argument(
+        "--executor-daemon",
+        action="store_true",
+        help="run the shared executor daemon instead of an MCP server",
+    )
+    parser.add_argument(
+        "--socket",
+        help="socket the executor daemon listens on (default: EXECUTOR_SOCKET)",
+    )
+    args = parser.parse_args()
+    if args.startup_profile:
+        _startup_profile()
+        return
+    if args.executor_daemon:
+        from . import daemon
+
+        logging.basicConfig(level=logging.INFO)
+        try:
+            asyncio.run(daemon.main(args.socket))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    # Imported here so that `import cli_mcp_server` stays cheap
+    from . import server
+
     asyncio.run(server.main())
 
 
+def __getattr__(name):
+    if name == "server":
+        return importlib.import_module(".server", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # Optionally expose other important items at package level
 __all__ = ["main", "server"]
@@ -0,0 +1,347 @@
+import os
+import secrets
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import IO, Dict, List, Optional
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# Archives are kept in memory up to this size and spill to a temporary file beyond it
+_SPOOL_SIZE = 8 * 1024 * 1024
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class ArchiveError(ValueError):
+    """An archive is invalid or a member would be extracted outside the allowed directory"""
+
+    pass
+
+
+def _zstd_open(fileobj: IO[bytes], mode: str) -> IO[bytes]:
+    try:
+        from compression import zstd  # Python 3.14+
+
+        return zstd.ZstdFile(fileobj, mode)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ArchiveError("zstd compression requires Python 3.14+ or the zstandard package")
+    if mode == "w":
+        return zstandard.ZstdCompressor().stream_writer(fileobj, closefd=False)
+    return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+
+
+class _LimitedWriter:
+    """Passes writes through to a file, failing once more than ``max_bytes`` would be written."""
+
+    def __init__(self, fileobj: IO[bytes], max_bytes: int):
+        self.fileobj = fileobj
+        self.max_bytes = max_bytes
+        self.written = 0
+
+    def write(self, data: bytes) -> int:
+        if self.written + len(data) > self.max_bytes:
+            raise ArchiveError(f"Archive exceeds the maximum size of {self.max_bytes} bytes")
+        self.written += len(data)
+        return self.fileobj.write(data)
+
+    def flush(self) -> None:
+        self.fileobj.flush()
+
+    def tell(self) -> int:
+        return self.written
+
+    def writable(self) -> bool:
+        return True
+
+
+def _contained(path: str, root: str) -> bool:
+    real_path = os.path.realpath(path)
+    return real_path == root or real_path.startswith(root + os.sep)
+
+
+@dataclass
+class Transfer:
+    """An archive being sent to or received from a client, spooled to a temporary file"""
+
+    file: IO[bytes]
+    size: int = 0
+    compression: str = "none"
+    destination: Optional[str] = None
+    updated_at: float = field(default_factory=time.monotonic)
+    # Serializes the seek and the read or write that follows it
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def build_archive(
+    paths: List[str], root: str, compression: str = "none", max_bytes: int = 1024 * 1024 * 1024
+) -> Transfer:
+    """
+    Writes a tar archive of ``paths`` into a spooled temporary file.
+
+    Members are named relative to ``root`` and symlinks are stored, not followed.
+    The archive is written as a stream, so files are never held in memory whole,
+    and writing stops as soon as it would exceed ``max_bytes``.
+
+    Args:
+        paths (List[str]): Files and directories to archive, already validated by the caller.
+        root (str): Directory that member names are relative to.
+        compression (str): One of ``COMPRESSIONS``.
+        max_bytes (int): Maximum size of the archive.
+
+    Raises:
+        ArchiveError: If the compression is unknown or the archive is too large.
+        OSError: If a file cannot be read.
+    """
+    if compression not in COMPRESSIONS:
+        raise ArchiveError(f"Invalid compression '{compression}'. Use one of: {', '.join(COMPRESSIONS)}")
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+    try:
+        limited = _LimitedWriter(spool, max_bytes)
+        stream = _zstd_open(limited, "w") if compression == "zstd" else limited
+        with tarfile.open(fileobj=stream, mode="w|gz" if compression == "gzip" else "w|") as tar:
+            for path in paths:
+                arcname = os.path.relpath(path, root)
+                tar.add(path, arcname=arcname if arcname != "." else os.path.basename(root))
+        if stream is not limited:
+            stream.close()
+        size = spool.tell()
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return Transfer(file=spool, size=size, compression=compression)
+
+
+def _makedirs(path: str, created: List[str]) -> None:
+    """Creates ``path`` and its missing parents, recording each directory created."""
+    missing = []
+    while not os.path.lexists(path):
+        missing.append(path)
+        path = os.path.dirname(path)
+    for directory in reversed(missing):
+        os.mkdir(directory)
+        created.append(directory)
+
+
+def _remove(created: List[str]) -> None:
+    """Removes what an extraction created, newest first."""
+    for path in reversed(created):
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                os.rmdir(path)
+            else:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def extract_archive(fileobj: IO[bytes], destination: str, root: str, max_bytes: int) -> List[str]:
+    """
+    Extracts a tar archive, optionally gzip or zstd compressed, member by member.
+
+    Every member is checked before it is written: its resolved path, and the
+    target of links, must stay inside ``root``. Symlink targets may not contain
+    ``..``, and once every member is written each extracted symlink is resolved
+    again, since a later member can change what an earlier link points to.
+    Devices and FIFOs are rejected, and setuid, setgid and sticky bits are
+    dropped.
+
+    If any member is rejected or fails, the files, links and directories the
+    extraction created are removed again. Existing files that were overwritten
+    before the failure are not restored.
+
+    Args:
+        fileobj (IO[bytes]): The archive, positioned at its start.
+        destination (str): Directory to extract into, inside ``root``.
+        root (str): The allowed directory.
+        max_bytes (int): Maximum total size of the extracted files.
+
+    Returns:
+        List[str]: Names of the extracted members.
+
+    Raises:
+        ArchiveError: If the archive is invalid, too large, or a member escapes ``root``.
+        OSError: If a member cannot be written.
+    """
+    magic = fileobj.read(4)
+    fileobj.seek(0)
+    stream = _zstd_open(fileobj, "r") if magic == _ZSTD_MAGIC else fileobj
+    extracted = []
+    created: List[str] = []
+    symlinks: Dict[str, str] = {}
+    total = 0
+    try:
+        with tarfile.open(fileobj=stream, mode="r|*") as tar:
+            for member in tar:
+                name = member.name.lstrip("/")
+                if os.path.isabs(member.name) or ".." in name.split("/"):
+                    raise ArchiveError(f"Member '{member.name}' has an unsafe path")
+                target = os.path.join(destination, name)
+                if not _contained(target, root):
+                    raise ArchiveError(f"Member '{member.name}' would be extracted outside of {root}")
+                if member.issym():
+                    link_target = os.path.join(os.path.dirname(target), member.linkname)
+                    if (
+                        os.path.isabs(member.linkname)
+                        or ".." in member.linkname.split("/")
+                        or not _contained(link_target, root)
+                    ):
+                        raise ArchiveError(f"Symlink '{member.name}' points outside of {root}")
+                elif member.islnk():
+                    link_target = os.path.join(destination, member.linkname)
+                    if ".." in member.linkname.split("/") or not _contained(link_target, root):
+                        raise ArchiveError(f"Hard link '{member.name}' points outside of {root}")
+                elif not (member.isfile() or member.isdir()):
+                    raise ArchiveError(f"Member '{member.name}' is not a file, directory or link")
+
+                total += member.size
+                if total > max_bytes:
+                    raise ArchiveError(f"Archive contents exceed the maximum size of {max_bytes} bytes")
+
+                if member.isdir():
+                    _makedirs(target, created)
+                    os.chmod(target, member.mode & 0o777 | 0o700)
+                else:
+                    _makedirs(os.path.dirname(target), created)
+                    existed = os.path.lexists(target)
+                    if existed and not os.path.isdir(target):
+                        os.unlink(target)
+                    if member.issym():
+                        os.symlink(member.linkname, target)
+                        symlinks[target] = member.name
+                    elif member.islnk():
+                        os.link(link_target, target)
+                    else:
+                        source = tar.extractfile(member)
+                        with open(target, "wb") as f:
+                            if not existed:
+                                created.append(target)
+                            shutil.copyfileobj(source, f, _COPY_BUFFER_SIZE)
+                        os.chmod(target, member.mode & 0o777)
+                        os.utime(target, (member.mtime, member.mtime))
+                    if not existed and not member.isfile():
+                        created.append(target)
+                extracted.append(name)
+        for path, member_name in symlinks.items():
+            if not _contained(path, root):
+                raise ArchiveError(f"Symlink '{member_name}' points outside of {root}")
+    except BaseException as e:
+        # Extracted symlinks go even where they replaced a file, so none can be left escaping
+        _remove(created + [path for path in symlinks if path not in created])
+        if isinstance(e, tarfile.TarError):
+            raise ArchiveError(f"Invalid archive: {e}")
+        raise
+    finally:
+        if stream is not fileobj:
+            stream.close()
+    return extracted
+
+
+class ArchiveTransfers:
+    """
+    Archives being downloaded or uploaded in chunks, by transfer id.
+
+    Transfers that see no chunk for ``idle_timeout`` seconds are discarded.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 1024 * 1024 * 1024,
+        chunk_bytes: int = 4 * 1024 * 1024,
+        idle_timeout: float = 600.0,
+    ):
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._transfers: Dict[str, Transfer] = {}
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                transfer_id
+                for transfer_id, transfer in self._transfers.items()
+                if now - transfer.updated_at > self.idle_timeout
+            ]
+            transfers = [self._transfers.pop(transfer_id) for transfer_id in expired]
+        for transfer in transfers:
+            transfer.file.close()
+
+    def add(self, transfer: Transfer) -> str:
+        self._expire()
+        transfer_id = secrets.token_hex(8)
+        with self._lock:
+            self._transfers[transfer_id] = transfer
+        return transfer_id
+
+    def get(self, transfer_id: str) -> Transfer:
+        self._expire()
+        with self._lock:
+            transfer = self._transfers.get(transfer_id)
+        if transfer is None:
+            raise ArchiveError(f"Unknown or expired archive id '{transfer_id}'")
+        transfer.updated_at = time.monotonic()
+        return transfer
+
+    def discard(self, transfer_id: str) -> None:
+        with self._lock:
+            transfer = self._transfers.pop(transfer_id, None)
+        if transfer is not None:
+            transfer.file.close()
+
+    def read_chunk(self, transfer_id: str, offset: int) -> bytes:
+        """Reads a chunk of an outgoing archive, discarding it once the end has been read."""
+        transfer = self.get(transfer_id)
+        with transfer.lock:
+            transfer.file.seek(offset)
+            data = transfer.file.read(self.chunk_bytes)
+        if offset + len(data) >= transfer.size:
+            self.discard(transfer_id)
+        return data
+
+    def start_upload(self, destination: str) -> str:
+        return self.add(
+            Transfer(file=tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE), destination=destination)
+        )
+
+    def append(self, transfer_id: str, data: bytes) -> Transfer:
+        """Appends a chunk to an incoming archive."""
+        transfer = self.get(transfer_id)
+        with transfer.lock:
+            if transfer.size + len(data) > self.max_bytes:
+                self.discard(transfer_id)
+                raise ArchiveError(f"Archive exceeds the maximum size of {self.max_bytes} bytes")
+            transfer.file.seek(0, os.SEEK_END)
+            transfer.file.write(data)
+            transfer.size += len(data)
+        return transfer
+
+    def close(self) -> None:
+        with self._lock:
+            transfers, self._transfers = list(self._transfers.values()), {}
+        for transfer in transfers:
+            transfer.file.close()
+
+
+def load_archive_transfers() -> ArchiveTransfers:
+    """
+    Configures archive transfers from environment variables.
+
+    Environment Variables:
+        ARCHIVE_MAX_BYTES: Maximum size of an archive, and of the files extracted
+                           from one (default: 1073741824)
+        ARCHIVE_CHUNK_BYTES: Archive bytes sent per export_archive call (default: 4194304)
+    """
+    return ArchiveTransfers(
+        max_bytes=int(os.getenv("ARCHIVE_MAX_BYTES", str(1024 * 1024 * 1024))),
+        chunk_bytes=int(os.getenv("ARCHIVE_CHUNK_BYTES", str(4 * 1024 * 1024))),
+    )
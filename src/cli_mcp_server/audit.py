@@ -0,0 +1,72 @@
+import os
+from typing import Any, Dict, Optional
+
+from .logwriter import BackgroundLogWriter
+from .recorder import CallRecord
+
+
+class AuditLog:
+    """
+    Audit trail of executed and rejected commands.
+
+    Each entry holds the command string, the argv that was actually run, the
+    working directory, duration, exit code and, for rejected commands, the
+    reason. Entries are handed to a ``BackgroundLogWriter`` that batches fsyncs
+    and rotates by size; when its queue is full the writer's overflow policy
+    decides whether the request waits for room or the entry is dropped and
+    counted.
+    """
+
+    def __init__(self, writer: BackgroundLogWriter):
+        self.writer = writer
+
+    @property
+    def dropped(self) -> int:
+        return self.writer.dropped
+
+    def entry(self, call: CallRecord) -> Dict[str, Any]:
+        return {
+            "ts": call.started_at,
+            "profile": call.profile,
+            "command": call.arguments.get("command"),
+            "argv": call.argv,
+            "cwd": call.cwd,
+            "duration_ms": round(call.duration_ms, 3),
+            "exit_code": call.returncode,
+            "outcome": call.outcome,
+            "rejection_reason": call.error if call.outcome == "rejected" else None,
+            "error": call.error if call.outcome != "rejected" else None,
+        }
+
+    async def record(self, call: CallRecord) -> bool:
+        return await self.writer.put(self.entry(call))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def load_audit_log() -> Optional[AuditLog]:
+    """
+    Creates the audit log from environment variables.
+
+    Environment Variables:
+        AUDIT_LOG_FILE: Path of the audit log; auditing is disabled when unset
+        AUDIT_LOG_MAX_BYTES: Size at which the log is rotated (default: 52428800)
+        AUDIT_LOG_BACKUP_COUNT: Number of rotated logs to keep (default: 10)
+        AUDIT_LOG_FLUSH_INTERVAL: Seconds between batched fsyncs (default: 1.0)
+        AUDIT_LOG_QUEUE_SIZE: Maximum number of entries waiting to be written (default: 10000)
+        AUDIT_LOG_OVERFLOW: What to do when the queue is full, 'block' or 'drop' (default: block)
+    """
+    path = os.getenv("AUDIT_LOG_FILE")
+    if not path:
+        return None
+    writer = BackgroundLogWriter(
+        path,
+        max_bytes=int(os.getenv("AUDIT_LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+        backup_count=int(os.getenv("AUDIT_LOG_BACKUP_COUNT", "10")),
+        flush_interval=float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", "1.0")),
+        queue_size=int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "10000")),
+        fsync=True,
+        overflow=os.getenv("AUDIT_LOG_OVERFLOW", "block").lower(),
+    )
+    return AuditLog(writer)
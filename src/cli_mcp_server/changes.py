@@ -0,0 +1,243 @@
+import asyncio
+import fnmatch
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .watcher import InotifyWatcher, WatchEvent
+
+CHANGE_KINDS = ("created", "modified", "deleted")
+
+# (mtime_ns, size) of each matching entry
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def _snapshot(directory: str, matches: Callable[[str], bool], target: Optional[str] = None) -> Snapshot:
+    """Stats ``target``, or the entries of ``directory`` accepted by ``matches``."""
+    if target is not None:
+        try:
+            st = os.stat(target)
+        except OSError:
+            return {}
+        return {target: (st.st_mtime_ns, st.st_size)}
+    snapshot = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not matches(entry.path):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        pass
+    return snapshot
+
+
+def _diff(before: Snapshot, after: Snapshot) -> List[WatchEvent]:
+    changes = [WatchEvent(path=path, kind="deleted") for path in before if path not in after]
+    for path, signature in after.items():
+        if path not in before:
+            changes.append(WatchEvent(path=path, kind="created"))
+        elif before[path] != signature:
+            changes.append(WatchEvent(path=path, kind="modified"))
+    return changes
+
+
+@dataclass
+class _Waiter:
+    directory: str
+    matches: Callable[[str], bool]
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+
+
+class ChangeWaiters:
+    """
+    Lets callers wait for changes to files without polling.
+
+    There is a single subscription to the shared inotify watcher; waiters are
+    indexed by the directory they watch, so an event costs a dictionary lookup
+    however many waiters there are, and waiters on the same directory share one
+    inotify watch. Events are handed to the waiting coroutine through its
+    event loop. Without inotify, or when a watch cannot be added, the waiter
+    falls back to comparing snapshots of the directory every ``poll_interval``.
+    """
+
+    def __init__(
+        self,
+        watcher: Optional[InotifyWatcher] = None,
+        max_waiters: int = 256,
+        max_timeout: float = 300.0,
+        poll_interval: float = 0.5,
+    ):
+        self.watcher = watcher
+        self.max_waiters = max_waiters
+        self.max_timeout = max_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, List[_Waiter]] = {}
+        self._count = 0
+        self._unsubscribe = watcher.subscribe(self._on_event) if watcher else None
+
+    @property
+    def waiting(self) -> int:
+        return self._count
+
+    def _on_event(self, event: WatchEvent) -> None:
+        # Runs on the watcher thread
+        with self._lock:
+            if event.kind == "overflow":
+                waiters = [waiter for waiters in self._waiters.values() for waiter in waiters]
+            else:
+                waiters = self._waiters.get(os.path.dirname(event.path), []) + self._waiters.get(event.path, [])
+        for waiter in waiters:
+            if event.kind != "overflow" and not waiter.matches(event.path):
+                continue
+            try:
+                waiter.loop.call_soon_threadsafe(waiter.queue.put_nowait, event)
+            except RuntimeError:
+                # The waiter's event loop has closed
+                pass
+
+    def _register(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if self._count >= self.max_waiters:
+                raise ValueError(f"Too many waiters, at most {self.max_waiters} can wait at once")
+            self._waiters.setdefault(waiter.directory, []).append(waiter)
+            self._count += 1
+
+    def _unregister(self, waiter: _Waiter) -> None:
+        with self._lock:
+            waiters = self._waiters[waiter.directory]
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[waiter.directory]
+            self._count -= 1
+
+    async def wait(
+        self,
+        directory: str,
+        matches: Callable[[str], bool],
+        target: Optional[str] = None,
+        events: Iterable[str] = CHANGE_KINDS,
+        min_size: Optional[int] = None,
+        timeout: float = 30.0,
+    ) -> Dict:
+        """
+        Waits until a matching entry of ``directory`` changes, or ``timeout`` passes.
+
+        With ``min_size``, waits instead until a matching file is at least that
+        large. A wait for ``created`` alone, or for ``min_size``, returns at once
+        if a matching file already qualifies, so there is no race between
+        checking for a file and starting to wait for it.
+
+        Args:
+            directory (str): Directory whose entries are watched, not recursively.
+            matches (Callable[[str], bool]): Accepts the paths of entries to report.
+            target (Optional[str]): The single file waited for, if any.
+            events (Iterable[str]): Kinds of changes to report, from ``CHANGE_KINDS``.
+            min_size (Optional[int]): Size in bytes a matching file must reach.
+            timeout (float): Seconds to wait, capped at ``max_timeout``.
+
+        Returns:
+            Dict: ``changed``, ``timed_out`` and the ``events`` that ended the wait,
+                each with ``path`` and ``kind`` (and ``size`` for ``min_size``).
+
+        Raises:
+            ValueError: If the arguments are invalid or too many callers are waiting.
+        """
+        events = set(events)
+        unknown = events - set(CHANGE_KINDS)
+        if unknown or not events:
+            raise ValueError(f"Invalid events {sorted(unknown)}, expected some of: {', '.join(CHANGE_KINDS)}")
+        if min_size is not None and min_size < 0:
+            raise ValueError(f"Invalid min_size: {min_size}")
+        if not os.path.isdir(directory):
+            raise ValueError(f"Directory does not exist: {directory}")
+        timeout = max(0.0, min(timeout, self.max_timeout))
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(directory=directory, matches=matches, loop=loop)
+        self._register(waiter)
+        watched = False
+        try:
+            # Watch before taking the first snapshot, so no change falls in between
+            watched = self.watcher is not None and await asyncio.to_thread(self.watcher.add, directory)
+            snapshot = await asyncio.to_thread(_snapshot, directory, matches, target)
+
+            def qualifying(snapshot: Snapshot) -> List[Dict]:
+                if min_size is not None:
+                    return [
+                        {"path": path, "kind": "size", "size": size}
+                        for path, (_, size) in sorted(snapshot.items())
+                        if size >= min_size
+                    ]
+                if events == {"created"}:
+                    return [{"path": path, "kind": "exists"} for path in sorted(snapshot)]
+                return []
+
+            found = qualifying(snapshot)
+            deadline = loop.time() + timeout
+            while not found:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return {"changed": False, "timed_out": True, "events": []}
+                if watched:
+                    try:
+                        changes = [await asyncio.wait_for(waiter.queue.get(), remaining)]
+                    except asyncio.TimeoutError:
+                        continue
+                    while not waiter.queue.empty():
+                        changes.append(waiter.queue.get_nowait())
+                else:
+                    await asyncio.sleep(min(self.poll_interval, remaining))
+                    previous, snapshot = snapshot, await asyncio.to_thread(_snapshot, directory, matches, target)
+                    changes = _diff(previous, snapshot)
+                if not changes:
+                    continue
+                if min_size is not None:
+                    if watched:
+                        snapshot = await asyncio.to_thread(_snapshot, directory, matches, target)
+                    found = qualifying(snapshot)
+                else:
+                    found = [
+                        {"path": change.path, "kind": change.kind}
+                        for change in changes
+                        if change.kind == "overflow" or change.kind in events
+                    ]
+            return {"changed": True, "timed_out": False, "events": found}
+        finally:
+            self._unregister(waiter)
+            if watched:
+                self.watcher.remove(directory)
+
+    def close(self) -> None:
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+
+def load_change_waiters(watcher: Optional[InotifyWatcher] = None) -> ChangeWaiters:
+    """
+    Creates the change waiters from environment variables.
+
+    Environment Variables:
+        WAIT_MAX_SECONDS: Longest wait_for_change timeout allowed (default: 300)
+        WAIT_MAX_WAITERS: Calls that may wait at once (default: 256)
+        WAIT_POLL_INTERVAL: Seconds between checks where inotify is unavailable (default: 0.5)
+    """
+    return ChangeWaiters(
+        watcher,
+        max_waiters=int(os.getenv("WAIT_MAX_WAITERS", "256")),
+        max_timeout=float(os.getenv("WAIT_MAX_SECONDS", "300")),
+        poll_interval=float(os.getenv("WAIT_POLL_INTERVAL", "0.5")),
+    )
+
+
+def glob_matcher(pattern: str) -> Callable[[str], bool]:
+    """Matches entry paths whose name matches a glob pattern."""
+    return lambda path: fnmatch.fnmatchcase(os.path.basename(path), pattern)
@@ -0,0 +1,523 @@
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from .process import Cancellation, OutputFilter, run_process
+
+logger = logging.getLogger(__name__)
+
+# Frames are a 4-byte big-endian payload length followed by compact JSON
+_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+# Results kept for EXECUTOR_DAEMON_CACHE_SECONDS, at most this many
+_CACHE_ENTRIES = 256
+# Seconds a client waits for a response beyond the command's timeout
+_RESPONSE_MARGIN = 5.0
+
+
+class DaemonProtocolError(Exception):
+    """A frame from the executor daemon or one of its clients is invalid"""
+
+    pass
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    if len(payload) > MAX_FRAME_BYTES:
+        raise DaemonProtocolError(f"Frame of {len(payload)} bytes exceeds {MAX_FRAME_BYTES} bytes")
+    return _HEADER.pack(len(payload)) + payload
+
+
+def _decode_payload(payload: bytes) -> Dict[str, Any]:
+    try:
+        message = json.loads(payload)
+    except ValueError as e:
+        raise DaemonProtocolError(f"Invalid frame: {e}")
+    if not isinstance(message, dict):
+        raise DaemonProtocolError("Invalid frame: expected an object")
+    return message
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Executor daemon closed the connection")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def recv_frame(sock: socket.socket) -> Dict[str, Any]:
+    (length,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise DaemonProtocolError(f"Frame of {length} bytes exceeds {MAX_FRAME_BYTES} bytes")
+    return _decode_payload(_recv_exactly(sock, length))
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Reads a frame, or returns None at the end of the stream."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise DaemonProtocolError("Truncated frame header")
+        return None
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise DaemonProtocolError(f"Frame of {length} bytes exceeds {MAX_FRAME_BYTES} bytes")
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise DaemonProtocolError("Truncated frame")
+    return _decode_payload(payload)
+
+
+def _encode_output(output: Union[str, bytes]) -> Dict[str, str]:
+    if isinstance(output, bytes):
+        return {"data": base64.b64encode(output).decode("ascii"), "encoding": "base64"}
+    return {"data": output, "encoding": "text"}
+
+
+def _decode_output(encoded: Dict[str, str]) -> Union[str, bytes]:
+    if encoded["encoding"] == "base64":
+        return base64.b64decode(encoded["data"])
+    return encoded["data"]
+
+
+def run_request(request: Dict[str, Any], cancellation: Optional[Cancellation] = None) -> Dict[str, Any]:
+    """Runs the command of a ``run`` request and builds the response, in a worker thread."""
+    stdout_filter = OutputFilter(**request["stdout_filter"])
+    stderr_filter = OutputFilter(**request["stderr_filter"])
+    stdin = request.get("stdin")
+    try:
+        returncode = run_process(
+            request["args"],
+            shell=bool(request.get("shell")),
+            cwd=request.get("cwd"),
+            timeout=request.get("timeout"),
+            stdin=base64.b64decode(stdin) if stdin is not None else None,
+            on_stdout=stdout_filter.feed,
+            on_stderr=stderr_filter.feed,
+            cancellation=cancellation,
+        )
+    except subprocess.TimeoutExpired:
+        return {"error": "timeout", "message": f"Command timed out after {request.get('timeout')} seconds"}
+    except OSError as e:
+        return {"error": "spawn", "message": str(e)}
+    return {
+        "returncode": returncode,
+        "stdout": _encode_output(stdout_filter.finish()),
+        "stderr": _encode_output(stderr_filter.finish()),
+        "stdout_state": stdout_filter.state(),
+        "stderr_state": stderr_filter.state(),
+    }
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Identifies requests that would run the same command with the same input and filters."""
+    identity = {key: value for key, value in request.items() if key != "id"}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _Inflight:
+    """A running request, with the number of connections still waiting for it."""
+
+    def __init__(self):
+        self.cancellation = Cancellation()
+        self.waiters = 0
+        self.task: Optional[asyncio.Future] = None
+
+
+class _Waiter:
+    """
+    A connection's stake in a running request, attached to the connection's
+    ``Cancellation``: the command is killed once every waiting connection has
+    cancelled.
+    """
+
+    def __init__(self, inflight: _Inflight):
+        self.inflight = inflight
+        self.inflight.waiters += 1
+        self.cancelled = False
+
+    def poll(self) -> Optional[int]:
+        return 0 if self.cancelled else None
+
+    def kill(self) -> None:
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self.inflight.waiters -= 1
+        if self.inflight.waiters <= 0:
+            self.inflight.cancellation.cancel()
+
+
+class ExecutorDaemon:
+    """
+    Runs commands for every server frontend on a host, over a Unix socket.
+
+    Frontends validate commands against their own policy and send the daemon
+    only what to run. The daemon enforces a host-wide limit of
+    ``max_concurrent`` running commands. With ``coalesce``, identical requests
+    that arrive while one is running wait for it and share its result instead
+    of running again, and with ``cache_seconds`` successful results are reused
+    for that long; both skip executions, so they are off by default. A
+    request's ``timeout`` counts from when it is received, so time spent
+    waiting for a free slot is part of it. A client cancels its request by
+    sending a ``cancel`` frame or closing the connection, which kills the
+    command once no other client is waiting for it.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        max_concurrent: int = os.cpu_count() or 4,
+        coalesce: bool = False,
+        cache_seconds: float = 0.0,
+    ):
+        self.socket_path = socket_path
+        self.max_concurrent = max(1, max_concurrent)
+        self.coalesce = coalesce
+        self.cache_seconds = cache_seconds
+        self.running = 0
+        self.stats = collections.Counter()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, _Inflight] = {}
+        self._cache: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if os.path.exists(self.socket_path):
+            # A socket left behind by a daemon that is no longer listening
+            try:
+                with socket.socket(socket.AF_UNIX) as probe:
+                    probe.connect(self.socket_path)
+                raise OSError(f"An executor daemon is already listening on {self.socket_path}")
+            except ConnectionRefusedError:
+                os.unlink(self.socket_path)
+        old_umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+        logger.info("Executor daemon listening on %s", self.socket_path)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # The next frame is read while a request runs, to notice a cancel frame or a closed connection
+        next_frame = asyncio.ensure_future(read_frame(reader))
+        try:
+            while True:
+                request = await next_frame
+                if request is None:
+                    break
+                next_frame = asyncio.ensure_future(read_frame(reader))
+                if request.get("type") == "cancel":
+                    # Nothing is running on this connection
+                    continue
+                cancellation = Cancellation()
+                task = asyncio.ensure_future(self.respond(request, cancellation))
+                await asyncio.wait({task, next_frame}, return_when=asyncio.FIRST_COMPLETED)
+                if not task.done() and next_frame.done():
+                    frame = next_frame.exception() is None and next_frame.result()
+                    if not frame or frame.get("type") == "cancel":
+                        self.stats["cancelled"] += 1
+                        cancellation.cancel()
+                        if frame:
+                            next_frame = asyncio.ensure_future(read_frame(reader))
+                response = {**await task, "id": request.get("id")}
+                if next_frame.done() and next_frame.exception() is None and next_frame.result() is None:
+                    break
+                writer.write(encode_frame(response))
+                await writer.drain()
+        except (DaemonProtocolError, ConnectionError) as e:
+            logger.warning("Dropping executor daemon client: %s", e)
+        finally:
+            next_frame.cancel()
+            writer.close()
+
+    async def respond(
+        self, request: Dict[str, Any], cancellation: Optional[Cancellation] = None
+    ) -> Dict[str, Any]:
+        if request.get("type") == "status":
+            return {
+                "running": self.running,
+                "max_concurrent": self.max_concurrent,
+                "inflight": len(self._inflight),
+                **self.stats,
+            }
+        if request.get("type") != "run":
+            return {"error": "protocol", "message": f"Unknown request type {request.get('type')!r}"}
+        self.stats["requests"] += 1
+        key = request_key(request)
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            stored_at, response = cached
+            if time.monotonic() - stored_at <= self.cache_seconds:
+                self.stats["cached"] += 1
+                return {**response, "cached": True}
+            del self._cache[key]
+
+        if self.coalesce and key in self._inflight:
+            self.stats["coalesced"] += 1
+            inflight = self._inflight[key]
+            if cancellation is not None:
+                cancellation.attach(_Waiter(inflight))
+            response = await asyncio.shield(inflight.task)
+            return {**response, "coalesced": True}
+
+        inflight = _Inflight()
+        if cancellation is not None:
+            cancellation.attach(_Waiter(inflight))
+        inflight.task = asyncio.ensure_future(self._run(request, time.monotonic(), inflight.cancellation))
+        if self.coalesce:
+            self._inflight[key] = inflight
+            inflight.task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        response = await asyncio.shield(inflight.task)
+        if inflight.cancellation.cancelled:
+            return response
+        if self.cache_seconds > 0 and response.get("returncode") == 0:
+            self._cache[key] = (time.monotonic(), response)
+            while len(self._cache) > _CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+        return response
+
+    async def _run(
+        self, request: Dict[str, Any], received_at: float, cancellation: Cancellation
+    ) -> Dict[str, Any]:
+        timeout = request.get("timeout")
+        try:
+            if timeout is not None:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            else:
+                await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            self.stats["start_timeouts"] += 1
+            return {"error": "timeout", "message": f"Command could not start within {timeout} seconds"}
+        except TypeError as e:
+            return {"error": "protocol", "message": f"Invalid request: {e}"}
+        self.running += 1
+        try:
+            if timeout is not None:
+                # Whatever the wait for a slot left of the timeout
+                request = {**request, "timeout": max(0.0, timeout - (time.monotonic() - received_at))}
+            if cancellation.cancelled:
+                return {"error": "cancelled", "message": "Command was cancelled"}
+            return await asyncio.to_thread(run_request, request, cancellation)
+        except (TypeError, ValueError, KeyError) as e:
+            return {"error": "protocol", "message": f"Invalid request: {e}"}
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+
+class DaemonCompletedProcess(subprocess.CompletedProcess):
+    """A command result from the executor daemon"""
+
+    def __init__(self, args, returncode, stdout, stderr, coalesced: bool = False, cached: bool = False):
+        super().__init__(args, returncode, stdout, stderr)
+        self.coalesced = coalesced
+        self.cached = cached
+
+
+class _Connection:
+    """A request's socket, attached to a ``Cancellation`` so that cancelling closes it."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.closed = False
+
+    def poll(self) -> Optional[int]:
+        return 0 if self.closed else None
+
+    def kill(self) -> None:
+        self.closed = True
+        try:
+            # Wakes the thread blocked on the response; the daemon sees the end of the stream
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class DaemonClient:
+    """
+    Sends commands to the executor daemon from a server frontend.
+
+    Each command uses its own connection, which costs little on a Unix
+    socket and keeps worker threads independent. When the daemon cannot be
+    reached, ``run`` returns None so the caller can run the command itself;
+    once a request has been sent, failures are raised instead, as the command
+    may already be running.
+    """
+
+    def __init__(self, socket_path: str, connect_timeout: float = 1.0):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        self._available = True
+
+    def _connect(self, timeout: Optional[float] = None) -> Optional[socket.socket]:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            if self._available:
+                logger.warning("Executor daemon unavailable (%s), running commands in-process", e)
+            self._available = False
+            return None
+        if not self._available:
+            logger.info("Executor daemon available again at %s", self.socket_path)
+        self._available = True
+        sock.settimeout(timeout)
+        return sock
+
+    def request(
+        self,
+        message: Dict[str, Any],
+        timeout: Optional[float] = None,
+        cancellation: Optional[Cancellation] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Sends a request and waits for the response, at most ``timeout`` seconds
+        per read, or returns None if the daemon cannot be reached. Cancelling
+        ``cancellation`` closes the connection, which makes the daemon kill the
+        command.
+
+        Raises:
+            TimeoutError: If the daemon does not respond in time.
+            ConnectionError: If the request was cancelled or the daemon closed the connection.
+        """
+        sock = self._connect(timeout)
+        if sock is None:
+            return None
+        with sock:
+            if cancellation is not None:
+                cancellation.attach(_Connection(sock))
+            try:
+                sock.sendall(encode_frame(message))
+                return recv_frame(sock)
+            finally:
+                if cancellation is not None:
+                    cancellation.detach()
+
+    def run(
+        self,
+        args: Union[str, List[str]],
+        *,
+        shell: bool,
+        cwd: str,
+        timeout: float,
+        stdin: Optional[bytes],
+        stdout_filter: OutputFilter,
+        stderr_filter: OutputFilter,
+        cancellation: Optional[Cancellation] = None,
+    ) -> Optional[DaemonCompletedProcess]:
+        """
+        Runs a validated command in the daemon.
+
+        Returns:
+            Optional[DaemonCompletedProcess]: The result, with output and filter
+                counters as if the command had run here, or None if the daemon is unavailable.
+
+        Raises:
+            subprocess.TimeoutExpired: If the command timed out, could not start
+                within ``timeout`` or the daemon did not respond in time.
+            OSError: If the command could not be started, was cancelled or the daemon failed.
+        """
+        message = {
+            "type": "run",
+            "args": args,
+            "shell": shell,
+            "cwd": cwd,
+            "timeout": timeout,
+            "stdin": base64.b64encode(stdin).decode("ascii") if stdin is not None else None,
+            "stdout_filter": stdout_filter.options(),
+            "stderr_filter": stderr_filter.options(),
+        }
+        try:
+            response = self.request(message, timeout=timeout + _RESPONSE_MARGIN, cancellation=cancellation)
+        except TimeoutError:
+            raise subprocess.TimeoutExpired(args, timeout)
+        except OSError:
+            if cancellation is not None and cancellation.cancelled:
+                raise OSError("Executor daemon: command was cancelled")
+            raise
+        if response is None:
+            return None
+        error = response.get("error")
+        if error == "timeout":
+            raise subprocess.TimeoutExpired(args, timeout)
+        if error is not None:
+            raise OSError(f"Executor daemon: {response.get('message', error)}")
+        return DaemonCompletedProcess(
+            args,
+            response["returncode"],
+            stdout_filter.restore(response["stdout_state"], _decode_output(response["stdout"])),
+            stderr_filter.restore(response["stderr_state"], _decode_output(response["stderr"])),
+            coalesced=bool(response.get("coalesced")),
+            cached=bool(response.get("cached")),
+        )
+
+
+def default_socket_path() -> str:
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or os.path.join("/tmp", f"cli-mcp-server-{os.getuid()}")
+    return os.path.join(runtime_dir, "cli-mcp-executor.sock")
+
+
+def load_daemon_client(env: Optional[Dict[str, str]] = None) -> Optional[DaemonClient]:
+    """
+    Creates the client of the executor daemon, if one is configured.
+
+    Environment Variables:
+        EXECUTOR_SOCKET: Unix socket of the executor daemon; commands run in-process when unset
+    """
+    env = os.environ if env is None else env
+    socket_path = env.get("EXECUTOR_SOCKET")
+    return DaemonClient(socket_path) if socket_path else None
+
+
+async def main(socket_path: Optional[str] = None) -> None:
+    """
+    Runs the executor daemon until it is interrupted.
+
+    Environment Variables:
+        EXECUTOR_SOCKET: Socket to listen on (default: cli-mcp-executor.sock in
+                         XDG_RUNTIME_DIR, or in /tmp/cli-mcp-server-<uid>)
+        EXECUTOR_DAEMON_MAX_CONCURRENT: Commands running at once on the host (default: CPU count)
+        EXECUTOR_DAEMON_COALESCE: Share the result of identical concurrent commands instead of
+                                  running each of them (default: false)
+        EXECUTOR_DAEMON_CACHE_SECONDS: Seconds successful results are reused for (default: 0, disabled)
+    """
+    socket_path = socket_path or os.getenv("EXECUTOR_SOCKET") or default_socket_path()
+    os.makedirs(os.path.dirname(socket_path), mode=0o700, exist_ok=True)
+    daemon = ExecutorDaemon(
+        socket_path,
+        max_concurrent=int(os.getenv("EXECUTOR_DAEMON_MAX_CONCURRENT", str(os.cpu_count() or 4))),
+        coalesce=os.getenv("EXECUTOR_DAEMON_COALESCE", "false").lower() in ("true", "1"),
+        cache_seconds=float(os.getenv("EXECUTOR_DAEMON_CACHE_SECONDS", "0")),
+    )
+    await daemon.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await daemon.close()
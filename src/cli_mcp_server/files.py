@@ -0,0 +1,471 @@
+import codecs
+import errno
+import mmap
+import os
+import secrets
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import IO, Dict, Optional, Tuple
+
+# Bytes inspected to decide on the encoding of a file
+_SAMPLE_SIZE = 8192
+
+# Checked in order, as the UTF-32 LE mark starts with the UTF-16 LE mark
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+WRITE_MODES = ("create", "overwrite", "append", "atomic")
+
+# Buffer in front of each file being written, so small chunks become large writes
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Read once: os.umask can only be queried by setting it, which is not thread-safe
+_UMASK = _umask()
+
+
+@dataclass
+class FileSlice:
+    """
+    A byte range read from a file
+    """
+
+    data: bytes
+    start: int
+    end: int
+    size: int
+    truncated: bool = False
+    first_line: Optional[int] = None
+    last_line: Optional[int] = None
+    encoding: Optional[str] = None
+
+    def text(self) -> str:
+        """
+        Decodes the data with the detected encoding, replacing invalid bytes.
+        """
+        data = self.data
+        if self.start == 0:
+            for bom, encoding in _BOMS:
+                if encoding == self.encoding and data.startswith(bom):
+                    data = data[len(bom):]
+                    break
+        return data.decode(self.encoding or "utf-8", errors="replace")
+
+
+def detect_encoding(sample: bytes) -> Optional[str]:
+    """
+    Guesses the text encoding of a file from a sample of its first bytes.
+
+    Returns:
+        Optional[str]: The codec name, or None if the data looks binary.
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\x00" in sample:
+        return None
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still UTF-8
+        if (
+            len(sample) >= _SAMPLE_SIZE
+            and e.start >= len(sample) - 3
+            and e.reason == "unexpected end of data"
+        ):
+            return "utf-8"
+    control = sum(1 for byte in sample if byte < 32 and byte not in (9, 10, 12, 13, 27))
+    if sample and control / len(sample) > 0.1:
+        return None
+    return "latin-1"
+
+
+def _line_start(mm: mmap.mmap, line: int) -> int:
+    """Returns the offset of a 1-based line, or the file size if there are fewer lines."""
+    position = 0
+    for _ in range(line - 1):
+        newline = mm.find(b"\n", position)
+        if newline < 0:
+            return len(mm)
+        position = newline + 1
+    return position
+
+
+def _tail_start(mm: mmap.mmap, lines: int) -> int:
+    """Returns the offset of the last ``lines`` lines, scanning backwards from the end."""
+    end = len(mm)
+    if end and mm[end - 1:end] == b"\n":
+        end -= 1
+    position = end
+    for _ in range(lines):
+        newline = mm.rfind(b"\n", 0, position)
+        if newline < 0:
+            return 0
+        position = newline
+    return position + 1
+
+
+def _open_regular(path: str) -> IO[bytes]:
+    """
+    Opens a regular file for reading.
+
+    The file is opened without blocking and checked before it is read, so a
+    FIFO or device cannot hang the worker thread waiting for data.
+
+    Raises:
+        ValueError: If the path is not a regular file.
+        OSError: If the file cannot be opened.
+    """
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        mode = os.fstat(fd).st_mode
+        if not stat.S_ISREG(mode):
+            raise ValueError(f"Not a regular file: {path}")
+        os.set_blocking(fd, True)
+    except BaseException:
+        os.close(fd)
+        raise
+    return os.fdopen(fd, "rb")
+
+
+def read_file_range(
+    path: str,
+    offset: Optional[int] = None,
+    length: Optional[int] = None,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    tail_lines: Optional[int] = None,
+    max_bytes: int = 1024 * 1024,
+) -> FileSlice:
+    """
+    Reads a byte or line range of a file through mmap.
+
+    Only the requested range is touched. Line ranges are located with
+    ``mmap.find`` from the start of the file; ``tail_lines`` scans backwards
+    from the end, so tailing a large log does not read the whole file. A range
+    longer than ``max_bytes`` keeps its start, except with ``tail_lines``, where
+    it keeps its end as tail does.
+
+    Args:
+        path (str): Path of the file, already validated by the caller.
+        offset (Optional[int]): First byte to read.
+        length (Optional[int]): Number of bytes to read from ``offset``.
+        start_line (Optional[int]): First line to read (1-based).
+        end_line (Optional[int]): Last line to read (inclusive).
+        tail_lines (Optional[int]): Read this many lines from the end of the file.
+        max_bytes (int): Maximum number of bytes returned; longer ranges are truncated.
+
+    Returns:
+        FileSlice: The data and the byte range it covers.
+
+    Raises:
+        ValueError: If the range arguments are invalid or the path is not a regular file.
+        OSError: If the file cannot be read.
+    """
+    if offset is not None or length is not None:
+        if start_line is not None or end_line is not None or tail_lines is not None:
+            raise ValueError("Byte ranges (offset/length) and line ranges cannot be combined")
+    if tail_lines is not None and (start_line is not None or end_line is not None):
+        raise ValueError("tail_lines cannot be combined with start_line/end_line")
+    for name, value, minimum in (
+        ("offset", offset, 0),
+        ("length", length, 0),
+        ("start_line", start_line, 1),
+        ("end_line", end_line, 1),
+        ("tail_lines", tail_lines, 1),
+    ):
+        if value is not None and value < minimum:
+            raise ValueError(f"Invalid {name}: {value}")
+
+    with _open_regular(path) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return FileSlice(data=b"", start=0, end=0, size=0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            first_line = last_line = None
+            if tail_lines is not None:
+                start, end = _tail_start(mm, tail_lines), size
+            elif start_line is not None or end_line is not None:
+                first_line = start_line or 1
+                start = _line_start(mm, first_line)
+                if end_line is None:
+                    end = size
+                else:
+                    if end_line < first_line:
+                        raise ValueError("end_line must not be before start_line")
+                    newline = start - 1
+                    for _ in range(end_line - first_line + 1):
+                        newline = mm.find(b"\n", newline + 1)
+                        if newline < 0:
+                            break
+                    if newline < 0:
+                        end = size
+                    else:
+                        end, last_line = newline + 1, end_line
+            else:
+                start = min(offset or 0, size)
+                end = size if length is None else min(start + length, size)
+
+            truncated = end - start > max_bytes
+            if truncated and tail_lines is not None:
+                # Keep the newest lines, as tail does
+                start = end - max_bytes
+            elif truncated:
+                end = start + max_bytes
+                last_line = None
+            return FileSlice(
+                data=mm[start:end],
+                start=start,
+                end=end,
+                size=size,
+                truncated=truncated,
+                first_line=first_line,
+                last_line=last_line,
+            )
+
+
+def read_file(path: str, encoding: Optional[str] = None, **kwargs) -> FileSlice:
+    """
+    Reads a range of a file with ``read_file_range`` and detects its encoding.
+
+    Args:
+        path (str): Path of the file, already validated by the caller.
+        encoding (Optional[str]): Codec to use instead of detecting one.
+        **kwargs: Range arguments passed to ``read_file_range``.
+
+    Returns:
+        FileSlice: The data read; ``encoding`` is None for binary files.
+
+    Raises:
+        ValueError: If the range arguments or the encoding are invalid.
+        OSError: If the file cannot be read.
+    """
+    if encoding is not None:
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            raise ValueError(f"Unknown encoding '{encoding}'")
+    else:
+        with _open_regular(path) as f:
+            encoding = detect_encoding(f.read(_SAMPLE_SIZE))
+    file_slice = read_file_range(path, **kwargs)
+    file_slice.encoding = encoding
+    return file_slice
+
+
+def _fsync_directory(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FileUpload:
+    """
+    A file being written, possibly over several chunks.
+
+    Every upload is written to a temporary file next to the target, so the
+    target is untouched until the upload is committed, and an upload that fails
+    or is abandoned leaves nothing behind. On commit, ``create`` and ``atomic``
+    move the temporary file into place, so readers never see a partial file;
+    ``create`` fails if the target exists at either end. ``overwrite`` and
+    ``append`` copy the data into the target, keeping its inode and permissions.
+    """
+
+    def __init__(self, path: str, mode: str, max_bytes: int):
+        if mode not in WRITE_MODES:
+            raise ValueError(f"Invalid mode '{mode}'. Use one of: {', '.join(WRITE_MODES)}")
+        if mode == "create" and os.path.lexists(path):
+            raise FileExistsError(errno.EEXIST, "File exists", path)
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.finished = False
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+        fd, self.temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".part"
+        )
+        self._file = os.fdopen(fd, "w+b", buffering=_WRITE_BUFFER_SIZE)
+
+    def write(self, data: bytes) -> None:
+        if self.size + len(data) > self.max_bytes:
+            raise ValueError(f"File exceeds the maximum size of {self.max_bytes} bytes")
+        self._file.write(data)
+        self.size += len(data)
+        self.updated_at = time.monotonic()
+
+    def commit(self) -> None:
+        """Flushes and fsyncs the data, then moves it into place."""
+        try:
+            self._file.flush()
+            if self.mode in ("overwrite", "append"):
+                self._file.seek(0)
+                with open(self.path, "wb" if self.mode == "overwrite" else "ab") as target:
+                    shutil.copyfileobj(self._file, target, _WRITE_BUFFER_SIZE)
+                    target.flush()
+                    os.fsync(target.fileno())
+                self.abort()
+            else:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                if self.mode == "atomic":
+                    try:
+                        permissions = stat.S_IMODE(os.stat(self.path).st_mode)
+                    except FileNotFoundError:
+                        permissions = 0o666 & ~_UMASK
+                    os.chmod(self.temp_path, permissions)
+                    os.replace(self.temp_path, self.path)
+                else:
+                    os.chmod(self.temp_path, 0o666 & ~_UMASK)
+                    # Unlike rename, link fails if the target was created in the meantime
+                    os.link(self.temp_path, self.path)
+                    os.unlink(self.temp_path)
+                self.temp_path = None
+        except OSError:
+            self.abort()
+            raise
+        self.finished = True
+        _fsync_directory(os.path.dirname(self.path))
+
+    def abort(self) -> None:
+        self.finished = True
+        self._file.close()
+        if self.temp_path is not None:
+            try:
+                os.unlink(self.temp_path)
+            except FileNotFoundError:
+                pass
+            self.temp_path = None
+
+
+class UploadManager:
+    """
+    Tracks chunked writes by upload id.
+
+    The first chunk of a write opens a ``FileUpload``; unless it is also the final
+    chunk, the upload gets an id that later chunks refer to, along with their
+    offset in the upload. A chunk is only accepted at the offset where the
+    previous one ended, so chunks sent concurrently or out of order are rejected
+    rather than written in the wrong place. Uploads that receive no chunk for
+    ``idle_timeout`` seconds are aborted.
+    """
+
+    def __init__(self, idle_timeout: float = 600.0):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._uploads: Dict[str, FileUpload] = {}
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                upload_id
+                for upload_id, upload in self._uploads.items()
+                if now - upload.updated_at > self.idle_timeout
+            ]
+            uploads = [self._uploads.pop(upload_id) for upload_id in expired]
+        for upload in uploads:
+            upload.abort()
+
+    def write(
+        self,
+        data: bytes,
+        path: Optional[str] = None,
+        mode: str = "overwrite",
+        upload_id: Optional[str] = None,
+        final: bool = True,
+        max_bytes: int = 100 * 1024 * 1024,
+        offset: Optional[int] = None,
+    ) -> Tuple[Optional[str], FileUpload]:
+        """
+        Writes one chunk of a file.
+
+        Args:
+            data (bytes): The chunk.
+            path (Optional[str]): Target path, already validated by the caller;
+                required for the first chunk.
+            mode (str): One of ``WRITE_MODES``, for the first chunk.
+            upload_id (Optional[str]): Id returned for the first chunk of an upload.
+            final (bool): Whether this is the last chunk.
+            max_bytes (int): Maximum size of the data written by the upload.
+            offset (Optional[int]): Offset of the chunk in the upload; required with
+                ``upload_id``, and 0 if given for the first chunk.
+
+        Returns:
+            Tuple[Optional[str], FileUpload]: ``(upload_id, upload)``; ``upload_id`` is None once the upload is
+                complete.
+
+        Raises:
+            ValueError: If the arguments are invalid, the offset is not where the
+                upload ended, or the upload is too large.
+            OSError: If the file cannot be written.
+        """
+        self._expire()
+        if upload_id is None:
+            if path is None:
+                raise ValueError("A path is required for the first chunk")
+            if offset not in (None, 0):
+                raise ValueError(f"Invalid offset {offset}: the first chunk starts at offset 0")
+            upload = FileUpload(path, mode, max_bytes)
+        else:
+            with self._lock:
+                upload = self._uploads.get(upload_id)
+            if upload is None:
+                raise ValueError(f"Unknown or expired upload_id '{upload_id}'")
+            if path is not None and path != upload.path:
+                raise ValueError(f"upload_id '{upload_id}' is writing {upload.path}, not {path}")
+            if offset is None:
+                raise ValueError("An offset is required with upload_id")
+
+        with upload.lock:
+            if upload.finished:
+                raise ValueError(f"Unknown or expired upload_id '{upload_id}'")
+            if upload_id is not None and offset != upload.size:
+                # Nothing is written, so the client can resend from the right offset
+                raise ValueError(f"Invalid offset {offset}: upload_id '{upload_id}' has {upload.size} bytes")
+            try:
+                upload.write(data)
+                if final:
+                    upload.commit()
+            except (OSError, ValueError):
+                if upload_id is not None:
+                    with self._lock:
+                        self._uploads.pop(upload_id, None)
+                upload.abort()
+                raise
+        if final:
+            if upload_id is not None:
+                with self._lock:
+                    self._uploads.pop(upload_id, None)
+            return None, upload
+        if upload_id is None:
+            upload_id = secrets.token_hex(8)
+            with self._lock:
+                self._uploads[upload_id] = upload
+        return upload_id, upload
+
+    def close(self) -> None:
+        """Aborts all unfinished uploads."""
+        with self._lock:
+            uploads, self._uploads = list(self._uploads.values()), {}
+        for upload in uploads:
+            upload.abort()
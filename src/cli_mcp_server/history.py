@@ -0,0 +1,280 @@
+import math
+import os
+import shlex
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from .logwriter import BackgroundLogWriter
+from .recorder import CallRecord
+
+REPORTS = ("slowest", "failures", "runtime", "output")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS executions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    command TEXT NOT NULL,
+    command_line TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    exit_code INTEGER,
+    duration_ms REAL NOT NULL,
+    stdout_bytes INTEGER NOT NULL,
+    stderr_bytes INTEGER NOT NULL,
+    profile TEXT
+);
+"""
+
+# Created after _migrate, since databases from older versions lack the profile column
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS executions_command_ts ON executions (command, ts);
+CREATE INDEX IF NOT EXISTS executions_ts ON executions (ts);
+CREATE INDEX IF NOT EXISTS executions_exit_code ON executions (exit_code);
+CREATE INDEX IF NOT EXISTS executions_profile_command_duration ON executions (profile, command, duration_ms);
+"""
+
+
+def _migrate(connection: sqlite3.Connection) -> None:
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(executions)")}
+    if "profile" not in columns:
+        connection.execute("ALTER TABLE executions ADD COLUMN profile TEXT")
+
+
+class HistoryWriter(BackgroundLogWriter):
+    """
+    Background writer that inserts batches of rows into the history database.
+
+    Reuses the queueing of ``BackgroundLogWriter``; each drained batch becomes a
+    single transaction instead of lines appended to a log file.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, queue_size: int = 10000):
+        super().__init__(
+            path,
+            max_bytes=0,
+            flush_interval=flush_interval,
+            queue_size=queue_size,
+        )
+
+    def _open(self) -> None:
+        connection = None
+        try:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            _migrate(connection)
+            connection.executescript(_INDEXES)
+        except sqlite3.Error as e:
+            if connection is not None:
+                connection.close()
+            raise OSError(str(e))
+        self._file = connection
+        self._size = 0
+
+    def _sync(self) -> None:
+        try:
+            self._file.commit()
+        except sqlite3.Error as e:
+            raise OSError(str(e))
+
+    def _write_batch(self, batch: list) -> None:
+        if self._file is None:
+            self._open()
+        try:
+            self._file.executemany(
+                "INSERT INTO executions (ts, command, command_line, outcome, exit_code,"
+                " duration_ms, stdout_bytes, stderr_bytes, profile)"
+                " VALUES (:ts, :command, :command_line, :outcome, :exit_code,"
+                " :duration_ms, :stdout_bytes, :stderr_bytes, :profile)",
+                batch,
+            )
+        except sqlite3.Error as e:
+            raise OSError(str(e))
+        self.written += len(batch)
+
+
+def _command_name(command_line: str) -> str:
+    try:
+        parts = shlex.split(command_line)
+    except ValueError:
+        parts = command_line.split()
+    return os.path.basename(parts[0]) if parts else ""
+
+
+class ExecutionHistory:
+    """
+    Persistent history of run_command executions in an embedded SQLite database.
+
+    Rows are indexed by command name, time and exit code, and tagged with the
+    workspace profile they ran in. Inserts are batched by a background
+    ``HistoryWriter``; queries open their own read-only connection and are meant
+    to be run off the event loop.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = os.path.abspath(path)
+        self.writer = HistoryWriter(self.path, flush_interval=flush_interval)
+
+    def record(self, call: CallRecord, profile: Optional[str] = None) -> bool:
+        command_line = call.arguments.get("command") or ""
+        return self.writer.write(
+            {
+                "ts": call.started_at,
+                "command": _command_name(command_line),
+                "command_line": command_line,
+                "outcome": call.outcome,
+                "exit_code": call.returncode,
+                "duration_ms": call.duration_ms,
+                "stdout_bytes": call.stdout_bytes,
+                "stderr_bytes": call.stderr_bytes,
+                "profile": profile or call.profile,
+            }
+        )
+
+    def close(self) -> None:
+        self.writer.close()
+
+    def query(
+        self,
+        report: str,
+        command: Optional[str] = None,
+        since_seconds: Optional[float] = None,
+        limit: int = 10,
+        profile: Optional[str] = None,
+        include_unprofiled: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs one of the history reports.
+
+        Args:
+            report (str): One of 'slowest', 'failures', 'runtime' or 'output'.
+            command (Optional[str]): Only include executions of this command name.
+            since_seconds (Optional[float]): Only include executions started within this many seconds.
+            limit (int): Maximum number of rows to return.
+            profile (Optional[str]): Only include executions that ran in this workspace profile.
+            include_unprofiled (bool): With ``profile``, also include executions recorded
+                before executions were tagged with their profile.
+
+        Returns:
+            List[Dict[str, Any]]: Report rows, most significant first.
+
+        Raises:
+            ValueError: If the report name is unknown.
+        """
+        if report not in REPORTS:
+            raise ValueError(f"Unknown report '{report}', expected one of: {', '.join(REPORTS)}")
+        if not os.path.exists(self.path):
+            return []
+
+        clauses, params = [], []
+        if profile is not None:
+            clauses.append("(profile = ? OR profile IS NULL)" if include_unprofiled else "profile = ?")
+            params.append(profile)
+        if command:
+            clauses.append("command = ?")
+            params.append(command)
+        if since_seconds:
+            clauses.append("ts >= ?")
+            params.append(time.time() - since_seconds)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        connection.row_factory = sqlite3.Row
+        try:
+            if report == "slowest":
+                rows = connection.execute(
+                    f"SELECT ts, command_line, outcome, exit_code, duration_ms FROM executions"
+                    f" {where} ORDER BY duration_ms DESC LIMIT ?",
+                    (*params, limit),
+                ).fetchall()
+                return [dict(row) for row in rows]
+
+            if report == "failures":
+                rows = connection.execute(
+                    f"SELECT command, COUNT(*) AS runs,"
+                    f" SUM(CASE WHEN outcome != 'ok' OR exit_code != 0 THEN 1 ELSE 0 END) AS failures"
+                    f" FROM executions {where} GROUP BY command",
+                    params,
+                ).fetchall()
+                results = [
+                    {**dict(row), "failure_rate": row["failures"] / row["runs"]}
+                    for row in rows
+                ]
+                results.sort(key=lambda row: (row["failure_rate"], row["runs"]), reverse=True)
+                return results[:limit]
+
+            if report == "output":
+                rows = connection.execute(
+                    f"SELECT command, COUNT(*) AS runs,"
+                    f" SUM(stdout_bytes + stderr_bytes) AS total_bytes,"
+                    f" AVG(stdout_bytes + stderr_bytes) AS avg_bytes,"
+                    f" MAX(stdout_bytes + stderr_bytes) AS max_bytes"
+                    f" FROM executions {where} GROUP BY command ORDER BY total_bytes DESC LIMIT ?",
+                    (*params, limit),
+                ).fetchall()
+                return [dict(row) for row in rows]
+
+            rows = connection.execute(
+                f"SELECT command, COUNT(*) AS runs, AVG(duration_ms) AS avg_ms, MAX(duration_ms) AS max_ms"
+                f" FROM executions {where} GROUP BY command",
+                params,
+            ).fetchall()
+            results = []
+            for row in rows:
+                # Seek to the p95 row through the duration index instead of loading every duration
+                offset = max(0, math.ceil(0.95 * row["runs"]) - 1)
+                command_where = f"{where} AND command = ?" if where else "WHERE command = ?"
+                (p95,) = connection.execute(
+                    f"SELECT duration_ms FROM executions {command_where}"
+                    f" ORDER BY duration_ms LIMIT 1 OFFSET ?",
+                    (*params, row["command"], offset),
+                ).fetchone()
+                results.append(
+                    {
+                        "command": row["command"],
+                        "runs": row["runs"],
+                        "avg_ms": row["avg_ms"],
+                        "p95_ms": p95,
+                        "max_ms": row["max_ms"],
+                    }
+                )
+            results.sort(key=lambda row: row["p95_ms"], reverse=True)
+            return results[:limit]
+        finally:
+            connection.close()
+
+
+def format_report(report: str, rows: List[Dict[str, Any]]) -> str:
+    """
+    Formats report rows as a plain text table.
+    """
+    if not rows:
+        return f"No executions recorded for report '{report}'"
+    columns = list(rows[0].keys())
+
+    def cell(value: Any) -> str:
+        if isinstance(value, float):
+            return f"{value:.3f}" if value < 1 else f"{value:.1f}"
+        return "" if value is None else str(value)
+
+    table = [columns] + [[cell(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    lines = [" | ".join(value.ljust(width) for value, width in zip(line, widths)) for line in table]
+    lines.insert(1, "-+-".join("-" * width for width in widths))
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def load_history() -> Optional[ExecutionHistory]:
+    """
+    Creates the execution history store from environment variables.
+
+    Environment Variables:
+        HISTORY_DB: Path of the SQLite history database; history is disabled when unset
+        HISTORY_FLUSH_INTERVAL: Seconds between batched inserts (default: 1.0)
+    """
+    path = os.getenv("HISTORY_DB")
+    if not path:
+        return None
+    return ExecutionHistory(
+        path, flush_interval=float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+    )
@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+from typing import Dict, List, Pattern, Tuple
+
+# Directories that are never searched or indexed
+ALWAYS_IGNORED = frozenset({".git", ".hg", ".svn"})
+
+
+def _translate(pattern: str) -> str:
+    """Translates the glob part of a .gitignore pattern into a regular expression."""
+    result = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            result.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            result.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            result.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            result.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                result.append(re.escape("["))
+                i += 1
+                continue
+            body = pattern[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            result.append(f"[{body}]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            result.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            result.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(result)
+
+
+def parse_gitignore(text: str) -> List[Tuple[Pattern, bool, bool]]:
+    """
+    Parses the contents of a .gitignore file.
+
+    Returns:
+        List[Tuple[Pattern, bool, bool]]: ``(regex, negated, directory_only)`` for
+            each pattern, in file order. Regexes match paths relative to the
+            directory containing the file.
+    """
+    rules = []
+    for line in text.splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        line = line.rstrip()
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        anchored = "/" in line
+        line = line.lstrip("/")
+        prefix = "^" if anchored else "^(?:.*/)?"
+        try:
+            regex = re.compile(prefix + _translate(line) + "$")
+        except re.error:
+            continue
+        rules.append((regex, negated, directory_only))
+    return rules
+
+
+class IgnoreRules:
+    """
+    The .gitignore rules of a tree, loaded lazily per directory.
+
+    As in git, a pattern in a deeper .gitignore overrides one in a parent
+    directory, the last matching pattern of a file wins, and nothing inside an
+    ignored directory can be re-included.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._rules: Dict[str, List[Tuple[Pattern, bool, bool]]] = {}
+
+    def _load(self, directory: str) -> List[Tuple[Pattern, bool, bool]]:
+        with self._lock:
+            rules = self._rules.get(directory)
+        if rules is None:
+            try:
+                with open(os.path.join(self.root, directory, ".gitignore"), encoding="utf-8", errors="replace") as f:
+                    rules = parse_gitignore(f.read())
+            except OSError:
+                rules = []
+            with self._lock:
+                self._rules[directory] = rules
+        return rules
+
+    def invalidate(self, directory: str) -> None:
+        """Drops the cached rules of a directory, e.g. after its .gitignore changed."""
+        with self._lock:
+            self._rules.pop(directory, None)
+
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        """
+        Returns whether the patterns ignore a path, assuming its parent directories
+        are not ignored.
+        """
+        parts = relative_path.split("/")
+        if parts[-1] in ALWAYS_IGNORED:
+            return True
+        ignored = False
+        for depth in range(len(parts)):
+            directory = "/".join(parts[:depth])
+            subpath = "/".join(parts[depth:])
+            for regex, negated, directory_only in self._load(directory):
+                if directory_only and not is_dir:
+                    continue
+                if regex.match(subpath):
+                    ignored = not negated
+        return ignored
+
+    def is_ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """Returns whether a path or any of its parent directories is ignored."""
+        parts = relative_path.split("/")
+        for depth in range(1, len(parts)):
+            if self.matches("/".join(parts[:depth]), True):
+                return True
+        return self.matches(relative_path, is_dir)
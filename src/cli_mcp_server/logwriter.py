@@ -0,0 +1,180 @@
+import asyncio
+import collections
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+OVERFLOW_POLICIES = ("drop", "block")
+
+
+class BackgroundLogWriter:
+    """
+    Appends JSON records to a size-rotated log file from a background thread.
+
+    Callers only append records to an in-memory deque, which is atomic and takes
+    no lock, so writing a record never performs file I/O on the caller's thread.
+    The background thread drains the deque every ``flush_interval`` seconds (or
+    sooner once a full batch is pending), serializes records compactly one per
+    line and, when ``fsync`` is enabled, issues one fsync per drained batch.
+
+    The queue is bounded by ``queue_size``. ``write`` never waits: on overflow the
+    record is dropped and counted in ``dropped``. ``put`` applies the configured
+    ``overflow`` policy, and with ``"block"`` it waits for room by sleeping on the
+    event loop instead of blocking it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        flush_interval: float = 1.0,
+        queue_size: int = 10000,
+        batch_size: int = 512,
+        fsync: bool = False,
+        overflow: str = "drop",
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Invalid overflow policy '{overflow}', expected one of: {', '.join(OVERFLOW_POLICIES)}"
+            )
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.overflow = overflow
+        self.written = 0
+        self.dropped = 0
+        self._queue: "collections.deque[Dict[str, Any]]" = collections.deque()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._file = None
+        self._size = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run, name=f"log-writer:{os.path.basename(self.path)}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def write(self, record: Dict[str, Any]) -> bool:
+        """
+        Enqueues a record without waiting.
+
+        Returns:
+            bool: True if the record was queued, False if it was dropped.
+        """
+        pending = len(self._queue)
+        if pending >= self.queue_size or self._stopping:
+            self.dropped += 1
+            return False
+        self._queue.append(record)
+        if pending + 1 >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def put(self, record: Dict[str, Any]) -> bool:
+        """
+        Enqueues a record, applying the overflow policy.
+
+        With the ``"block"`` policy this waits until the background thread has
+        made room, yielding to the event loop while it waits.
+
+        Returns:
+            bool: True if the record was queued, False if it was dropped.
+        """
+        delay = 0.001
+        while (
+            self.overflow == "block"
+            and len(self._queue) >= self.queue_size
+            and self._thread.is_alive()
+        ):
+            self._wakeup.set()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.flush_interval)
+        return self.write(record)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """
+        Flushes pending records and stops the background thread.
+        """
+        if not self._thread.is_alive():
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    def _open(self) -> None:
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _write_batch(self, batch: list) -> None:
+        if self._file is None:
+            self._open()
+        for record in batch:
+            line = (
+                json.dumps(record, separators=(",", ":"), default=str) + "\n"
+            ).encode("utf-8")
+            if self.max_bytes and self._size and self._size + len(line) > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._size += len(line)
+        self.written += len(batch)
+
+    def _drain(self) -> None:
+        wrote = False
+        while self._queue:
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            try:
+                self._write_batch(batch)
+                wrote = True
+            except OSError:
+                self.dropped += len(batch)
+        if wrote:
+            try:
+                self._sync()
+            except OSError:
+                pass
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            stopping = self._stopping
+            self._drain()
+            if stopping:
+                break
+        if self._file is not None:
+            self._file.close()
+            self._file = None
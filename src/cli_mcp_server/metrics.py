@@ -0,0 +1,106 @@
+import collections
+import threading
+from typing import Callable, Deque, Dict, List, Mapping
+
+# Samples kept per histogram to compute percentiles from
+_WINDOW = 1024
+PERCENTILES = (50, 90, 99)
+
+
+def _key(name: str, labels: Mapping[str, str]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in sorted(labels.items())) + "}"
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest-rank percentile of a non-empty list of samples."""
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+class Histogram:
+    """
+    Count, sum and maximum of observed values, with percentiles over the most
+    recent ``window`` observations.
+    """
+
+    def __init__(self, window: int = _WINDOW):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._recent: Deque[float] = collections.deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self._recent.append(value)
+
+    def summary(self) -> Dict[str, float]:
+        summary = {"count": self.count, "sum": round(self.sum, 3), "max": round(self.max, 3)}
+        recent = list(self._recent)
+        for p in PERCENTILES:
+            summary[f"p{p}"] = round(percentile(recent, p), 3) if recent else 0.0
+        return summary
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms, keyed by name and labels.
+
+    Values are updated from the event loop and from worker threads, so every
+    update takes a lock. Collectors registered with ``register`` are called on
+    each snapshot to report gauges owned by other components, such as queue
+    lengths, so those components do not have to push every change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: List[Callable[[], Mapping[str, float]]] = []
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def register(self, collector: Callable[[], Mapping[str, float]]) -> None:
+        """Adds a function returning gauge values by name, read on each snapshot."""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        gauges = {}
+        for collector in self._collectors:
+            gauges.update(collector())
+        with self._lock:
+            gauges.update(self._gauges)
+            return {
+                "counters": dict(sorted(self._counters.items())),
+                "gauges": dict(sorted(gauges.items())),
+                "histograms": {key: self._histograms[key].summary() for key in sorted(self._histograms)},
+            }
+
+    def format(self) -> str:
+        """Renders a snapshot as one ``name value`` line per metric."""
+        snapshot = self.snapshot()
+        lines = [f"{key} {value:g}" for key, value in snapshot["counters"].items()]
+        lines += [f"{key} {value:g}" for key, value in snapshot["gauges"].items()]
+        for key, summary in snapshot["histograms"].items():
+            lines += [f"{key}:{field} {value:g}" for field, value in summary.items()]
+        return "\n".join(lines) if lines else "No metrics recorded yet"
@@ -0,0 +1,100 @@
+import json
+import os
+import shlex
+from typing import Dict, Optional, Tuple
+
+
+def _parse_env_file(content: str) -> Dict[str, str]:
+    values = {}
+    for number, line in enumerate(content.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("export "):
+            line = line[len("export "):].lstrip()
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or not key:
+            raise ValueError(f"Invalid line {number} in policy file: expected KEY=VALUE")
+        value = value.strip()
+        if value[:1] in ("'", '"'):
+            # Quoted values follow shell quoting rules
+            parts = shlex.split(value, comments=True)
+            value = parts[0] if parts else ""
+        elif " #" in value:
+            value = value.split(" #", 1)[0].rstrip()
+        values[key] = value
+    return values
+
+
+def _to_env_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, list):
+        return ",".join(str(item) for item in value)
+    return str(value)
+
+
+def read_policy_file(path: str) -> Dict[str, str]:
+    """
+    Reads security policy overrides from a file.
+
+    Files ending in ``.json`` must hold an object mapping variable names to values;
+    lists are joined with commas and booleans become ``true``/``false``.
+    Any other file is read as an env file with ``KEY=VALUE`` lines, where blank
+    lines and ``#`` comments are ignored and values may be quoted.
+
+    Args:
+        path (str): Path of the policy file.
+
+    Returns:
+        Dict[str, str]: Variable names and values, using the same names as the
+            environment variables (ALLOWED_COMMANDS, ALLOWED_FLAGS, ...).
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is malformed.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if path.endswith(".json"):
+        data = json.loads(content)
+        if not isinstance(data, dict):
+            raise ValueError("Policy file must contain a JSON object")
+        return {str(key): _to_env_value(value) for key, value in data.items()}
+    return _parse_env_file(content)
+
+
+def read_profiles_file(path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Reads workspace profiles from a JSON file.
+
+    The file must hold an object mapping profile names to objects of variables,
+    for example ``{"web": {"ALLOWED_DIR": "/srv/web", "ALLOWED_COMMANDS": ["ls", "npm"]}}``.
+    Values are converted as in ``read_policy_file``.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is malformed.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not all(
+        isinstance(profile, dict) for profile in data.values()
+    ):
+        raise ValueError("Profiles file must map profile names to JSON objects")
+    return {
+        str(name): {str(key): _to_env_value(value) for key, value in profile.items()}
+        for name, profile in data.items()
+    }
+
+
+def policy_file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Returns the modification time and size of the policy file, or None if it is missing.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
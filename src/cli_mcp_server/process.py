@@ -0,0 +1,392 @@
+import codecs
+import collections
+import locale
+import os
+import re
+import selectors
+import subprocess
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Deque, Dict, List, Optional, Union
+
+from .files import detect_encoding
+
+# Bytes read from an output pipe at a time
+_READ_SIZE = 64 * 1024
+# Bytes offered to the stdin pipe at a time; the pipe accepts what fits
+_WRITE_SIZE = 64 * 1024
+# Longer lines are split, so a stream without newlines cannot grow the line buffer forever
+_MAX_LINE_BYTES = 1024 * 1024
+# Output bytes inspected to tell text from binary output
+_SAMPLE_SIZE = 8192
+# Characters that rarely appear in text: controls, private use, unassigned and surrogates
+_UNLIKELY_CATEGORIES = ("Cc", "Co", "Cn", "Cs")
+
+
+def _is_text(sample: bytes, encoding: str) -> bool:
+    """
+    Whether output that starts with a byte order mark is really text in that
+    encoding, rather than binary data that happens to start with the same bytes.
+    """
+    try:
+        text = codecs.getincrementaldecoder(encoding)(errors="strict").decode(sample)
+    except UnicodeDecodeError:
+        return False
+    unlikely = sum(
+        1 for char in text if char not in "\t\n\f\r\x1b" and unicodedata.category(char) in _UNLIKELY_CATEGORIES
+    )
+    return unlikely <= len(text) // 100
+
+
+class OutputFilter:
+    """
+    Keeps the part of a process's output a caller asked for, as the output arrives.
+
+    ``grep`` keeps only lines matching a regular expression; each line is decoded
+    with ``encoding`` before matching, so ``\\w``, ``\\b`` and ``(?i)`` also work
+    on non-ASCII text. ``head_lines`` then keeps the first lines and
+    ``tail_lines`` the last ones; ``max_bytes`` caps the result. Everything else
+    is counted and dropped as soon as it is seen, so memory stays bounded by
+    what is kept. Without options, all output is kept.
+
+    Output is handled as bytes. Once the first 8 KB have been seen, the output
+    is classified as text or binary; text is then decoded incrementally, with
+    invalid bytes replaced, as it is kept, while binary output is kept as bytes.
+    """
+
+    def __init__(
+        self,
+        head_lines: Optional[int] = None,
+        tail_lines: Optional[int] = None,
+        grep: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        encoding: Optional[str] = None,
+    ):
+        if head_lines is not None and tail_lines is not None:
+            raise ValueError("head_lines and tail_lines cannot be combined")
+        for name, value in (("head_lines", head_lines), ("tail_lines", tail_lines), ("max_bytes", max_bytes)):
+            if value is not None and value < 0:
+                raise ValueError(f"Invalid {name}: {value}")
+        try:
+            self.grep = re.compile(grep) if grep else None
+        except re.error as e:
+            raise ValueError(f"Invalid grep pattern: {e}")
+        self.head_lines = head_lines
+        self.tail_lines = tail_lines
+        self.max_bytes = max_bytes
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        try:
+            codecs.lookup(self.encoding)
+        except LookupError:
+            raise ValueError(f"Unknown encoding: {self.encoding}")
+        self.total_bytes = 0
+        self.total_lines = 0
+        self.kept_lines = 0
+        self.kept_bytes = 0
+        self.truncated = False
+        # None until enough output has been seen to tell
+        self.binary: Optional[bool] = None
+        self.data = b""
+        self.text = ""
+        self._by_line = grep is not None or head_lines is not None or tail_lines is not None
+        self._partial = b""
+        self._sample = bytearray()
+        self._decoder: Optional[codecs.IncrementalDecoder] = None
+        self._kept = bytearray()
+        self._text: List[str] = []
+        self._tail: Deque[bytes] = collections.deque(maxlen=tail_lines or None)
+
+    @property
+    def active(self) -> bool:
+        """Whether the filter can drop output."""
+        return self._by_line or self.max_bytes is not None
+
+    def _classify(self) -> None:
+        sample = bytes(self._sample)
+        detected = detect_encoding(sample)
+        self._sample = bytearray()
+        if detected not in (None, "utf-8", "latin-1") and not _is_text(sample, detected):
+            detected = None
+        self.binary = detected is None
+        if self.binary:
+            return
+        # A byte order mark names the encoding; otherwise trust the locale
+        encoding = self.encoding if detected in ("utf-8", "latin-1") else detected
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        if self._kept:
+            self._text.append(self._decoder.decode(bytes(self._kept)))
+            self._kept = bytearray()
+
+    def _store(self, data: bytes) -> None:
+        self.kept_bytes += len(data)
+        if self._decoder is not None:
+            self._text.append(self._decoder.decode(data))
+        else:
+            self._kept += data
+
+    def _keep(self, data: bytes) -> int:
+        if self.max_bytes is not None and self.kept_bytes + len(data) > self.max_bytes:
+            data = data[: self.max_bytes - self.kept_bytes]
+            self.truncated = True
+        self._store(data)
+        return len(data)
+
+    def _line(self, line: bytes) -> None:
+        self.total_lines += 1
+        if self.grep is not None and not self.grep.search(
+            line.rstrip(b"\r\n").decode(self.encoding, errors="replace")
+        ):
+            return
+        if self.tail_lines is not None:
+            if self.tail_lines:
+                self._tail.append(line)
+            return
+        if self.truncated or (self.head_lines is not None and self.kept_lines >= self.head_lines):
+            return
+        # A line counts as kept when some of it fit within max_bytes
+        if self._keep(line):
+            self.kept_lines += 1
+
+    def feed(self, data: bytes) -> None:
+        self.total_bytes += len(data)
+        if self.binary is None:
+            self._sample += data[: _SAMPLE_SIZE - len(self._sample)]
+            if len(self._sample) >= _SAMPLE_SIZE:
+                self._classify()
+        if not self._by_line:
+            if not self.truncated:
+                self._keep(data)
+            return
+        data = self._partial + data
+        if self.tail_lines is None and (
+            self.truncated or (self.head_lines is not None and self.kept_lines >= self.head_lines)
+        ):
+            # Nothing more will be kept, so only count the remaining lines
+            last = data.rfind(b"\n")
+            self.total_lines += data.count(b"\n")
+            self._partial = data[last + 1 :][:1]
+            return
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            self._line(data[start : end + 1])
+            start = end + 1
+        self._partial = data[start:]
+        while len(self._partial) > _MAX_LINE_BYTES:
+            self._line(self._partial[:_MAX_LINE_BYTES])
+            self._partial = self._partial[_MAX_LINE_BYTES:]
+
+    def finish(self) -> Union[str, bytes]:
+        """
+        Completes the output once the stream has ended.
+
+        Returns:
+            Union[str, bytes]: The kept output, decoded for text (also in ``text``)
+                or as bytes for binary output (also in ``data``).
+        """
+        if self.binary is None:
+            self._classify()
+        if self._partial:
+            self._line(self._partial)
+            self._partial = b""
+        if self._tail:
+            tail = b"".join(self._tail)
+            if self.max_bytes is not None and len(tail) > self.max_bytes:
+                # Keep the end of the output, as tail does
+                tail = tail[len(tail) - self.max_bytes :]
+                self.truncated = True
+            size = 0
+            for line in reversed(self._tail):
+                if size >= len(tail):
+                    break
+                size += len(line)
+                self.kept_lines += 1
+            self._tail.clear()
+            self._store(tail)
+        if self.binary:
+            self.data = bytes(self._kept)
+            self._kept = bytearray()
+            return self.data
+        self._text.append(self._decoder.decode(b"", final=True))
+        self.text = "".join(self._text).removeprefix("\ufeff")
+        self._text = []
+        return self.text
+
+    def options(self) -> Dict[str, Any]:
+        """The arguments this filter was created with, to recreate it in another process."""
+        return {
+            "head_lines": self.head_lines,
+            "tail_lines": self.tail_lines,
+            "grep": self.grep.pattern if self.grep else None,
+            "max_bytes": self.max_bytes,
+            "encoding": self.encoding,
+        }
+
+    def state(self) -> Dict[str, Any]:
+        """The counters of a finished filter."""
+        return {
+            "total_bytes": self.total_bytes,
+            "total_lines": self.total_lines,
+            "kept_lines": self.kept_lines,
+            "kept_bytes": self.kept_bytes,
+            "truncated": self.truncated,
+            "binary": self.binary,
+        }
+
+    def restore(self, state: Dict[str, Any], output: Union[str, bytes]) -> Union[str, bytes]:
+        """
+        Takes over the result of an identical filter that ran elsewhere.
+
+        Returns:
+            Union[str, bytes]: ``output``, as ``finish`` would have returned it.
+        """
+        for name in ("total_bytes", "total_lines", "kept_lines", "kept_bytes", "truncated", "binary"):
+            setattr(self, name, state[name])
+        if isinstance(output, bytes):
+            self.data = output
+        else:
+            self.text = output
+        return output
+
+    def summary(self) -> str:
+        """Describes what was dropped, for output that was filtered."""
+        text = f"kept {self.kept_bytes} of {self.total_bytes} bytes"
+        if self._by_line:
+            text = f"kept {self.kept_lines} of {self.total_lines} lines, " + text
+        if self.truncated:
+            text += f" (truncated to max_bytes={self.max_bytes})"
+        return text
+
+
+class Cancellation:
+    """
+    Lets another thread stop the process that a worker thread is running.
+
+    ``cancel`` kills the process if it is running, or as soon as it starts; the
+    worker then sees its output end and returns the process's return code.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._process: Optional[Any] = None
+
+    def attach(self, process: Any) -> None:
+        with self._lock:
+            self._process = process
+            if self.cancelled:
+                process.kill()
+
+    def detach(self) -> None:
+        with self._lock:
+            self._process = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            if self._process is not None and self._process.poll() is None:
+                self._process.kill()
+
+
+def run_process(
+    args: Union[str, List[str]],
+    *,
+    shell: bool = False,
+    cwd: Optional[str] = None,
+    timeout: Optional[float] = None,
+    stdin: Optional[bytes] = None,
+    on_stdout: Callable[[bytes], None],
+    on_stderr: Callable[[bytes], None],
+    spawn: Callable[..., Any] = subprocess.Popen,
+    cancellation: Optional[Cancellation] = None,
+) -> int:
+    """
+    Runs a process, feeding it ``stdin`` and passing its output to callbacks as it arrives.
+
+    A single selector loop writes stdin and reads stdout and stderr, so a child
+    that is slow to read its input, or that writes a lot of output before reading
+    it, cannot deadlock the exchange. stdin is only written while the pipe has
+    room, so a large payload is never copied into the pipe ahead of the reader.
+    Without ``stdin``, the child's stdin is /dev/null.
+
+    Args:
+        args (Union[str, List[str]]): Command line, as for ``subprocess.Popen``.
+        shell (bool): Run ``args`` through the default shell.
+        cwd (Optional[str]): Working directory.
+        timeout (Optional[float]): Seconds after which the process is killed.
+        stdin (Optional[bytes]): Data written to the child's stdin, which is then closed.
+        on_stdout (Callable[[bytes], None]): Called with each chunk of stdout.
+        on_stderr (Callable[[bytes], None]): Called with each chunk of stderr.
+        spawn (Callable[..., Any]): Starts the process, ``subprocess.Popen`` or a
+            replacement with the same interface such as the fork server's.
+        cancellation (Optional[Cancellation]): Kills the process when cancelled.
+
+    Returns:
+        int: The return code; negative if the process was killed by a signal.
+
+    Raises:
+        subprocess.TimeoutExpired: If the process ran longer than ``timeout``.
+        OSError: If the process cannot be started.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    process = spawn(
+        args,
+        shell=shell,
+        cwd=cwd,
+        stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if cancellation is not None:
+        cancellation.attach(process)
+    with process, selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ, on_stdout)
+        selector.register(process.stderr, selectors.EVENT_READ, on_stderr)
+        input_view = memoryview(stdin or b"")
+        written = 0
+        if process.stdin is not None:
+            if input_view:
+                os.set_blocking(process.stdin.fileno(), False)
+                selector.register(process.stdin, selectors.EVENT_WRITE)
+            else:
+                process.stdin.close()
+
+        try:
+            while selector.get_map():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise subprocess.TimeoutExpired(args, timeout)
+                for key, _ in selector.select(remaining):
+                    if key.fileobj is process.stdin:
+                        try:
+                            written += os.write(key.fd, input_view[written : written + _WRITE_SIZE])
+                        except BlockingIOError:
+                            continue
+                        except BrokenPipeError:
+                            # The child exited or closed stdin without reading everything
+                            written = len(input_view)
+                        if written >= len(input_view):
+                            selector.unregister(key.fileobj)
+                            process.stdin.close()
+                        continue
+                    data = os.read(key.fd, _READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        continue
+                    key.data(data)
+
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            return process.wait(remaining)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            if cancellation is not None:
+                cancellation.detach()
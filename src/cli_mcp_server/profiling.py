@@ -0,0 +1,164 @@
+import collections
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Counter, Dict, List, Optional
+
+PROFILE_ACTIONS = ("cpu", "memory_start", "memory_snapshot", "memory_stop")
+
+# Frames recorded per allocation while tracemalloc traces, enough to reach the tool handlers
+_TRACE_FRAMES = 25
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter[str]:
+    """
+    Samples the stacks of every other thread for ``seconds``.
+
+    Returns:
+        Counter[str]: Sample counts by collapsed stack, the thread name followed
+            by the frames from the outermost in, separated by semicolons.
+    """
+    counts: Counter[str] = collections.Counter()
+    own_thread = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_frame_label(frame))
+                frame = frame.f_back
+            frames.append(names.get(thread_id, f"thread-{thread_id}"))
+            counts[";".join(reversed(frames))] += 1
+        time.sleep(interval)
+    return counts
+
+
+class Profiler:
+    """
+    Profiles the running server on request and writes the results to ``directory``.
+
+    CPU profiles are sampled from a separate thread, so the event loop keeps
+    serving requests and shows up in the profile; they are written as
+    collapsed stacks, one ``stack count`` line each, as read by flamegraph.pl
+    and speedscope. Memory profiles are tracemalloc snapshots: each snapshot is
+    dumped and compared with the previous one, listing the allocation sites that
+    grew the most with the calls that led to them.
+    """
+
+    def __init__(self, directory: str, max_seconds: float = 60.0):
+        self.directory = directory
+        self.max_seconds = max_seconds
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._cpu_lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    def _path(self, kind: str, suffix: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.directory, f"{kind}-{stamp}-{os.getpid()}-{next(self._sequence)}.{suffix}")
+
+    def cpu(self, seconds: float, interval: float = 0.005) -> Dict:
+        """Samples all threads for ``seconds`` and writes the collapsed stacks."""
+        if not 0 < seconds <= self.max_seconds:
+            raise ValueError(f"seconds must be between 0 and {self.max_seconds:g}")
+        if not self._cpu_lock.acquire(blocking=False):
+            raise ValueError("A CPU profile is already running")
+        try:
+            counts = sample_stacks(seconds, interval)
+        finally:
+            self._cpu_lock.release()
+        path = self._path("cpu", "collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        return {"path": path, "samples": sum(counts.values()), "stacks": len(counts)}
+
+    def memory_start(self) -> Dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(_TRACE_FRAMES)
+        self._previous = None
+        return {"tracing": True}
+
+    def memory_stop(self) -> Dict:
+        tracemalloc.stop()
+        self._previous = None
+        return {"tracing": False}
+
+    def memory_snapshot(self, limit: int = 10) -> Dict:
+        """
+        Dumps a tracemalloc snapshot and writes its difference from the previous one.
+
+        Tracing starts on the first snapshot if it was not running, so the
+        first snapshot has nothing to compare with.
+        """
+        if not tracemalloc.is_tracing():
+            self.memory_start()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+        )
+        path = self._path("memory", "snapshot")
+        snapshot.dump(path)
+        result: Dict = {"path": path, "traced_bytes": tracemalloc.get_traced_memory()[0], "top": []}
+        if self._previous is not None:
+            differences = snapshot.compare_to(self._previous, "traceback")
+            result["diff_path"] = self._path("memory-diff", "txt")
+            with open(result["diff_path"], "w", encoding="utf-8") as f:
+                for difference in differences:
+                    f.write(f"{difference}\n")
+                    for line in difference.traceback.format(most_recent_first=True):
+                        f.write(f"{line}\n")
+                    f.write("\n")
+            result["top"] = [
+                {
+                    "site": str(difference.traceback[-1]),
+                    "size_diff": difference.size_diff,
+                    "count_diff": difference.count_diff,
+                    "size": difference.size,
+                }
+                for difference in differences[:limit]
+            ]
+        self._previous = snapshot
+        return result
+
+
+def format_profile(action: str, result: Dict) -> str:
+    if action == "cpu":
+        return f"Wrote {result['samples']} samples in {result['stacks']} distinct stacks to {result['path']}"
+    if action in ("memory_start", "memory_stop"):
+        return f"Memory tracing {'started' if result['tracing'] else 'stopped'}"
+    lines: List[str] = [f"Wrote snapshot of {result['traced_bytes']} traced bytes to {result['path']}"]
+    if "diff_path" not in result:
+        lines.append("Take another snapshot to see which allocation sites grow")
+        return "\n".join(lines)
+    lines.append(f"Wrote full comparison with the previous snapshot to {result['diff_path']}")
+    lines.append("Largest growth:")
+    lines += [
+        f"  {entry['site']}: {entry['size_diff']:+d} bytes ({entry['count_diff']:+d} blocks)" for entry in result["top"]
+    ]
+    return "\n".join(lines)
+
+
+def load_profiler() -> Optional[Profiler]:
+    """
+    Creates the profiler from environment variables.
+
+    Environment Variables:
+        PROFILE_DIR: Directory profiles are written to; profiling is disabled when unset
+        PROFILE_MAX_SECONDS: Longest CPU profile allowed (default: 60)
+        PROFILE_SIGNAL_SECONDS: Length of the CPU profile taken on SIGUSR1 (default: 10)
+    """
+    directory = os.getenv("PROFILE_DIR")
+    if not directory:
+        return None
+    return Profiler(directory, max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "60")))
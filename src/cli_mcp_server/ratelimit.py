@@ -0,0 +1,132 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+RATE_LIMIT_KEYS = ("session", "client")
+
+# Suggested wait for a client at its concurrency quota, as its running commands' runtimes are unknown
+_CONCURRENCY_RETRY_AFTER = 1.0
+
+
+class RateLimitExceeded(Exception):
+    """A client is over its request rate or its concurrent command quota"""
+
+    def __init__(self, message: str, reason: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class ClientState:
+    """Token bucket and running commands of one client"""
+
+    tokens: float
+    updated_at: float = field(default_factory=time.monotonic)
+    active: int = 0
+
+
+class AdmissionController:
+    """
+    Admits or rejects tool calls per client before any other work is done.
+
+    Each client has a token bucket refilled at ``rate`` tokens per second up to
+    ``burst`` tokens; a call takes one token. Commands additionally count
+    against a quota of concurrently running commands. Limits are passed on
+    each call, so a policy reload applies to the next call. Clients that have
+    been idle for ``idle_timeout`` seconds are forgotten.
+
+    All methods are called from the event loop and do not block.
+    """
+
+    def __init__(self, key: str = "session", idle_timeout: float = 600.0):
+        if key not in RATE_LIMIT_KEYS:
+            raise ValueError(f"Invalid RATE_LIMIT_KEY '{key}', expected one of: {', '.join(RATE_LIMIT_KEYS)}")
+        self.key = key
+        self.idle_timeout = idle_timeout
+        self.clients: Dict[str, ClientState] = {}
+        self._last_expiry = time.monotonic()
+
+    def _expire(self, now: float) -> None:
+        if now - self._last_expiry < self.idle_timeout:
+            return
+        self._last_expiry = now
+        for client in [
+            client
+            for client, state in self.clients.items()
+            if not state.active and now - state.updated_at > self.idle_timeout
+        ]:
+            del self.clients[client]
+
+    def admit(
+        self,
+        client: str,
+        rate: float,
+        burst: int,
+        max_concurrent: Optional[int] = None,
+    ) -> None:
+        """
+        Admits a call, taking a token and, for commands, a concurrency slot.
+
+        Args:
+            client (str): Client identity.
+            rate (float): Tokens added per second; 0 disables rate limiting.
+            burst (int): Bucket capacity.
+            max_concurrent (Optional[int]): Concurrent command quota for a
+                command, None for other calls; 0 disables the quota.
+
+        Raises:
+            RateLimitExceeded: If the client is over a limit. Nothing is taken then.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        burst = max(1, burst)
+        state = self.clients.get(client)
+        if state is None:
+            state = self.clients[client] = ClientState(tokens=burst, updated_at=now)
+        else:
+            state.tokens = min(burst, state.tokens + (now - state.updated_at) * rate)
+            state.updated_at = now
+
+        if max_concurrent and state.active >= max_concurrent:
+            raise RateLimitExceeded(
+                f"{state.active} commands already running, the limit is {max_concurrent}",
+                "concurrency",
+                _CONCURRENCY_RETRY_AFTER,
+            )
+        if rate > 0:
+            if state.tokens < 1:
+                raise RateLimitExceeded(
+                    f"more than {rate:g} calls per second", "rate", (1 - state.tokens) / rate
+                )
+            state.tokens -= 1
+        if max_concurrent is not None:
+            state.active += 1
+
+    def release(self, client: str) -> None:
+        """Frees the concurrency slot taken by a command."""
+        state = self.clients.get(client)
+        if state is not None and state.active:
+            state.active -= 1
+            state.updated_at = time.monotonic()
+
+    def gauges(self) -> Dict[str, float]:
+        return {
+            "admission_clients": len(self.clients),
+            "admission_active_commands": sum(state.active for state in self.clients.values()),
+        }
+
+
+def load_admission_controller() -> AdmissionController:
+    """
+    Creates the admission controller from environment variables.
+
+    The limits themselves are part of the security policy (see
+    ``load_security_config``); this only chooses how clients are told apart.
+
+    Environment Variables:
+        RATE_LIMIT_KEY: 'session' to limit each MCP session, or 'client' to limit
+                        all sessions of a client name together (default: session)
+    """
+    return AdmissionController(key=os.getenv("RATE_LIMIT_KEY", "session").lower())
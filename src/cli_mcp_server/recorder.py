@@ -0,0 +1,129 @@
+import hashlib
+import os
+from dataclasses import dataclass, asdict, replace
+from typing import Any, Dict, List, Optional
+
+from .logwriter import BackgroundLogWriter
+
+# Arguments that carry file contents or command input rather than describe the call
+PAYLOAD_ARGUMENTS = ("content", "stdin")
+
+
+@dataclass
+class CallRecord:
+    """
+    Outcome and timings of a single tools/call request
+    """
+
+    tool: str
+    arguments: Dict[str, Any]
+    started_at: float
+    duration_ms: float = 0.0
+    outcome: str = "ok"
+    error: Optional[str] = None
+    returncode: Optional[int] = None
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    argv: Optional[List[str]] = None
+    cwd: Optional[str] = None
+    profile: Optional[str] = None
+
+
+def _redact(value: Any) -> Any:
+    """
+    Replaces a payload with its length and a short digest so recorded calls can
+    still be grouped without storing their contents.
+    """
+    if isinstance(value, str):
+        digest = hashlib.sha256(value.encode("utf-8", "replace")).hexdigest()[:16]
+        return {"redacted": True, "length": len(value), "sha256": digest}
+    if isinstance(value, dict):
+        return {key: _redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def _limit(value: Any, max_length: int) -> Any:
+    """Truncates strings longer than ``max_length``, keeping their length."""
+    if isinstance(value, str) and len(value) > max_length:
+        return {"truncated": True, "length": len(value), "prefix": value[:max_length]}
+    if isinstance(value, dict):
+        return {key: _limit(item, max_length) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_limit(item, max_length) for item in value]
+    return value
+
+
+class CallRecorder:
+    """
+    Records tool calls to a rotating JSON lines file for later replay.
+
+    Each entry holds the tool name, its arguments, the outcome (``ok``,
+    ``rejected``, ``timeout``, ``error`` or ``cancelled``), timings, return
+    code and output sizes. Writes go through a ``BackgroundLogWriter`` so recording only costs
+    an enqueue on the request path.
+
+    Payload arguments (``PAYLOAD_ARGUMENTS``) are replaced with their length
+    unless ``record_payloads`` is set, and any other string argument longer than
+    ``max_argument_length`` is truncated, so a large upload or stdin does not
+    end up in the log.
+    """
+
+    def __init__(
+        self,
+        writer: BackgroundLogWriter,
+        redact: bool = False,
+        record_payloads: bool = False,
+        max_argument_length: int = 4096,
+    ):
+        self.writer = writer
+        self.redact = redact
+        self.record_payloads = record_payloads
+        self.max_argument_length = max_argument_length
+
+    def record(self, call: CallRecord) -> bool:
+        arguments = dict(call.arguments)
+        if not self.record_payloads:
+            for name in PAYLOAD_ARGUMENTS:
+                if isinstance(arguments.get(name), str):
+                    arguments[name] = {"redacted": True, "length": len(arguments[name])}
+        # Build the entry from the limited arguments, as asdict would copy the payloads
+        entry = asdict(replace(call, arguments={}))
+        entry["arguments"] = _limit(arguments, self.max_argument_length)
+        if self.redact:
+            entry["arguments"] = _redact(entry["arguments"])
+            entry["argv"] = _redact(entry["argv"])
+        return self.writer.write(entry)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def load_recorder() -> Optional[CallRecorder]:
+    """
+    Creates the call recorder from environment variables.
+
+    Environment Variables:
+        RECORD_FILE: Path of the recording log; recording is disabled when unset
+        RECORD_MAX_BYTES: Size at which the log is rotated (default: 10485760)
+        RECORD_BACKUP_COUNT: Number of rotated logs to keep (default: 5)
+        RECORD_REDACT: Replace command payloads with digests (default: false)
+        RECORD_PAYLOADS: Record file contents and stdin instead of their length (default: false)
+        RECORD_MAX_ARGUMENT_LENGTH: Characters kept of longer string arguments (default: 4096)
+    """
+    path = os.getenv("RECORD_FILE")
+    if not path:
+        return None
+    writer = BackgroundLogWriter(
+        path,
+        max_bytes=int(os.getenv("RECORD_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(os.getenv("RECORD_BACKUP_COUNT", "5")),
+    )
+    redact = os.getenv("RECORD_REDACT", "false").lower() in ("true", "1")
+    return CallRecorder(
+        writer,
+        redact=redact,
+        record_payloads=os.getenv("RECORD_PAYLOADS", "false").lower() in ("true", "1"),
+        max_argument_length=int(os.getenv("RECORD_MAX_ARGUMENT_LENGTH", "4096")),
+    )
@@ -0,0 +1,272 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+SCHEDULING_POLICIES = ("fifo", "sjf")
+DEADLINE_POLICIES = ("warn", "reject")
+
+
+def runtime_key(command: str, args: List[str]) -> str:
+    """
+    Builds the key runtime estimates are kept under from a validated command.
+
+    The key is the command name plus its first argument when that argument looks
+    like a subcommand (``git status``, ``make test``); flags and paths are left
+    out so that, for example, every ``cat`` shares one estimate. Commands with
+    shell operators arrive as a single string and are keyed by their first words.
+    """
+    tokens = [command, *args] if args else command.split()
+    if not tokens:
+        return ""
+    key = os.path.basename(tokens[0])
+    if len(tokens) > 1:
+        first = tokens[1]
+        if not first.startswith("-") and "/" not in first and "." not in first:
+            key = f"{key} {first}"
+    return key
+
+
+class RuntimeEstimator:
+    """
+    Per-command runtime estimates as exponentially decayed moving averages.
+
+    Estimates are kept in memory and, when ``path`` is set, loaded from and saved
+    to a JSON file. Saves happen every ``save_every`` updates and on ``save()``.
+    """
+
+    def __init__(
+        self,
+        decay: float = 0.3,
+        path: Optional[str] = None,
+        default_estimate: float = 1.0,
+        save_every: int = 20,
+    ):
+        self.decay = decay
+        self.path = path
+        self.default_estimate = default_estimate
+        self.save_every = save_every
+        self._estimates: Dict[str, float] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._estimates = {
+                        str(key): float(value) for key, value in json.load(f).items()
+                    }
+            except (OSError, ValueError, AttributeError):
+                self._estimates = {}
+
+    def estimate(self, key: str) -> Optional[float]:
+        """
+        Returns the expected runtime in seconds, or None if the command has no history.
+        """
+        return self._estimates.get(key)
+
+    def update(self, key: str, seconds: float) -> None:
+        with self._lock:
+            previous = self._estimates.get(key)
+            self._estimates[key] = (
+                seconds
+                if previous is None
+                else self.decay * seconds + (1 - self.decay) * previous
+            )
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = dict(self._estimates)
+            self._unsaved = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+
+class CommandScheduler:
+    """
+    Runs commands in worker threads with a concurrency limit and a queue policy.
+
+    With the ``fifo`` policy queued commands start in arrival order. With ``sjf``
+    the command with the shortest expected runtime starts first, where expected
+    runtime comes from the ``RuntimeEstimator``. To prevent starvation each second
+    spent waiting reduces a command's priority value by ``aging`` seconds. As all
+    waiters age at the same rate, that priority is fixed at enqueue time as
+    ``estimate + aging * enqueued_at`` and the queue can be a plain heap.
+    """
+
+    def __init__(
+        self,
+        estimator: RuntimeEstimator,
+        max_concurrent: int = 4,
+        policy: str = "fifo",
+        aging: float = 1.0,
+        deadline_policy: str = "warn",
+    ):
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(
+                f"Invalid scheduling policy '{policy}', expected one of: {', '.join(SCHEDULING_POLICIES)}"
+            )
+        if deadline_policy not in DEADLINE_POLICIES:
+            raise ValueError(
+                f"Invalid deadline policy '{deadline_policy}', expected one of: {', '.join(DEADLINE_POLICIES)}"
+            )
+        self.estimator = estimator
+        self.max_concurrent = max(1, max_concurrent)
+        self.policy = policy
+        self.aging = aging
+        self.deadline_policy = deadline_policy
+        self.running = 0
+        self._waiters: list = []
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _priority(self, key: str, enqueued_at: float) -> float:
+        if self.policy == "fifo":
+            return enqueued_at
+        estimate = self.estimator.estimate(key)
+        if estimate is None:
+            estimate = self.estimator.default_estimate
+        return estimate + self.aging * enqueued_at
+
+    async def _acquire(self, key: str) -> None:
+        if self.running < self.max_concurrent and not self._waiters:
+            self.running += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (self._priority(key, time.monotonic()), next(self._sequence), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before cancellation, pass it on
+                self._release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    async def run(
+        self,
+        key: str,
+        func: Callable[[], T],
+        on_cancel: Optional[Callable[[], None]] = None,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> T:
+        """
+        Waits for a slot according to the queue policy, then runs ``func`` in a
+        worker thread and feeds its runtime back into the estimator.
+
+        The slot is held until the worker thread finishes, even if the caller is
+        cancelled first; a thread cannot be stopped, so ``on_cancel`` is called
+        instead to make ``func`` return early, for example by killing its process.
+        ``on_done`` is called once the worker has finished, or when the call ends
+        without starting it, to free other resources held for the command.
+        """
+        try:
+            await self._acquire(key)
+        except BaseException:
+            if on_done is not None:
+                on_done()
+            raise
+
+        def timed() -> T:
+            started = time.perf_counter()
+            try:
+                return func()
+            finally:
+                self.estimator.update(key, time.perf_counter() - started)
+
+        def finished(worker: asyncio.Future) -> None:
+            self._release()
+            if on_done is not None:
+                on_done()
+            # Nobody may be waiting for the result any more
+            if not worker.cancelled():
+                worker.exception()
+
+        try:
+            worker = asyncio.ensure_future(asyncio.to_thread(timed))
+        except BaseException:
+            self._release()
+            if on_done is not None:
+                on_done()
+            raise
+        worker.add_done_callback(finished)
+        try:
+            return await asyncio.shield(worker)
+        except asyncio.CancelledError:
+            if not worker.done() and on_cancel is not None:
+                on_cancel()
+            raise
+
+    def check_deadline(self, key: str, deadline: Optional[float]) -> Optional[str]:
+        """
+        Compares a command's expected runtime with the caller's deadline.
+
+        Returns:
+            Optional[str]: A message if the expected runtime exceeds the deadline, otherwise None.
+        """
+        if deadline is None:
+            return None
+        estimate = self.estimator.estimate(key)
+        if estimate is None or estimate <= deadline:
+            return None
+        return (
+            f"Expected runtime of '{key}' is {estimate:.1f} seconds, "
+            f"which exceeds the deadline of {deadline:g} seconds"
+        )
+
+
+def load_scheduler() -> CommandScheduler:
+    """
+    Creates the command scheduler from environment variables.
+
+    Environment Variables:
+        MAX_CONCURRENT_COMMANDS: Maximum number of commands running at once (default: 4)
+        SCHEDULING_POLICY: Queue order, 'fifo' or 'sjf' for shortest expected first (default: fifo)
+        SCHEDULING_AGING: Seconds of expected runtime credited per second spent waiting (default: 1.0)
+        RUNTIME_ESTIMATE_DECAY: Weight of the latest runtime in the moving average (default: 0.3)
+        RUNTIME_ESTIMATES_FILE: JSON file to persist runtime estimates in (default: not persisted)
+        DEADLINE_POLICY: 'warn' or 'reject' when the expected runtime exceeds the deadline (default: warn)
+    """
+    estimator = RuntimeEstimator(
+        decay=float(os.getenv("RUNTIME_ESTIMATE_DECAY", "0.3")),
+        path=os.getenv("RUNTIME_ESTIMATES_FILE") or None,
+    )
+    return CommandScheduler(
+        estimator,
+        max_concurrent=int(os.getenv("MAX_CONCURRENT_COMMANDS", "4")),
+        policy=os.getenv("SCHEDULING_POLICY", "fifo").lower(),
+        aging=float(os.getenv("SCHEDULING_AGING", "1.0")),
+        deadline_policy=os.getenv("DEADLINE_POLICY", "warn").lower(),
+    )
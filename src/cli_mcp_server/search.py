@@ -0,0 +1,477 @@
+import fnmatch
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+from .ignore import IgnoreRules
+from .watcher import InotifyWatcher, WatchEvent
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trigrams (
+    trigram BLOB NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (trigram, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trigrams_file_id ON trigrams (file_id);
+"""
+
+# Longest matched line returned, in characters
+_MAX_LINE_LENGTH = 500
+# Trigrams looked up per query; more only narrow an already small candidate set
+_MAX_QUERY_TRIGRAMS = 24
+# Files verified per batch before checking whether the page is full
+_VERIFY_BATCH = 64
+
+
+def _trigrams(data: bytes) -> Set[bytes]:
+    data = data.lower()
+    return {data[i : i + 3] for i in range(len(data) - 2)}
+
+
+def _literal_runs(parsed, runs: List[str]) -> None:
+    """Collects literal strings that every match of a parsed regex must contain."""
+    current = []
+
+    def flush() -> None:
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            current.append(chr(av))
+            continue
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            _literal_runs(av[-1], runs)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            _literal_runs(av[2], runs)
+    flush()
+
+
+def required_literals(pattern: str, flags: int = 0) -> List[str]:
+    """
+    Returns literal strings that any line matching ``pattern`` must contain.
+
+    Alternations, character classes and optional parts contribute nothing, so
+    the result is a necessary condition only; candidates are always verified
+    with the full regex.
+    """
+    runs: List[str] = []
+    _literal_runs(sre_parse.parse(pattern, flags), runs)
+    if flags & re.IGNORECASE:
+        # The index folds ASCII case only
+        runs = [run for run in runs if run.isascii()]
+    return runs
+
+
+def _read_text(path: str, max_bytes: int) -> Optional[bytes]:
+    """Returns the contents of a text file, or None for binary and oversized files."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > max_bytes:
+            return None
+        data = f.read(max_bytes + 1)
+    if len(data) > max_bytes or b"\x00" in data[:8192]:
+        return None
+    return data
+
+
+def match_file(path: str, regex: re.Pattern, max_bytes: int) -> List[Tuple[int, str]]:
+    """
+    Returns ``(line_number, line)`` for each line of a file matching ``regex``.
+    Binary, oversized and unreadable files have no matches.
+    """
+    try:
+        data = _read_text(path, max_bytes)
+    except OSError:
+        return []
+    if data is None:
+        return []
+    text = data.decode("utf-8", errors="replace")
+    if not regex.search(text):
+        return []
+    return [
+        (number, line[:_MAX_LINE_LENGTH])
+        for number, line in enumerate(text.splitlines(), 1)
+        if regex.search(line)
+    ]
+
+
+class SearchIndex:
+    """
+    Trigram index of the text files under a directory, stored in SQLite.
+
+    A background thread builds the index, then keeps it current from inotify
+    events on every indexed directory; where inotify is unavailable or the watch
+    limit is reached, the tree is rescanned every ``rescan_interval`` seconds
+    instead. Files and directories excluded by .gitignore are not indexed.
+
+    Queries look up the trigrams of the literal parts of a regex to find
+    candidate files and verify each candidate with the regex. Until the first
+    build has finished, queries scan the whole tree instead.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        db_path: str,
+        watcher: Optional[InotifyWatcher] = None,
+        max_file_bytes: int = 1024 * 1024,
+        rescan_interval: float = 60.0,
+        workers: Optional[int] = None,
+    ):
+        self.root = root
+        self.db_path = db_path
+        self.watcher = watcher
+        self.max_file_bytes = max_file_bytes
+        self.rescan_interval = rescan_interval
+        self.ignore = IgnoreRules(root)
+        self.ready = threading.Event()
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers or min(8, os.cpu_count() or 1), thread_name_prefix="search"
+        )
+        self._pending: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._rescan = True
+        self._closed = False
+        self._watched: Set[str] = set()
+        self._watch_complete = watcher is not None
+        self._unsubscribe = watcher.subscribe(self._on_event) if watcher else None
+        self._thread = threading.Thread(target=self._run, name="search-indexer", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        if self._unsubscribe:
+            self._unsubscribe()
+        for directory in self._watched:
+            self.watcher.remove(directory)
+        self._watched.clear()
+        self._pool.shutdown(wait=False)
+
+    def _relative(self, path: str) -> Optional[str]:
+        if path == self.root:
+            return ""
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path[len(self.root) + 1 :].replace(os.sep, "/")
+
+    def _on_event(self, event: WatchEvent) -> None:
+        if event.kind == "overflow":
+            self._rescan = True
+        elif self._relative(event.path) is not None:
+            with self._pending_lock:
+                self._pending.add(event.path)
+        else:
+            return
+        self._wakeup.set()
+
+    def _walk(self, start: str = "", watch: bool = False) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """
+        Yields ``(relative_path, path, stat)`` for the regular files under ``start``
+        that are not ignored. Symlinks are not followed.
+        """
+        stack = [start]
+        while stack:
+            relative_dir = stack.pop()
+            directory = os.path.join(self.root, relative_dir) if relative_dir else self.root
+            if watch and self.watcher is not None and directory not in self._watched:
+                if self.watcher.add(directory):
+                    self._watched.add(directory)
+                else:
+                    self._watch_complete = False
+            try:
+                iterator = os.scandir(directory)
+            except OSError:
+                continue
+            with iterator:
+                for entry in iterator:
+                    relative = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                    try:
+                        info = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.S_ISDIR(info.st_mode):
+                        if not self.ignore.matches(relative, True):
+                            stack.append(relative)
+                    elif stat.S_ISREG(info.st_mode) and info.st_size <= self.max_file_bytes:
+                        if not self.ignore.matches(relative, False):
+                            yield relative, entry.path, info
+
+    def _run(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            last_scan = 0.0
+            while not self._closed:
+                if self._rescan or (
+                    not self._watch_complete
+                    and time.monotonic() - last_scan >= self.rescan_interval
+                ):
+                    self._rescan = False
+                    with self._pending_lock:
+                        self._pending.clear()
+                    try:
+                        self._refresh(conn)
+                    except (OSError, sqlite3.Error):
+                        logger.exception("Failed to index %s", self.root)
+                    last_scan = time.monotonic()
+                    self.ready.set()
+                    continue
+                self._wakeup.wait(self.rescan_interval if not self._watch_complete else None)
+                self._wakeup.clear()
+                # Let a burst of events (a checkout, a build) settle into one update
+                time.sleep(0.05)
+                with self._pending_lock:
+                    pending, self._pending = self._pending, set()
+                if pending and not self._rescan:
+                    try:
+                        self._update(conn, pending)
+                    except (OSError, sqlite3.Error):
+                        logger.exception("Failed to update the index of %s", self.root)
+        finally:
+            conn.close()
+
+    def _index_file(self, conn: sqlite3.Connection, relative: str, path: str, info: os.stat_result) -> None:
+        try:
+            data = _read_text(path, self.max_file_bytes)
+        except OSError:
+            data = None
+        if data is None:
+            self._delete(conn, relative)
+            return
+        row = conn.execute("SELECT id FROM files WHERE path = ?", (relative,)).fetchone()
+        if row is None:
+            file_id = conn.execute(
+                "INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                (relative, info.st_mtime_ns, info.st_size),
+            ).lastrowid
+        else:
+            file_id = row[0]
+            conn.execute(
+                "UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                (info.st_mtime_ns, info.st_size, file_id),
+            )
+            conn.execute("DELETE FROM trigrams WHERE file_id = ?", (file_id,))
+        conn.executemany(
+            "INSERT INTO trigrams (trigram, file_id) VALUES (?, ?)",
+            ((trigram, file_id) for trigram in _trigrams(data)),
+        )
+
+    def _delete(self, conn: sqlite3.Connection, relative: str, recursive: bool = False) -> None:
+        query = "SELECT id FROM files WHERE path = ?"
+        params: Tuple[str, ...] = (relative,)
+        if recursive:
+            escaped = relative.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query += " OR path LIKE ? ESCAPE '\\'"
+            params += (f"{escaped}/%",)
+        ids = [(row[0],) for row in conn.execute(query, params)]
+        conn.executemany("DELETE FROM trigrams WHERE file_id = ?", ids)
+        conn.executemany("DELETE FROM files WHERE id = ?", ids)
+
+    def _refresh(self, conn: sqlite3.Connection) -> None:
+        """Brings the index in line with the tree, reindexing files whose mtime or size changed."""
+        known = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in conn.execute("SELECT path, mtime_ns, size FROM files")
+        }
+        seen = set()
+        changed = 0
+        for relative, path, info in self._walk(watch=True):
+            if self._closed:
+                return
+            seen.add(relative)
+            if known.get(relative) == (info.st_mtime_ns, info.st_size):
+                continue
+            self._index_file(conn, relative, path, info)
+            changed += 1
+            if changed % 500 == 0:
+                conn.commit()
+        for relative in known.keys() - seen:
+            self._delete(conn, relative)
+        conn.commit()
+
+    def _update(self, conn: sqlite3.Connection, paths: Set[str]) -> None:
+        for path in sorted(paths):
+            relative = self._relative(path)
+            if not relative:
+                continue
+            if os.path.basename(relative) == ".gitignore":
+                self.ignore.invalidate(os.path.dirname(relative))
+                self._rescan = True
+                continue
+            try:
+                info = os.lstat(path)
+            except OSError:
+                # Deleted or moved away, possibly a whole directory
+                self._delete(conn, relative, recursive=True)
+                for directory in [d for d in self._watched if d == path or d.startswith(path + os.sep)]:
+                    self._watched.discard(directory)
+                    self.watcher.remove(directory)
+                continue
+            is_dir = stat.S_ISDIR(info.st_mode)
+            if self.ignore.is_ignored(relative, is_dir):
+                self._delete(conn, relative, recursive=is_dir)
+            elif is_dir:
+                for file_relative, file_path, file_info in self._walk(relative, watch=True):
+                    self._index_file(conn, file_relative, file_path, file_info)
+            elif stat.S_ISREG(info.st_mode) and info.st_size <= self.max_file_bytes:
+                self._index_file(conn, relative, path, info)
+            else:
+                self._delete(conn, relative)
+        conn.commit()
+
+    def _candidates(self, literals: List[str]) -> List[str]:
+        trigrams = set()
+        for literal in literals:
+            trigrams |= _trigrams(literal.encode("utf-8"))
+        trigrams = sorted(trigrams)[:_MAX_QUERY_TRIGRAMS]
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            if not trigrams:
+                rows = conn.execute("SELECT path FROM files ORDER BY path")
+            else:
+                lookup = " INTERSECT ".join(
+                    ["SELECT file_id FROM trigrams WHERE trigram = ?"] * len(trigrams)
+                )
+                rows = conn.execute(
+                    f"SELECT path FROM files WHERE id IN ({lookup}) ORDER BY path", trigrams
+                )
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+
+    def search(
+        self,
+        pattern: str,
+        path: str = "",
+        fixed_string: bool = False,
+        case_sensitive: bool = True,
+        glob: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """
+        Finds lines matching a regular expression.
+
+        Args:
+            pattern (str): Regular expression, or a literal string with ``fixed_string``.
+            path (str): File or directory to search, relative to the root.
+            fixed_string (bool): Treat ``pattern`` as a literal string.
+            case_sensitive (bool): Match case.
+            glob (Optional[str]): Only search files whose name (or relative path, if
+                the glob contains '/') matches this pattern.
+            offset (int): Number of matches to skip.
+            limit (int): Maximum number of matches returned.
+
+        Returns:
+            Dict[str, Any]: ``matches`` (path, line, text), ``offset``, ``next_offset``
+                (None on the last page), ``indexed`` (False while the index is still
+                being built) and ``files_searched``.
+
+        Raises:
+            ValueError: If the pattern is not a valid regular expression.
+            sqlite3.Error: If the index cannot be read.
+        """
+        if fixed_string:
+            pattern = re.escape(pattern)
+        flags = 0 if case_sensitive else re.IGNORECASE
+        try:
+            regex = re.compile(pattern, flags)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern: {e}")
+
+        path = path.strip("/")
+        full_path = os.path.join(self.root, path) if path else self.root
+        indexed = self.ready.is_set()
+        if os.path.isfile(full_path):
+            candidates = [path]
+        elif indexed:
+            candidates = self._candidates(required_literals(pattern, flags))
+            if path:
+                candidates = [c for c in candidates if c.startswith(path + "/")]
+        else:
+            candidates = sorted(relative for relative, _, _ in self._walk(path))
+        if glob:
+            key = (lambda c: c) if "/" in glob else (lambda c: c.rsplit("/", 1)[-1])
+            candidates = [c for c in candidates if fnmatch.fnmatchcase(key(c), glob)]
+
+        matches = []
+        files_searched = 0
+        wanted = offset + limit + 1
+        for start in range(0, len(candidates), _VERIFY_BATCH):
+            batch = candidates[start : start + _VERIFY_BATCH]
+            results = self._pool.map(
+                lambda relative: match_file(
+                    os.path.join(self.root, relative), regex, self.max_file_bytes
+                ),
+                batch,
+            )
+            for relative, found in zip(batch, results):
+                files_searched += 1
+                matches.extend({"path": relative, "line": line, "text": text} for line, text in found)
+            if len(matches) >= wanted:
+                break
+
+        page = matches[offset : offset + limit]
+        return {
+            "matches": page,
+            "offset": offset,
+            "next_offset": offset + len(page) if len(matches) > offset + limit else None,
+            "indexed": indexed,
+            "files_searched": files_searched,
+        }
+
+
+def search_index_path(root: str, directory: str) -> str:
+    """Returns the index database of ``root`` inside the index directory."""
+    digest = hashlib.sha256(root.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"search-{digest}.db")
+
+
+def load_search_index(root: str, watcher: Optional[InotifyWatcher] = None) -> SearchIndex:
+    """
+    Starts indexing ``root`` from environment variables.
+
+    Environment Variables:
+        SEARCH_INDEX_DIR: Directory holding the index databases
+                          (default: ~/.cache/cli-mcp-server)
+        SEARCH_MAX_FILE_BYTES: Larger files are not indexed or searched (default: 1048576)
+        SEARCH_RESCAN_INTERVAL: Seconds between rescans when inotify is unavailable (default: 60)
+    """
+    directory = os.getenv("SEARCH_INDEX_DIR") or os.path.join(
+        os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "cli-mcp-server"
+    )
+    return SearchIndex(
+        root,
+        search_index_path(root, directory),
+        watcher=watcher,
+        max_file_bytes=int(os.getenv("SEARCH_MAX_FILE_BYTES", str(1024 * 1024))),
+        rescan_interval=float(os.getenv("SEARCH_RESCAN_INTERVAL", "60")),
+    )
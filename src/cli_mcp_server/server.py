@@ -1,16 +1,47 @@
+import asyncio
+import itertools
+import logging
 import os
 import re
 import shlex
+import signal
 import subprocess
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+import threading
+import time
+import weakref
+import base64
+import json
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Mapping, Optional, Tuple, Union
 
-import mcp.server.stdio
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
+from mcp.server.session import ServerSession
+
+from .audit import load_audit_log
+from .files import WRITE_MODES, UploadManager, read_file
+from .metrics import MetricsRegistry
+from .process import Cancellation, OutputFilter, run_process
+from .policy import policy_file_signature, read_policy_file, read_profiles_file
+from .ratelimit import RateLimitExceeded, load_admission_controller
+from .scheduler import load_scheduler, runtime_key
+from .spawn import load_spawner
+from .recorder import CallRecord, load_recorder
+from .watchdog import load_loop_watchdog
+
+# Features that are off by default are imported where they are first used, to keep cold start short
+if TYPE_CHECKING:
+    from .archive import ArchiveTransfers
+    from .changes import ChangeWaiters
+    from .daemon import DaemonClient
+    from .history import ExecutionHistory
+    from .profiling import Profiler
+    from .search import SearchIndex
+    from .tree import TreeCache
 
 server = Server("cli-mcp-server")
+logger = logging.getLogger(__name__)
 
 
 class CommandError(Exception):
@@ -52,6 +83,39 @@ class SecurityConfig:
     allow_all_commands: bool = False
     allow_all_flags: bool = False
     allow_shell_operators: bool = False
+    native_tools: set[str] = field(default_factory=set)
+    read_file_max_bytes: int = 1024 * 1024
+    write_file_max_bytes: int = 100 * 1024 * 1024
+    stdin_max_bytes: int = 10 * 1024 * 1024
+    rate_limit_per_second: float = 0.0
+    rate_limit_burst: int = 10
+    max_concurrent_per_client: int = 0
+
+
+# In-process tools that bypass command execution, enabled with NATIVE_TOOLS
+NATIVE_TOOL_NAMES = (
+    "read_file",
+    "list_dir",
+    "stat",
+    "search",
+    "write_file",
+    "export_archive",
+    "import_archive",
+    "wait_for_change",
+)
+
+# Tools for operators, enabled by naming them in NATIVE_TOOLS; 'all' does not include them
+ADMIN_TOOL_NAMES = ("profile_server",)
+
+# Every tool this server can list; other names are counted as "unknown" in metrics
+TOOL_NAMES = (
+    "run_command",
+    "show_security_rules",
+    "show_metrics",
+    *NATIVE_TOOL_NAMES,
+    "query_history",
+    "profile_server",
+)
 
 
 class CommandExecutor:
@@ -61,6 +125,8 @@ class CommandExecutor:
         security_config: SecurityConfig,
         shell_exec: Optional[str] = None,
         shell_exec_args: Optional[List[str]] = None,
+        daemon: Optional["DaemonClient"] = None,
+        spawn: Callable[..., Any] = subprocess.Popen,
     ):
         if not allowed_dir or not os.path.exists(allowed_dir):
             raise ValueError("Valid ALLOWED_DIR is required")
@@ -68,6 +134,8 @@ class CommandExecutor:
         self.security_config = security_config
         self.shell_exec = shell_exec
         self.shell_exec_args = shell_exec_args or []
+        self.daemon = daemon
+        self.spawn = spawn
 
     def _normalize_path(self, path: str) -> str:
         """
@@ -94,6 +162,22 @@ class CommandExecutor:
         except Exception as e:
             raise CommandSecurityError(f"Invalid path '{path}': {str(e)}")
 
+    def _normalize_link_path(self, path: str) -> str:
+        """
+        Normalizes a path like ``_normalize_path``, but leaves a final symlink
+        unresolved: only the parent directory is resolved and checked, so the
+        link itself can be inspected with lstat.
+        """
+        parent, name = os.path.split(path.rstrip(os.sep))
+        if name in ("", ".", ".."):
+            return self._normalize_path(path)
+        try:
+            real_parent = self._normalize_path(parent)
+        except CommandSecurityError:
+            # The allowed directory itself, whose parent is outside of it
+            return self._normalize_path(path)
+        return os.path.join(real_parent, name)
+
     def validate_command(self, command_string: str) -> tuple[str, List[str]]:
         """
         Validates and parses a command string for security and formatting.
@@ -306,7 +390,14 @@ class CommandExecutor:
         # Return the original command string to be executed with shell=True
         return command_string, []
 
-    def execute(self, command_string: str) -> subprocess.CompletedProcess:
+    def execute(
+        self,
+        command_string: str,
+        stdin: Optional[Union[str, bytes]] = None,
+        stdout_filter: Optional[OutputFilter] = None,
+        stderr_filter: Optional[OutputFilter] = None,
+        cancellation: Optional[Cancellation] = None,
+    ) -> subprocess.CompletedProcess:
         """
         Executes a command string in a secure, controlled environment.
 
@@ -315,26 +406,43 @@ class CommandExecutor:
 
         Args:
             command_string (str): The command string to execute.
+            stdin (Optional[Union[str, bytes]]): Data streamed to the command's stdin; strings
+                are encoded as UTF-8. Limited by ``stdin_max_bytes``, not by the command length.
+            stdout_filter (Optional[OutputFilter]): Applied to stdout as it arrives; its
+                counters describe what was dropped once the command has finished.
+            stderr_filter (Optional[OutputFilter]): Applied to stderr as it arrives.
+            cancellation (Optional[Cancellation]): Kills the command when cancelled.
 
         Returns:
             subprocess.CompletedProcess: The result of the command execution containing
-                stdout, stderr, and return code.
+                stdout, stderr, and return code. Text output is decoded with invalid bytes
+                replaced; binary output is returned as bytes.
 
         Raises:
             CommandSecurityError: If the command:
                 - Exceeds maximum length
                 - Fails security validation
                 - Fails during execution
+                Or if stdin exceeds its maximum size.
 
         Notes:
             - Uses shell=True for commands with shell operators, shell=False otherwise
             - Uses timeout and working directory constraints
             - Captures both stdout and stderr
+            - Without stdin, the command reads from /dev/null
+            - With an executor daemon, the validated command runs there, and in-process
+              only when the daemon cannot be reached
         """
         if len(command_string) > self.security_config.max_command_length:
             raise CommandSecurityError(
                 f"Command exceeds maximum length of {self.security_config.max_command_length}"
             )
+        if isinstance(stdin, str):
+            stdin = stdin.encode("utf-8")
+        if stdin is not None and len(stdin) > self.security_config.stdin_max_bytes:
+            raise CommandSecurityError(
+                f"stdin exceeds maximum size of {self.security_config.stdin_max_bytes} bytes"
+            )
 
         try:
             command, args = self.validate_command(command_string)
@@ -351,40 +459,50 @@ class CommandExecutor:
                             f"Shell operator '{operator}' is not supported. Set ALLOW_SHELL_OPERATORS=true to enable."
                         )
 
+            shell = False
             if use_shell:
                 if self.shell_exec:
-                    shell_command = [self.shell_exec, *self.shell_exec_args]
+                    process_args = [self.shell_exec, *self.shell_exec_args]
                     if "-c" not in self.shell_exec_args:
-                        shell_command.extend(["-c", command])
+                        process_args.extend(["-c", command])
                     else:
-                        shell_command.append(command)
-                    return subprocess.run(
-                        shell_command,
-                        shell=False,
-                        text=True,
-                        capture_output=True,
-                        timeout=self.security_config.command_timeout,
-                        cwd=self.allowed_dir,
-                    )
-                # For commands with shell operators, execute with shell=True
-                return subprocess.run(
-                    command,  # command is the full command string in this case
-                    shell=True,
-                    text=True,
-                    capture_output=True,
-                    timeout=self.security_config.command_timeout,
-                    cwd=self.allowed_dir,
-                )
+                        process_args.append(command)
+                else:
+                    # For commands with shell operators, execute with shell=True
+                    process_args, shell = command, True
             else:
                 # For regular commands, execute with shell=False
-                return subprocess.run(
-                    [command] + args,
-                    shell=False,
-                    text=True,
-                    capture_output=True,
-                    timeout=self.security_config.command_timeout,
+                process_args = [command] + args
+
+            stdout_filter = stdout_filter or OutputFilter()
+            stderr_filter = stderr_filter or OutputFilter()
+            if self.daemon is not None:
+                result = self.daemon.run(
+                    process_args,
+                    shell=shell,
                     cwd=self.allowed_dir,
+                    timeout=self.security_config.command_timeout,
+                    stdin=stdin,
+                    stdout_filter=stdout_filter,
+                    stderr_filter=stderr_filter,
+                    cancellation=cancellation,
                 )
+                if result is not None:
+                    return result
+            returncode = run_process(
+                process_args,
+                shell=shell,
+                cwd=self.allowed_dir,
+                timeout=self.security_config.command_timeout,
+                stdin=stdin,
+                on_stdout=stdout_filter.feed,
+                on_stderr=stderr_filter.feed,
+                spawn=self.spawn,
+                cancellation=cancellation,
+            )
+            return subprocess.CompletedProcess(
+                process_args, returncode, stdout_filter.finish(), stderr_filter.finish()
+            )
         except subprocess.TimeoutExpired:
             raise CommandTimeoutError(
                 f"Command timed out after {self.security_config.command_timeout} seconds"
@@ -396,7 +514,7 @@ class CommandExecutor:
 
 
 # Load security configuration from environment
-def load_security_config() -> SecurityConfig:
+def load_security_config(env: Optional[Mapping[str, str]] = None) -> SecurityConfig:
     """
     Loads security configuration from environment variables with default fallbacks.
 
@@ -404,6 +522,9 @@ def load_security_config() -> SecurityConfig:
     commands, flags, patterns, and execution constraints. Uses predefined defaults if
     environment variables are not set.
 
+    Args:
+        env (Optional[Mapping[str, str]]): Variables to read instead of os.environ.
+
     Returns:
         SecurityConfig: Configuration object containing:
             - allowed_commands: Set of permitted command names
@@ -414,6 +535,13 @@ def load_security_config() -> SecurityConfig:
             - allow_all_commands: Whether all commands are allowed
             - allow_all_flags: Whether all flags are allowed
             - allow_shell_operators: Whether shell operators (&&, ||, |, etc.) are allowed
+            - native_tools: Names of the enabled in-process tools
+            - read_file_max_bytes: Maximum number of bytes returned by read_file
+            - write_file_max_bytes: Maximum size of a file written by write_file
+            - stdin_max_bytes: Maximum size of the stdin passed to run_command
+            - rate_limit_per_second: Tool calls per second allowed per client, 0 for no limit
+            - rate_limit_burst: Tool calls a client may make at once before the rate applies
+            - max_concurrent_per_client: Commands a client may run at once, 0 for no limit
 
     Environment Variables:
         ALLOWED_COMMANDS: Comma-separated list of allowed commands or 'all' (default: "ls,cat,pwd")
@@ -424,33 +552,59 @@ def load_security_config() -> SecurityConfig:
         SHELL_EXEC_ARGS: Extra arguments to pass to the shell executable (default: empty)
         ALLOW_SHELL_OPERATORS: Whether to allow shell operators like &&, ||, |, >, etc. (default: false)
                               Set to "true" or "1" to enable, any other value to disable.
+        NATIVE_TOOLS: Comma-separated list of in-process tools to enable or 'all' (default: none)
+        READ_FILE_MAX_BYTES: Maximum number of bytes returned by read_file (default: 1048576)
+        WRITE_FILE_MAX_BYTES: Maximum size of a file written by write_file (default: 104857600)
+        STDIN_MAX_BYTES: Maximum size of the stdin passed to run_command (default: 10485760)
+        RATE_LIMIT_PER_SECOND: Tool calls per second allowed per client (default: 0, no limit)
+        RATE_LIMIT_BURST: Tool calls a client may make at once before the rate applies (default: 10)
+        MAX_CONCURRENT_PER_CLIENT: Commands a client may run at once (default: 0, no limit)
     """
-    allowed_commands = os.getenv("ALLOWED_COMMANDS", "ls,cat,pwd")
-    allowed_flags = os.getenv("ALLOWED_FLAGS", "-l,-a,--help")
-    allow_shell_operators_env = os.getenv("ALLOW_SHELL_OPERATORS", "false")
-    shell_exec = os.getenv("SHELL_EXEC") or "default"
-    shell_exec_args = shlex.split(os.getenv("SHELL_EXEC_ARGS", ""))
+    env = os.environ if env is None else env
+    allowed_commands = env.get("ALLOWED_COMMANDS", "ls,cat,pwd")
+    allowed_flags = env.get("ALLOWED_FLAGS", "-l,-a,--help")
+    allow_shell_operators_env = env.get("ALLOW_SHELL_OPERATORS", "false")
+    shell_exec = env.get("SHELL_EXEC") or "default"
+    shell_exec_args = shlex.split(env.get("SHELL_EXEC_ARGS", ""))
 
     allow_all_commands = allowed_commands.lower() == "all"
     allow_all_flags = allowed_flags.lower() == "all"
     allow_shell_operators = allow_shell_operators_env.lower() in ("true", "1")
+    native_tools_env = env.get("NATIVE_TOOLS", "")
+    if native_tools_env.lower() == "all":
+        native_tools = set(NATIVE_TOOL_NAMES)
+    else:
+        native_tools = {tool.strip() for tool in native_tools_env.split(",") if tool.strip()}
+        unknown_tools = native_tools - set(NATIVE_TOOL_NAMES) - set(ADMIN_TOOL_NAMES)
+        if unknown_tools:
+            raise ValueError(
+                f"Unknown NATIVE_TOOLS: {', '.join(sorted(unknown_tools))}"
+            )
 
     return SecurityConfig(
         allowed_commands=(
             set() if allow_all_commands else set(allowed_commands.split(","))
         ),
         allowed_flags=set() if allow_all_flags else set(allowed_flags.split(",")),
-        max_command_length=int(os.getenv("MAX_COMMAND_LENGTH", "1024")),
-        command_timeout=int(os.getenv("COMMAND_TIMEOUT", "30")),
+        max_command_length=int(env.get("MAX_COMMAND_LENGTH", "1024")),
+        command_timeout=int(env.get("COMMAND_TIMEOUT", "30")),
         shell_exec=shell_exec,
         shell_exec_args=shell_exec_args,
         allow_all_commands=allow_all_commands,
         allow_all_flags=allow_all_flags,
         allow_shell_operators=allow_shell_operators,
+        native_tools=native_tools,
+        read_file_max_bytes=int(env.get("READ_FILE_MAX_BYTES", str(1024 * 1024))),
+        write_file_max_bytes=int(env.get("WRITE_FILE_MAX_BYTES", str(100 * 1024 * 1024))),
+        stdin_max_bytes=int(env.get("STDIN_MAX_BYTES", str(10 * 1024 * 1024))),
+        rate_limit_per_second=float(env.get("RATE_LIMIT_PER_SECOND", "0")),
+        rate_limit_burst=int(env.get("RATE_LIMIT_BURST", "10")),
+        max_concurrent_per_client=int(env.get("MAX_CONCURRENT_PER_CLIENT", "0")),
     )
 
-def load_shell_exec() -> Optional[str]:
-    shell_exec = os.getenv("SHELL_EXEC")
+def load_shell_exec(env: Optional[Mapping[str, str]] = None) -> Optional[str]:
+    env = os.environ if env is None else env
+    shell_exec = env.get("SHELL_EXEC")
     if not shell_exec:
         return None
     if not os.path.isabs(shell_exec):
@@ -464,25 +618,337 @@ def load_shell_exec() -> Optional[str]:
     return shell_exec
 
 
-def load_shell_exec_args() -> List[str]:
-    shell_exec_args = os.getenv("SHELL_EXEC_ARGS", "")
+def load_shell_exec_args(env: Optional[Mapping[str, str]] = None) -> List[str]:
+    env = os.environ if env is None else env
+    shell_exec_args = env.get("SHELL_EXEC_ARGS", "")
     if not shell_exec_args:
         return []
-    if not os.getenv("SHELL_EXEC"):
+    if not env.get("SHELL_EXEC"):
         raise ValueError("SHELL_EXEC_ARGS requires SHELL_EXEC to be set")
     return shlex.split(shell_exec_args)
 
 
-executor = CommandExecutor(
-    allowed_dir=os.getenv("ALLOWED_DIR", ""),
-    security_config=load_security_config(),
-    shell_exec=load_shell_exec(),
-    shell_exec_args=load_shell_exec_args(),
+def build_executor(env: Optional[Mapping[str, str]] = None) -> CommandExecutor:
+    """
+    Builds a CommandExecutor from environment variables, or from ``env`` if given.
+    """
+    from .daemon import load_daemon_client
+
+    env = os.environ if env is None else env
+    return CommandExecutor(
+        allowed_dir=env.get("ALLOWED_DIR", ""),
+        security_config=load_security_config(env),
+        shell_exec=load_shell_exec(env),
+        shell_exec_args=load_shell_exec_args(env),
+        daemon=load_daemon_client(env),
+        spawn=load_spawner(env),
+    )
+
+
+def load_policy_env() -> Dict[str, str]:
+    """
+    Returns the environment with the overrides from POLICY_FILE applied, if set.
+    """
+    env = dict(os.environ)
+    policy_file = os.getenv("POLICY_FILE")
+    if policy_file:
+        env.update(read_policy_file(policy_file))
+    return env
+
+
+DEFAULT_PROFILE = "default"
+
+
+def build_executors(env: Mapping[str, str]) -> Dict[str, CommandExecutor]:
+    """
+    Builds one CommandExecutor per workspace profile.
+
+    Without PROFILES_FILE there is a single ``default`` profile configured by the
+    environment. With PROFILES_FILE, each profile's variables are applied on top of
+    the environment, and the ``default`` profile is only added when ALLOWED_DIR is
+    set in the environment itself.
+
+    Raises:
+        OSError: If PROFILES_FILE cannot be read.
+        ValueError: If a profile's configuration is invalid.
+    """
+    profiles_file = env.get("PROFILES_FILE")
+    if not profiles_file:
+        return {DEFAULT_PROFILE: build_executor(env)}
+
+    executors = {}
+    if env.get("ALLOWED_DIR"):
+        executors[DEFAULT_PROFILE] = build_executor(env)
+    for name, overrides in read_profiles_file(profiles_file).items():
+        try:
+            executors[name] = build_executor({**env, **overrides})
+        except ValueError as e:
+            raise ValueError(f"Profile '{name}': {str(e)}")
+    if not executors:
+        raise ValueError("PROFILES_FILE does not define any profiles")
+    return executors
+
+
+# Executors are built on first use rather than at import, to keep cold start short
+_executors: Optional[Dict[str, CommandExecutor]] = None
+_executors_lock = threading.Lock()
+
+
+def get_executors() -> Dict[str, CommandExecutor]:
+    """
+    Returns the executor of every workspace profile, building them on first use.
+
+    Raises:
+        OSError: If the policy or profiles file cannot be read.
+        ValueError: If the configuration is invalid.
+    """
+    global _executors
+    if _executors is None:
+        with _executors_lock:
+            if _executors is None:
+                _executors = build_executors(load_policy_env())
+    return _executors
+
+
+def default_executor(executors: Dict[str, CommandExecutor]) -> CommandExecutor:
+    """
+    Returns the executor used when a call does not name a profile.
+    """
+    return executors.get(DEFAULT_PROFILE) or next(iter(executors.values()))
+
+
+def profile_name(executors: Dict[str, CommandExecutor], executor: CommandExecutor) -> str:
+    """
+    Returns the name of a workspace profile's executor.
+    """
+    return next((name for name, candidate in executors.items() if candidate is executor), DEFAULT_PROFILE)
+
+
+async def _load_executors() -> Dict[str, CommandExecutor]:
+    if _executors is not None:
+        return _executors
+    return await asyncio.to_thread(get_executors)
+
+
+def __getattr__(name: str) -> Any:
+    # Module attributes kept for callers that predate lazy initialization
+    if name == "executors":
+        return get_executors()
+    if name == "executor":
+        return default_executor(get_executors())
+    if name == "history":
+        return get_history()
+    if name == "archives":
+        return get_archives()
+    if name == "profiler":
+        return get_profiler()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Sessions that have talked to this server, notified when the tool list changes
+sessions: "weakref.WeakSet[ServerSession]" = weakref.WeakSet()
+
+
+def _track_session() -> None:
+    try:
+        sessions.add(server.request_context.session)
+    except LookupError:
+        pass
+
+
+_session_ids: "weakref.WeakKeyDictionary[ServerSession, str]" = weakref.WeakKeyDictionary()
+_session_counter = itertools.count(1)
+
+
+def _client_key() -> str:
+    """
+    Identifies the client of the current request for rate limiting: its
+    session, or with RATE_LIMIT_KEY=client the client name it announced.
+    """
+    try:
+        session = server.request_context.session
+    except LookupError:
+        return "local"
+    if admission.key == "client":
+        client_params = getattr(session, "client_params", None)
+        if client_params is not None:
+            return f"client:{client_params.clientInfo.name}"
+    if session not in _session_ids:
+        _session_ids[session] = f"session:{next(_session_counter)}"
+    return _session_ids[session]
+
+
+@dataclass
+class _QuotaSlot:
+    """A client's concurrent command slot, held until the command's worker has finished."""
+
+    client: str
+    handed_over: bool = False
+    released: bool = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            admission.release(self.client)
+
+
+async def reload_policy() -> bool:
+    """
+    Reloads the security policy from the environment, POLICY_FILE and PROFILES_FILE.
+
+    The new executors are built in a worker thread and swapped in with a single
+    assignment. Commands already running keep the executor they started with,
+    so they finish under the old policy. Connected sessions are then sent
+    ``notifications/tools/list_changed``.
+
+    Returns:
+        bool: True if the policy was reloaded, False if the new policy was invalid
+            and the current one was kept.
+    """
+    global _executors
+    try:
+        new_executors = await asyncio.to_thread(
+            lambda: build_executors(load_policy_env())
+        )
+    except (OSError, ValueError) as e:
+        logger.error("Policy reload failed, keeping the current policy: %s", e)
+        return False
+    _executors = new_executors
+    logger.info("Security policy reloaded")
+    for session in list(sessions):
+        try:
+            await session.send_tool_list_changed()
+        except Exception as e:
+            logger.debug("Could not notify session of tool list change: %s", e)
+    return True
+
+
+async def watch_policy_file(path: str, interval: float) -> None:
+    """
+    Reloads the policy whenever the modification time of ``path`` changes.
+    """
+    last_seen = policy_file_signature(path)
+    while True:
+        await asyncio.sleep(interval)
+        current = await asyncio.to_thread(policy_file_signature, path)
+        if current != last_seen:
+            last_seen = current
+            await reload_policy()
+
+recorder = load_recorder()
+audit_log = load_audit_log()
+scheduler = load_scheduler()
+uploads = UploadManager()
+admission = load_admission_controller()
+metrics = MetricsRegistry()
+metrics.register(admission.gauges)
+metrics.register(
+    lambda: {"scheduler_running": scheduler.running, "scheduler_queued": scheduler.queued}
 )
+watchdog = load_loop_watchdog(metrics)
+
+_history: Optional["ExecutionHistory"] = None
+
+
+def get_history() -> Optional["ExecutionHistory"]:
+    """
+    Returns the execution history store, opening it on first use, or None when HISTORY_DB is unset.
+    """
+    global _history
+    if _history is None and os.getenv("HISTORY_DB"):
+        from .history import load_history
+
+        _history = load_history()
+    return _history
+
+
+_archives: Optional["ArchiveTransfers"] = None
+
+
+def get_archives() -> "ArchiveTransfers":
+    """
+    Returns the archive transfers of export_archive and import_archive, creating them on first use.
+    """
+    global _archives
+    if _archives is None:
+        from .archive import load_archive_transfers
+
+        _archives = load_archive_transfers()
+    return _archives
+
+
+_profiler: Optional["Profiler"] = None
+
+
+def get_profiler() -> Optional["Profiler"]:
+    """
+    Returns the profiler, creating it on first use, or None when PROFILE_DIR is unset.
+    """
+    global _profiler
+    if _profiler is None and os.getenv("PROFILE_DIR"):
+        from .profiling import load_profiler
+
+        _profiler = load_profiler()
+    return _profiler
+
+
+_tree_cache: Optional["TreeCache"] = None
+
+
+def get_tree_cache() -> "TreeCache":
+    """
+    Returns the directory listing cache, creating it on first use.
+
+    Environment Variables:
+        TREE_CACHE_MAX_DIRS: Maximum number of cached directory listings (default: 4096)
+    """
+    global _tree_cache
+    if _tree_cache is None:
+        from .tree import TreeCache
+        from .watcher import get_watcher
+
+        _tree_cache = TreeCache(
+            get_watcher(), max_dirs=int(os.getenv("TREE_CACHE_MAX_DIRS", "4096"))
+        )
+    return _tree_cache
+
+
+_change_waiters: Optional["ChangeWaiters"] = None
+
+
+def get_change_waiters() -> "ChangeWaiters":
+    """
+    Returns the waiters of wait_for_change, subscribing to the watcher on first use.
+    """
+    global _change_waiters
+    if _change_waiters is None:
+        from .changes import load_change_waiters
+        from .watcher import get_watcher
+
+        _change_waiters = load_change_waiters(get_watcher())
+        metrics.register(lambda: {"change_waiters": _change_waiters.waiting})
+    return _change_waiters
+
+
+_search_indexes: Dict[str, "SearchIndex"] = {}
+
+
+def get_search_index(root: str) -> "SearchIndex":
+    """
+    Returns the search index of a workspace directory, starting to build it on first use.
+    """
+    if root not in _search_indexes:
+        from .search import load_search_index
+        from .watcher import get_watcher
+
+        _search_indexes[root] = load_search_index(root, get_watcher())
+    return _search_indexes[root]
 
 
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
+    _track_session()
+    executors = await _load_executors()
+    executor = default_executor(executors)
     commands_desc = (
         "all commands"
         if executor.security_config.allow_all_commands
@@ -494,22 +960,78 @@ async def handle_list_tools() -> list[types.Tool]:
         else ", ".join(executor.security_config.allowed_flags)
     )
 
-    return [
+    run_command_description = (
+        f"Allows command (CLI) execution in the directory: {executor.allowed_dir}\n\n"
+        f"Available commands: {commands_desc}\n"
+        f"Available flags: {flags_desc}\n\n"
+        f"Shell operators (&&, ||, |, >, >>, <, <<, ;) are {'supported' if executor.security_config.allow_shell_operators else 'not supported'}. Set ALLOW_SHELL_OPERATORS=true to enable."
+    )
+    profile_properties = {}
+    if len(executors) > 1:
+        default_name = next(
+            name for name, profile_executor in executors.items() if profile_executor is executor
+        )
+        run_command_description = (
+            "Allows command (CLI) execution in one of these workspace profiles:\n"
+            + "".join(
+                f"- {name}: {profile_executor.allowed_dir}\n"
+                for name, profile_executor in executors.items()
+            )
+            + f"\nCalls without a profile use '{default_name}'. "
+            "Use show_security_rules to see the commands and flags allowed in a profile."
+        )
+        profile_properties["profile"] = {
+            "type": "string",
+            "enum": list(executors),
+            "description": f"Workspace profile to use (default: '{default_name}')",
+        }
+
+    tools = [
         types.Tool(
             name="run_command",
-            description=(
-                f"Allows command (CLI) execution in the directory: {executor.allowed_dir}\n\n"
-                f"Available commands: {commands_desc}\n"
-                f"Available flags: {flags_desc}\n\n"
-                f"Shell operators (&&, ||, |, >, >>, <, <<, ;) are {'supported' if executor.security_config.allow_shell_operators else 'not supported'}. Set ALLOW_SHELL_OPERATORS=true to enable."
-            ),
+            description=run_command_description,
             inputSchema={
                 "type": "object",
                 "properties": {
                     "command": {
                         "type": "string",
                         "description": "Single command to execute (example: 'ls -l' or 'cat file.txt')",
-                    }
+                    },
+                    "deadline_seconds": {
+                        "type": "number",
+                        "description": "Optional deadline; commands expected to run longer are flagged or rejected",
+                    },
+                    "stdin": {
+                        "type": "string",
+                        "description": "Optional data written to the command's standard input",
+                    },
+                    "head_lines": {
+                        "type": "integer",
+                        "minimum": 0,
+                        "description": "Only return the first N lines of stdout",
+                    },
+                    "tail_lines": {
+                        "type": "integer",
+                        "minimum": 0,
+                        "description": "Only return the last N lines of stdout",
+                    },
+                    "grep": {
+                        "type": "string",
+                        "description": "Only return stdout lines matching this regular expression",
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "minimum": 0,
+                        "description": "Return at most this many bytes of stdout and of stderr",
+                    },
+                    "structured": {
+                        "type": "boolean",
+                        "description": (
+                            "Return the output, exit code, timings and truncation details as "
+                            "structured content instead of text items"
+                        ),
+                    },
+                    **profile_properties,
                 },
                 "required": ["command"],
             },
@@ -521,33 +1043,663 @@ async def handle_list_tools() -> list[types.Tool]:
             ),
             inputSchema={
                 "type": "object",
-                "properties": {},
+                "properties": {**profile_properties},
             },
         ),
+        types.Tool(
+            name="show_metrics",
+            description=(
+                "Show server metrics: tool calls by outcome, call durations, "
+                "rate-limited calls and command queue lengths.\n"
+            ),
+            inputSchema={"type": "object", "properties": {}},
+        ),
     ]
+    native_tools = set().union(
+        *(profile_executor.security_config.native_tools for profile_executor in executors.values())
+    )
+    if "read_file" in native_tools:
+        tools.append(
+            types.Tool(
+                name="read_file",
+                description=(
+                    f"Read a file inside the directory: {executor.allowed_dir}\n\n"
+                    "Reads the whole file, a byte range (offset/length), a line range "
+                    "(start_line/end_line) or the last lines (tail_lines) without running a command. "
+                    f"At most {executor.security_config.read_file_max_bytes} bytes are returned. "
+                    "Binary files are returned base64-encoded."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "File to read, relative to the allowed directory or absolute",
+                        },
+                        "offset": {"type": "integer", "minimum": 0, "description": "First byte to read"},
+                        "length": {"type": "integer", "minimum": 0, "description": "Number of bytes to read"},
+                        "start_line": {"type": "integer", "minimum": 1, "description": "First line to read (1-based)"},
+                        "end_line": {"type": "integer", "minimum": 1, "description": "Last line to read (inclusive)"},
+                        "tail_lines": {"type": "integer", "minimum": 1, "description": "Read this many lines from the end"},
+                        "encoding": {"type": "string", "description": "Text encoding (default: detected)"},
+                        **profile_properties,
+                    },
+                    "required": ["path"],
+                },
+            )
+        )
+    if "list_dir" in native_tools:
+        tools.append(
+            types.Tool(
+                name="list_dir",
+                description=(
+                    f"List a directory inside: {executor.allowed_dir}\n\n"
+                    "Returns entries (path relative to the listed directory, type, size, mtime) "
+                    "sorted by name, descending up to 'depth' levels. Symlinked directories are not "
+                    "followed. Results are paginated: pass next_offset back as offset to continue."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "Directory to list (default: the allowed directory)",
+                        },
+                        "depth": {"type": "integer", "minimum": 1, "default": 1},
+                        "offset": {"type": "integer", "minimum": 0, "default": 0},
+                        "limit": {"type": "integer", "minimum": 1, "default": 200},
+                        "include_hidden": {"type": "boolean", "default": True},
+                        **profile_properties,
+                    },
+                },
+            )
+        )
+    if "wait_for_change" in native_tools:
+        from .changes import CHANGE_KINDS
+
+        tools.append(
+            types.Tool(
+                name="wait_for_change",
+                description=(
+                    f"Wait until a file or directory inside {executor.allowed_dir} changes, "
+                    "instead of polling with ls, cat or sleep.\n\n"
+                    "'path' is a file, a directory (its entries are watched, not recursively) or a "
+                    "glob in the last component such as 'dist/*.whl'. Returns when a matching entry is "
+                    "created, modified or deleted, or, with min_size, once a matching file is at least "
+                    "that large. Waiting only for 'created' returns at once if a match already exists."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string", "description": "File, directory or glob to watch"},
+                        "events": {
+                            "type": "array",
+                            "items": {"type": "string", "enum": list(CHANGE_KINDS)},
+                            "description": "Changes to wait for (default: all)",
+                        },
+                        "min_size": {
+                            "type": "integer",
+                            "minimum": 0,
+                            "description": "Wait until a matching file has at least this many bytes",
+                        },
+                        "timeout_seconds": {"type": "number", "minimum": 0, "default": 30},
+                        **profile_properties,
+                    },
+                    "required": ["path"],
+                },
+            )
+        )
+    if "stat" in native_tools:
+        tools.append(
+            types.Tool(
+                name="stat",
+                description=f"Show the type, size, permissions and times of a path inside: {executor.allowed_dir}",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string", "description": "Path to inspect"},
+                        **profile_properties,
+                    },
+                    "required": ["path"],
+                },
+            )
+        )
+    if "search" in native_tools:
+        tools.append(
+            types.Tool(
+                name="search",
+                description=(
+                    f"Search the text files inside {executor.allowed_dir} for a regular expression, "
+                    "like 'grep -rn' but served from an index. Files excluded by .gitignore are skipped. "
+                    "Returns matching lines (path, line number, text) sorted by path. Results are "
+                    "paginated: pass next_offset back as offset to continue."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "pattern": {"type": "string", "description": "Regular expression (Python syntax)"},
+                        "path": {
+                            "type": "string",
+                            "description": "File or directory to search (default: the allowed directory)",
+                        },
+                        "fixed_string": {
+                            "type": "boolean",
+                            "default": False,
+                            "description": "Treat the pattern as a literal string",
+                        },
+                        "case_sensitive": {"type": "boolean", "default": True},
+                        "glob": {
+                            "type": "string",
+                            "description": "Only search files matching this glob (example: '*.py')",
+                        },
+                        "offset": {"type": "integer", "minimum": 0, "default": 0},
+                        "limit": {"type": "integer", "minimum": 1, "default": 100},
+                        **profile_properties,
+                    },
+                    "required": ["pattern"],
+                },
+            )
+        )
+    if "write_file" in native_tools:
+        tools.append(
+            types.Tool(
+                name="write_file",
+                description=(
+                    f"Write a file inside the directory: {executor.allowed_dir}\n\n"
+                    "Modes: 'create' (fails if the file exists), 'overwrite', 'append', and 'atomic' "
+                    "(replaces the file in one step, so readers never see a partial file). "
+                    "Large files can be sent in chunks: send the first chunk with final=false, then "
+                    "send each following chunk, one at a time, with the returned upload_id and its offset "
+                    "(the bytes_written so far), and final=true with the last. Nothing is written to the "
+                    "file until the last chunk arrives. "
+                    f"Files are limited to {executor.security_config.write_file_max_bytes} bytes."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "File to write, relative to the allowed directory or absolute",
+                        },
+                        "content": {"type": "string", "description": "Content, or this chunk of it"},
+                        "encoding": {
+                            "type": "string",
+                            "enum": ["utf-8", "base64"],
+                            "default": "utf-8",
+                            "description": "Encoding of content; use base64 for binary data",
+                        },
+                        "mode": {"type": "string", "enum": list(WRITE_MODES), "default": "overwrite"},
+                        "upload_id": {
+                            "type": "string",
+                            "description": "Id returned for the first chunk of a chunked write",
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "minimum": 0,
+                            "description": "Offset of this chunk in the upload; required with upload_id",
+                        },
+                        "final": {
+                            "type": "boolean",
+                            "default": True,
+                            "description": "Whether this is the last chunk",
+                        },
+                        **profile_properties,
+                    },
+                    "required": ["content"],
+                },
+            )
+        )
+    if "export_archive" in native_tools:
+        from .archive import COMPRESSIONS
+
+        tools.append(
+            types.Tool(
+                name="export_archive",
+                description=(
+                    f"Download files and directories from {executor.allowed_dir} as a tar archive.\n\n"
+                    "The first call builds the archive and returns its first chunk as a base64 resource "
+                    "with an archive_id; call again with archive_id and offset=next_offset until "
+                    "next_offset is null."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Files and directories to include (first call)",
+                        },
+                        "compression": {"type": "string", "enum": list(COMPRESSIONS), "default": "gzip"},
+                        "archive_id": {"type": "string", "description": "Id returned by the first call"},
+                        "offset": {"type": "integer", "minimum": 0, "default": 0},
+                        **profile_properties,
+                    },
+                },
+            )
+        )
+    if "import_archive" in native_tools:
+        tools.append(
+            types.Tool(
+                name="import_archive",
+                description=(
+                    f"Upload a tar archive (optionally gzip or zstd compressed) and extract it inside "
+                    f"{executor.allowed_dir}.\n\n"
+                    "Send the archive base64-encoded, in chunks if large: the first chunk with "
+                    "final=false returns an upload_id to pass with the following chunks, and final=true "
+                    "with the last one extracts the archive. Members that would land outside the allowed "
+                    "directory are rejected."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "content": {"type": "string", "description": "Base64-encoded archive data"},
+                        "destination": {
+                            "type": "string",
+                            "description": "Directory to extract into (default: the allowed directory)",
+                        },
+                        "upload_id": {"type": "string", "description": "Id returned for the first chunk"},
+                        "final": {"type": "boolean", "default": True},
+                        **profile_properties,
+                    },
+                    "required": ["content"],
+                },
+            )
+        )
+    history = get_history()
+    if history is not None:
+        from .history import REPORTS
+
+        tools.append(
+            types.Tool(
+                name="query_history",
+                description=(
+                    "Query the execution history of run_command in this workspace profile.\n\n"
+                    "Reports: 'slowest' (slowest executions), 'failures' (failure rate per command), "
+                    "'runtime' (average, p95 and max runtime per command), "
+                    "'output' (output volume per command)."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "report": {"type": "string", "enum": list(REPORTS)},
+                        "command": {
+                            "type": "string",
+                            "description": "Only include executions of this command name (example: 'ls')",
+                        },
+                        "since_seconds": {
+                            "type": "number",
+                            "description": "Only include executions started within this many seconds",
+                        },
+                        "limit": {"type": "integer", "minimum": 1, "default": 10},
+                        **profile_properties,
+                    },
+                    "required": ["report"],
+                },
+            )
+        )
+    profiler = get_profiler()
+    if profiler is not None and "profile_server" in native_tools:
+        from .profiling import PROFILE_ACTIONS
+
+        tools.append(
+            types.Tool(
+                name="profile_server",
+                description=(
+                    "Profile this server process. Results are written to files in "
+                    f"{profiler.directory}.\n\n"
+                    "'cpu' samples every thread for 'seconds' and writes collapsed stacks for "
+                    "flamegraphs. 'memory_snapshot' dumps a tracemalloc snapshot and compares it with "
+                    "the previous one to show which allocation sites grow; tracing starts with the first "
+                    "snapshot or 'memory_start' and ends with 'memory_stop'."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "action": {"type": "string", "enum": list(PROFILE_ACTIONS)},
+                        "seconds": {
+                            "type": "number",
+                            "default": 10,
+                            "maximum": profiler.max_seconds,
+                            "description": "Length of a CPU profile",
+                        },
+                        "interval_ms": {"type": "number", "default": 5, "description": "CPU sampling interval"},
+                        "limit": {
+                            "type": "integer",
+                            "minimum": 1,
+                            "default": 10,
+                            "description": "Allocation sites listed in a memory comparison",
+                        },
+                    },
+                    "required": ["action"],
+                },
+            )
+        )
+    return tools
+
+
+async def run_profile(action: str, seconds: float = 10, interval_ms: float = 5, limit: int = 10) -> Dict:
+    """Runs a profiler action in a worker thread, so the event loop keeps serving and is profiled."""
+    from .profiling import PROFILE_ACTIONS
+
+    profiler = get_profiler()
+    if action == "cpu":
+        return await asyncio.to_thread(profiler.cpu, seconds, interval_ms / 1000)
+    if action == "memory_snapshot":
+        return await asyncio.to_thread(profiler.memory_snapshot, limit)
+    if action == "memory_start":
+        return profiler.memory_start()
+    if action == "memory_stop":
+        return profiler.memory_stop()
+    raise ValueError(f"Invalid action '{action}'. Use one of: {', '.join(PROFILE_ACTIONS)}")
+
+
+async def _profile_on_signal(action: str) -> None:
+    from .profiling import format_profile
+
+    try:
+        result = await run_profile(action, seconds=float(os.getenv("PROFILE_SIGNAL_SECONDS", "10")))
+    except (OSError, ValueError) as e:
+        logger.error("Profiling failed: %s", e)
+        return
+    logger.warning("%s", format_profile(action, result))
 
 
 @server.call_tool()
 async def handle_call_tool(
     name: str, arguments: Optional[Dict[str, Any]]
 ) -> List[types.TextContent]:
-    if name == "run_command":
-        if not arguments or "command" not in arguments:
+    _track_session()
+    call = CallRecord(tool=name, arguments=dict(arguments or {}), started_at=time.time())
+    started = time.perf_counter()
+    history_profile: Optional[str] = None
+    try:
+        # Pin the executor now so a policy reload does not affect this call
+        executors = await _load_executors()
+        profile = (arguments or {}).get("profile")
+        if profile is None:
+            profile_executor = default_executor(executors)
+        elif profile in executors:
+            profile_executor = executors[profile]
+            call.profile = profile
+        else:
+            history_profile = str(profile)
+            call.outcome = "rejected"
+            call.error = f"Unknown profile '{profile}'"
             return [
-                types.TextContent(type="text", text="No command provided", error=True)
+                types.TextContent(
+                    type="text",
+                    text=f"Error: Unknown profile '{profile}'. Available profiles: {', '.join(executors)}",
+                    error=True,
+                )
             ]
 
+        history_profile = profile_name(executors, profile_executor)
+        config = profile_executor.security_config
+        client = _client_key()
+        command_quota = config.max_concurrent_per_client if name == "run_command" else None
+        try:
+            # Metrics stay readable while a client is being limited
+            if name != "show_metrics":
+                admission.admit(client, config.rate_limit_per_second, config.rate_limit_burst, command_quota)
+        except RateLimitExceeded as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            metrics.inc("rate_limited_total", reason=e.reason)
+            return [
+                types.TextContent(
+                    type="text",
+                    text=f"Rate limited: {e}. Retry after {e.retry_after:.2f} seconds",
+                    error=True,
+                )
+            ]
+        slot = _QuotaSlot(client) if command_quota is not None else None
+        try:
+            return await _dispatch_tool(name, arguments, call, profile_executor, slot)
+        finally:
+            # Once the command reached a worker, the worker frees the slot when it ends
+            if slot is not None and not slot.handed_over:
+                slot.release()
+    except asyncio.CancelledError:
+        call.outcome = "cancelled"
+        raise
+    except Exception as e:
+        call.outcome = "error"
+        call.error = str(e)
+        raise
+    finally:
+        call.duration_ms = (time.perf_counter() - started) * 1000
+        # Clients choose the name, so it is only used as a label when it is a known tool
+        tool_label = name if name in TOOL_NAMES else "unknown"
+        metrics.inc("tool_calls_total", tool=tool_label, outcome=call.outcome)
+        metrics.observe("tool_call_duration_ms", call.duration_ms, tool=tool_label)
+        if recorder is not None:
+            recorder.record(call)
+        if name == "run_command":
+            if audit_log is not None:
+                await audit_log.record(call)
+            history = get_history()
+            if history is not None:
+                history.record(call, profile=history_profile)
+
+
+def _binary_output(stream: str, data: bytes) -> types.EmbeddedResource:
+    """Wraps binary command output in a base64 resource instead of mangled text."""
+    return types.EmbeddedResource(
+        type="resource",
+        resource=types.BlobResourceContents(
+            uri=f"output://{stream}",
+            mimeType="application/octet-stream",
+            blob=base64.b64encode(data).decode("ascii"),
+        ),
+    )
+
+
+def _stream_result(output: Union[str, bytes], output_filter: OutputFilter) -> Dict[str, Any]:
+    if isinstance(output, bytes):
+        text, encoding = base64.b64encode(output).decode("ascii"), "base64"
+    else:
+        text, encoding = output, "utf-8"
+    result = {
+        "text": text,
+        "encoding": encoding,
+        "binary": bool(output_filter.binary),
+        "total_bytes": output_filter.total_bytes,
+        "kept_bytes": output_filter.kept_bytes,
+        "truncated": output_filter.truncated,
+        "filtered": output_filter.active,
+    }
+    if output_filter.active:
+        result["summary"] = output_filter.summary()
+    return result
+
+
+def _structured_result(
+    result: Optional[subprocess.CompletedProcess],
+    stdout_filter: Optional[OutputFilter],
+    stderr_filter: Optional[OutputFilter],
+    timings: Dict[str, float],
+    deadline_warning: Optional[str],
+    profile: Optional[str],
+    error: Optional[Tuple[str, str]] = None,
+) -> Tuple[List[types.TextContent], Dict[str, Any]]:
+    """
+    Builds the structured form of a run_command result.
+
+    Every outcome has the same fields: a command that was rejected, timed out
+    or failed to start has ``error`` set to its kind and message, no exit code,
+    and whatever output it produced before it was stopped. The text content is
+    the same object serialized as JSON, for clients that ignore structured content.
+    """
+    from .daemon import DaemonCompletedProcess
+
+    returncode = result.returncode if result is not None else None
+    signal_name = None
+    if returncode is not None and returncode < 0:
         try:
-            result = executor.execute(arguments["command"])
+            signal_name = signal.Signals(-returncode).name
+        except ValueError:
+            signal_name = str(-returncode)
+    streams = {}
+    for stream, output_filter in (("stdout", stdout_filter), ("stderr", stderr_filter)):
+        output_filter = output_filter or OutputFilter()
+        if result is not None:
+            output = getattr(result, stream)
+        else:
+            # Output the command produced before it timed out or failed
+            output = output_filter.finish()
+        streams[stream] = _stream_result(output, output_filter)
+    started, finished = timings.get("started"), timings.get("finished")
+    structured = {
+        "exit_code": returncode,
+        "signal": signal_name,
+        "success": returncode == 0 and error is None,
+        "timed_out": error is not None and error[0] == "timeout",
+        "error": {"type": error[0], "message": error[1]} if error is not None else None,
+        "queued_ms": round((started - timings["submitted"]) * 1000, 3) if started is not None else None,
+        "duration_ms": round((finished - started) * 1000, 3) if started is not None and finished is not None else None,
+        **streams,
+        "profile": profile,
+        "executor": "daemon" if isinstance(result, DaemonCompletedProcess) else "local",
+        "coalesced": getattr(result, "coalesced", False),
+        "cached": getattr(result, "cached", False),
+        "warnings": [deadline_warning] if deadline_warning else [],
+    }
+    text = types.TextContent(type="text", text=json.dumps(structured), error=error is not None)
+    return [text], structured
+
+
+async def _dispatch_tool(
+    name: str,
+    arguments: Optional[Dict[str, Any]],
+    call: CallRecord,
+    executor: CommandExecutor,
+    quota: Optional[_QuotaSlot] = None,
+) -> List[types.TextContent]:
+    gated = name in NATIVE_TOOL_NAMES or name in ADMIN_TOOL_NAMES
+    if gated and name not in executor.security_config.native_tools:
+        call.outcome = "rejected"
+        call.error = f"Tool '{name}' is not enabled"
+        return [
+            types.TextContent(
+                type="text",
+                text=f"Security violation: Tool '{name}' is not enabled. Add it to NATIVE_TOOLS to enable.",
+                error=True,
+            )
+        ]
+
+    if name == "run_command":
+        structured = bool((arguments or {}).get("structured"))
+        stdout_filter: Optional[OutputFilter] = None
+        stderr_filter: Optional[OutputFilter] = None
+        timings: Dict[str, float] = {}
+        deadline_warning: Optional[str] = None
+
+        def failure(kind: str, message: str, text: str):
+            if structured:
+                return _structured_result(
+                    None,
+                    stdout_filter,
+                    stderr_filter,
+                    timings,
+                    deadline_warning,
+                    call.profile,
+                    error=(kind, message),
+                )
+            return [types.TextContent(type="text", text=text, error=True)]
+
+        if not arguments or "command" not in arguments:
+            call.outcome = "rejected"
+            call.error = "No command provided"
+            return failure("rejected", call.error, "No command provided")
+
+        call.cwd = executor.allowed_dir
+        try:
+            command_string = arguments["command"]
+            key = runtime_key(*executor.validate_command(command_string))
+            if call.profile:
+                key = f"{call.profile}:{key}"
+            deadline_warning = scheduler.check_deadline(
+                key, arguments.get("deadline_seconds")
+            )
+            if deadline_warning and scheduler.deadline_policy == "reject":
+                call.outcome = "rejected"
+                call.error = deadline_warning
+                return failure("rejected", deadline_warning, f"Rejected: {deadline_warning}")
+
+            try:
+                stdout_filter = OutputFilter(
+                    head_lines=arguments.get("head_lines"),
+                    tail_lines=arguments.get("tail_lines"),
+                    grep=arguments.get("grep"),
+                    max_bytes=arguments.get("max_bytes"),
+                )
+                stderr_filter = OutputFilter(max_bytes=arguments.get("max_bytes"))
+            except ValueError as e:
+                call.outcome = "rejected"
+                call.error = str(e)
+                return failure("invalid", str(e), f"Error: {str(e)}")
+
+            timings["submitted"] = time.perf_counter()
+            cancellation = Cancellation()
+
+            def run() -> subprocess.CompletedProcess:
+                timings["started"] = time.perf_counter()
+                try:
+                    return executor.execute(
+                        command_string,
+                        stdin=arguments.get("stdin"),
+                        stdout_filter=stdout_filter,
+                        stderr_filter=stderr_filter,
+                        cancellation=cancellation,
+                    )
+                finally:
+                    timings["finished"] = time.perf_counter()
+
+            on_done = None
+            if quota is not None:
+                quota.handed_over = True
+                on_done = quota.release
+            result = await scheduler.run(key, run, on_cancel=cancellation.cancel, on_done=on_done)
+            call.argv = (
+                list(result.args)
+                if isinstance(result.args, (list, tuple))
+                else ["/bin/sh", "-c", result.args]
+            )
+            call.returncode = result.returncode
+            call.stdout_bytes = stdout_filter.total_bytes
+            call.stderr_bytes = stderr_filter.total_bytes
+
+            if structured:
+                return _structured_result(
+                    result, stdout_filter, stderr_filter, timings, deadline_warning, call.profile
+                )
 
             response = []
-            if result.stdout:
+            if isinstance(result.stdout, bytes):
+                if result.stdout:
+                    response.append(_binary_output("stdout", result.stdout))
+            elif result.stdout:
                 response.append(types.TextContent(type="text", text=result.stdout))
-            if result.stderr:
+            if isinstance(result.stderr, bytes):
+                if result.stderr:
+                    response.append(_binary_output("stderr", result.stderr))
+            elif result.stderr:
                 response.append(
                     types.TextContent(type="text", text=result.stderr, error=True)
                 )
 
+            if stdout_filter.active:
+                response.append(
+                    types.TextContent(type="text", text=f"Output filtered: {stdout_filter.summary()}")
+                )
+            if stderr_filter.truncated:
+                response.append(
+                    types.TextContent(type="text", text=f"Errors filtered: {stderr_filter.summary()}")
+                )
+            if deadline_warning:
+                response.append(
+                    types.TextContent(type="text", text=f"Warning: {deadline_warning}")
+                )
             response.append(
                 types.TextContent(
                     type="text",
@@ -558,21 +1710,17 @@ async def handle_call_tool(
             return response
 
         except CommandSecurityError as e:
-            return [
-                types.TextContent(
-                    type="text", text=f"Security violation: {str(e)}", error=True
-                )
-            ]
+            call.outcome = "rejected"
+            call.error = str(e)
+            return failure("rejected", str(e), f"Security violation: {str(e)}")
         except subprocess.TimeoutExpired:
-            return [
-                types.TextContent(
-                    type="text",
-                    text=f"Command timed out after {executor.security_config.command_timeout} seconds",
-                    error=True,
-                )
-            ]
+            call.outcome = "timeout"
+            message = f"Command timed out after {executor.security_config.command_timeout} seconds"
+            return failure("timeout", message, message)
         except Exception as e:
-            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+            call.outcome = "timeout" if isinstance(e, CommandTimeoutError) else "error"
+            call.error = str(e)
+            return failure(call.outcome if call.outcome == "timeout" else "execution", str(e), f"Error: {str(e)}")
 
     elif name == "show_security_rules":
         commands_desc = (
@@ -592,9 +1740,11 @@ async def handle_call_tool(
                 f"{shell_exec_display} {' '.join(executor.security_config.shell_exec_args)}"
             )
 
+        profile_line = f"Profile: {call.profile}\n" if call.profile else ""
         security_info = (
             "Security Configuration:\n"
             f"==================\n"
+            f"{profile_line}"
             f"Working Directory: {executor.allowed_dir}\n"
             f"\nAllowed Commands:\n"
             f"----------------\n"
@@ -607,23 +1757,560 @@ async def handle_call_tool(
             f"Executable: {shell_exec_display}\n"
             f"Max Command Length: {executor.security_config.max_command_length} characters\n"
             f"Command Timeout: {executor.security_config.command_timeout} seconds\n"
+            f"Max Concurrent Commands: {scheduler.max_concurrent} ({scheduler.policy} scheduling)\n"
         )
+        config = executor.security_config
+        if config.rate_limit_per_second:
+            security_info += (
+                f"Rate Limit: {config.rate_limit_per_second:g} calls per second per {admission.key} "
+                f"(burst {config.rate_limit_burst})\n"
+            )
+        if config.max_concurrent_per_client:
+            security_info += f"Max Concurrent Commands per {admission.key.capitalize()}: {config.max_concurrent_per_client}\n"
+        if audit_log is not None:
+            security_info += (
+                f"\nAudit Log:\n"
+                f"---------\n"
+                f"File: {audit_log.writer.path}\n"
+                f"Overflow Policy: {audit_log.writer.overflow}\n"
+                f"Dropped Entries: {audit_log.dropped}\n"
+            )
         return [types.TextContent(type="text", text=security_info)]
 
-    raise ValueError(f"Unknown tool: {name}")
+    elif name == "show_metrics":
+        text = metrics.format()
+        snapshot = metrics.snapshot()
+        if watchdog is not None:
+            snapshot["event_loop_stalls"] = [asdict(stall) for stall in watchdog.stalls]
+            if watchdog.stalls:
+                stall = watchdog.stalls[-1]
+                text += f"\n\nLast event loop stall ({stall.duration_ms:.0f} ms):\n{stall.stack}"
+        return [types.TextContent(type="text", text=text)], snapshot
+
+    elif name == "profile_server" and get_profiler() is not None:
+        from .profiling import format_profile
+
+        arguments = arguments or {}
+        action = arguments.get("action")
+        try:
+            result = await run_profile(
+                action,
+                seconds=float(arguments.get("seconds", 10)),
+                interval_ms=float(arguments.get("interval_ms", 5)),
+                limit=int(arguments.get("limit", 10)),
+            )
+        except (OSError, ValueError) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+        return [types.TextContent(type="text", text=format_profile(action, result))], result
 
+    elif name == "read_file":
+        if not arguments or "path" not in arguments:
+            call.outcome = "rejected"
+            call.error = "No path provided"
+            return [types.TextContent(type="text", text="No path provided", error=True)]
+        try:
+            path = executor._normalize_path(arguments["path"])
+            file_slice = await asyncio.to_thread(
+                read_file,
+                path,
+                encoding=arguments.get("encoding"),
+                offset=arguments.get("offset"),
+                length=arguments.get("length"),
+                start_line=arguments.get("start_line"),
+                end_line=arguments.get("end_line"),
+                tail_lines=arguments.get("tail_lines"),
+                max_bytes=executor.security_config.read_file_max_bytes,
+            )
+        except CommandSecurityError as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            return [
+                types.TextContent(
+                    type="text", text=f"Security violation: {str(e)}", error=True
+                )
+            ]
+        except (OSError, ValueError) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
 
-async def main():
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="cli-mcp-server",
-                server_version="0.2.6",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+        call.stdout_bytes = len(file_slice.data)
+        response = []
+        if file_slice.encoding is None:
+            response.append(
+                types.EmbeddedResource(
+                    type="resource",
+                    resource=types.BlobResourceContents(
+                        uri=f"file://{path}",
+                        mimeType="application/octet-stream",
+                        blob=base64.b64encode(file_slice.data).decode("ascii"),
+                    ),
+                )
+            )
+        elif file_slice.data:
+            response.append(types.TextContent(type="text", text=file_slice.text()))
+
+        summary = f"\nRead bytes {file_slice.start}-{file_slice.end} of {file_slice.size}"
+        if file_slice.first_line is not None:
+            summary += f", from line {file_slice.first_line}"
+            if file_slice.last_line is not None:
+                summary += f" to {file_slice.last_line}"
+        summary += f" ({file_slice.encoding or 'binary'})"
+        if file_slice.truncated:
+            summary += f"; truncated to {executor.security_config.read_file_max_bytes} bytes"
+        response.append(types.TextContent(type="text", text=summary))
+        return response
+
+    elif name == "list_dir":
+        from .tree import list_tree
+
+        arguments = arguments or {}
+        try:
+            path = executor._normalize_path(arguments.get("path") or executor.allowed_dir)
+            listing = await asyncio.to_thread(
+                list_tree,
+                get_tree_cache(),
+                path,
+                depth=int(arguments.get("depth", 1)),
+                offset=int(arguments.get("offset", 0)),
+                limit=int(arguments.get("limit", 200)),
+                include_hidden=bool(arguments.get("include_hidden", True)),
+            )
+        except CommandSecurityError as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            return [
+                types.TextContent(
+                    type="text", text=f"Security violation: {str(e)}", error=True
+                )
+            ]
+        except (OSError, ValueError) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+
+        lines = [
+            f"{entry['path']}{'/' if entry['type'] == 'dir' else ''}"
+            + (f" -> {entry['type']}" if entry["type"] not in ("file", "dir") else "")
+            + (f" ({entry['size']} bytes)" if entry["type"] == "file" else "")
+            for entry in listing["entries"]
+        ]
+        if listing["next_offset"] is not None:
+            lines.append(f"\n... more entries, continue with offset={listing['next_offset']}")
+        listing["path"] = path
+        return [types.TextContent(type="text", text="\n".join(lines))], listing
+
+    elif name == "wait_for_change":
+        from .changes import CHANGE_KINDS, glob_matcher
+
+        if not arguments or "path" not in arguments:
+            call.outcome = "rejected"
+            call.error = "No path provided"
+            return [types.TextContent(type="text", text="No path provided", error=True)]
+        try:
+            path = arguments["path"]
+            pattern = os.path.basename(path)
+            target = None
+            if any(char in path for char in "*?["):
+                if any(char in os.path.dirname(path) for char in "*?["):
+                    raise ValueError("Glob patterns are only supported in the last path component")
+                directory = executor._normalize_path(os.path.dirname(path) or ".")
+                matches = glob_matcher(pattern)
+            else:
+                path = executor._normalize_path(path)
+                if os.path.isdir(path):
+                    directory, matches = path, lambda _: True
+                else:
+                    directory, target = os.path.dirname(path), path
+                    matches = lambda entry: entry == target
+            result = await get_change_waiters().wait(
+                directory,
+                matches,
+                target=target,
+                events=arguments.get("events") or CHANGE_KINDS,
+                min_size=arguments.get("min_size"),
+                timeout=float(arguments.get("timeout_seconds", 30)),
+            )
+        except CommandSecurityError as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            return [
+                types.TextContent(
+                    type="text", text=f"Security violation: {str(e)}", error=True
+                )
+            ]
+        except (OSError, ValueError) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+
+        for event in result["events"]:
+            if event["path"]:
+                event["path"] = os.path.relpath(event["path"], executor.allowed_dir)
+        if result["timed_out"]:
+            text = "No change before the timeout"
+        else:
+            text = "\n".join(
+                f"{event['kind']}: {event['path'] or '(events were lost, check again)'}"
+                + (f" ({event['size']} bytes)" if "size" in event else "")
+                for event in result["events"]
+            )
+        return [types.TextContent(type="text", text=text)], result
+
+    elif name == "stat":
+        from .tree import stat_path
+
+        if not arguments or "path" not in arguments:
+            call.outcome = "rejected"
+            call.error = "No path provided"
+            return [types.TextContent(type="text", text="No path provided", error=True)]
+        try:
+            path = executor._normalize_link_path(arguments["path"])
+            info = await asyncio.to_thread(stat_path, path)
+        except CommandSecurityError as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            return [
+                types.TextContent(
+                    type="text", text=f"Security violation: {str(e)}", error=True
+                )
+            ]
+        except OSError as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+        info["path"] = path
+        return [types.TextContent(type="text", text=json.dumps(info, indent=2))], info
+
+    elif name == "search":
+        import sqlite3
+
+        if not arguments or not arguments.get("pattern"):
+            call.outcome = "rejected"
+            call.error = "No pattern provided"
+            return [types.TextContent(type="text", text="No pattern provided", error=True)]
+        try:
+            path = executor._normalize_path(arguments.get("path") or executor.allowed_dir)
+            relative = os.path.relpath(path, executor.allowed_dir)
+            index = get_search_index(executor.allowed_dir)
+            result = await asyncio.to_thread(
+                index.search,
+                arguments["pattern"],
+                path="" if relative == "." else relative.replace(os.sep, "/"),
+                fixed_string=bool(arguments.get("fixed_string", False)),
+                case_sensitive=bool(arguments.get("case_sensitive", True)),
+                glob=arguments.get("glob"),
+                offset=int(arguments.get("offset", 0)),
+                limit=int(arguments.get("limit", 100)),
+            )
+        except CommandSecurityError as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            return [
+                types.TextContent(
+                    type="text", text=f"Security violation: {str(e)}", error=True
+                )
+            ]
+        except (OSError, ValueError, sqlite3.Error) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+
+        lines = [f"{match['path']}:{match['line']}:{match['text']}" for match in result["matches"]]
+        if not lines:
+            lines.append("No matches")
+        if result["next_offset"] is not None:
+            lines.append(f"\n... more matches, continue with offset={result['next_offset']}")
+        if not result["indexed"]:
+            lines.append("\n(index is still being built; searched by scanning the tree)")
+        return [types.TextContent(type="text", text="\n".join(lines))], result
+
+    elif name == "write_file":
+        arguments = arguments or {}
+        if "content" not in arguments or not (arguments.get("path") or arguments.get("upload_id")):
+            call.outcome = "rejected"
+            call.error = "No path or content provided"
+            return [types.TextContent(type="text", text="No path or content provided", error=True)]
+        try:
+            path = executor._normalize_path(arguments["path"]) if arguments.get("path") else None
+            if arguments.get("encoding", "utf-8") == "base64":
+                data = base64.b64decode(arguments["content"], validate=True)
+            else:
+                data = arguments["content"].encode("utf-8")
+            upload_id, upload = await asyncio.to_thread(
+                uploads.write,
+                data,
+                path=path,
+                mode=arguments.get("mode", "overwrite"),
+                upload_id=arguments.get("upload_id"),
+                final=bool(arguments.get("final", True)),
+                max_bytes=executor.security_config.write_file_max_bytes,
+                offset=arguments.get("offset"),
+            )
+        except CommandSecurityError as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            return [
+                types.TextContent(
+                    type="text", text=f"Security violation: {str(e)}", error=True
+                )
+            ]
+        except (OSError, ValueError) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+
+        call.stdout_bytes = len(data)
+        result = {
+            "path": upload.path,
+            "mode": upload.mode,
+            "bytes_written": upload.size,
+            "complete": upload_id is None,
+            "upload_id": upload_id,
+        }
+        if upload_id is None:
+            text = f"Wrote {upload.size} bytes to {upload.path} ({upload.mode})"
+        else:
+            text = (
+                f"Received {upload.size} bytes for {upload.path}. "
+                f"Send the next chunk with upload_id={upload_id} and offset={upload.size}, "
+                "and final=true with the last one."
+            )
+        return [types.TextContent(type="text", text=text)], result
+
+    elif name == "export_archive":
+        from .archive import build_archive
+
+        archives = get_archives()
+        arguments = arguments or {}
+        archive_id = arguments.get("archive_id")
+        offset = int(arguments.get("offset", 0))
+        try:
+            if archive_id is None:
+                if not arguments.get("paths"):
+                    call.outcome = "rejected"
+                    call.error = "No paths provided"
+                    return [types.TextContent(type="text", text="No paths provided", error=True)]
+                paths = [executor._normalize_path(path) for path in arguments["paths"]]
+                transfer = await asyncio.to_thread(
+                    build_archive,
+                    paths,
+                    executor.allowed_dir,
+                    compression=arguments.get("compression", "gzip"),
+                    max_bytes=archives.max_bytes,
+                )
+                archive_id = archives.add(transfer)
+            else:
+                transfer = archives.get(archive_id)
+            data = await asyncio.to_thread(archives.read_chunk, archive_id, offset)
+        except CommandSecurityError as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            return [
+                types.TextContent(
+                    type="text", text=f"Security violation: {str(e)}", error=True
+                )
+            ]
+        except (OSError, ValueError) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+
+        call.stdout_bytes = len(data)
+        end = offset + len(data)
+        result = {
+            "archive_id": archive_id,
+            "compression": transfer.compression,
+            "size": transfer.size,
+            "offset": offset,
+            "length": len(data),
+            "next_offset": end if end < transfer.size else None,
+        }
+        mime_type = {"none": "application/x-tar", "gzip": "application/gzip", "zstd": "application/zstd"}
+        summary = f"Archive bytes {offset}-{end} of {transfer.size} ({transfer.compression})"
+        if result["next_offset"] is not None:
+            summary += f"; continue with archive_id={archive_id} and offset={end}"
+        return [
+            types.EmbeddedResource(
+                type="resource",
+                resource=types.BlobResourceContents(
+                    uri=f"archive://{archive_id}",
+                    mimeType=mime_type[transfer.compression],
+                    blob=base64.b64encode(data).decode("ascii"),
                 ),
             ),
+            types.TextContent(type="text", text=summary),
+        ], result
+
+    elif name == "import_archive":
+        from .archive import extract_archive
+
+        archives = get_archives()
+        arguments = arguments or {}
+        if "content" not in arguments:
+            call.outcome = "rejected"
+            call.error = "No content provided"
+            return [types.TextContent(type="text", text="No content provided", error=True)]
+        upload_id = arguments.get("upload_id")
+        try:
+            data = base64.b64decode(arguments["content"], validate=True)
+            if upload_id is None:
+                destination = executor._normalize_path(
+                    arguments.get("destination") or executor.allowed_dir
+                )
+                if not os.path.isdir(destination):
+                    raise ValueError(f"Destination '{destination}' is not a directory")
+                upload_id = archives.start_upload(destination)
+            transfer = archives.append(upload_id, data)
+            if not arguments.get("final", True):
+                result = {"upload_id": upload_id, "bytes_received": transfer.size, "complete": False}
+                return [
+                    types.TextContent(
+                        type="text",
+                        text=(
+                            f"Received {transfer.size} bytes. Send the next chunk with "
+                            f"upload_id={upload_id}, and final=true with the last one."
+                        ),
+                    )
+                ], result
+            transfer.file.seek(0)
+            try:
+                extracted = await asyncio.to_thread(
+                    extract_archive,
+                    transfer.file,
+                    transfer.destination,
+                    executor.allowed_dir,
+                    archives.max_bytes,
+                )
+            finally:
+                archives.discard(upload_id)
+        except CommandSecurityError as e:
+            call.outcome = "rejected"
+            call.error = str(e)
+            return [
+                types.TextContent(
+                    type="text", text=f"Security violation: {str(e)}", error=True
+                )
+            ]
+        except (OSError, ValueError) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+
+        call.stdout_bytes = transfer.size
+        result = {
+            "destination": transfer.destination,
+            "extracted": extracted,
+            "bytes_received": transfer.size,
+            "complete": True,
+        }
+        text = f"Extracted {len(extracted)} members into {transfer.destination}"
+        return [types.TextContent(type="text", text=text)], result
+
+    elif name == "query_history" and get_history() is not None:
+        import sqlite3
+
+        from .history import format_report
+
+        history = get_history()
+        report = (arguments or {}).get("report", "")
+        # Each profile only sees the commands that ran in it
+        executors = await _load_executors()
+        try:
+            rows = await asyncio.to_thread(
+                history.query,
+                report,
+                command=(arguments or {}).get("command"),
+                since_seconds=(arguments or {}).get("since_seconds"),
+                limit=int((arguments or {}).get("limit", 10)),
+                profile=profile_name(executors, executor),
+                # Executions recorded before they were tagged with a profile ran in the default one
+                include_unprofiled=executor is default_executor(executors),
+            )
+        except (ValueError, sqlite3.Error) as e:
+            call.outcome = "error"
+            call.error = str(e)
+            return [types.TextContent(type="text", text=f"Error: {str(e)}", error=True)]
+        return [types.TextContent(type="text", text=format_report(report, rows))]
+
+    raise ValueError(f"Unknown tool: {name}")
+
+
+async def _warm_up() -> None:
+    # Build the executors while the client is still initializing the session
+    try:
+        executors = await _load_executors()
+    except (OSError, ValueError) as e:
+        logger.error("Invalid configuration: %s", e)
+        return
+    # Start building search indexes so the first search does not have to scan
+    for profile_executor in executors.values():
+        if "search" in profile_executor.security_config.native_tools:
+            get_search_index(profile_executor.allowed_dir)
+
+
+async def main():
+    import mcp.server.stdio
+
+    loop = asyncio.get_running_loop()
+    if watchdog is not None:
+        watchdog.start()
+    background_tasks = [asyncio.create_task(_warm_up())]
+    if hasattr(signal, "SIGHUP"):
+        loop.add_signal_handler(
+            signal.SIGHUP,
+            lambda: background_tasks.append(asyncio.ensure_future(reload_policy())),
+        )
+    profile_signals = {"SIGUSR1": "cpu", "SIGUSR2": "memory_snapshot"} if get_profiler() is not None else {}
+    for signal_name, action in profile_signals.items():
+        loop.add_signal_handler(
+            getattr(signal, signal_name),
+            lambda action=action: background_tasks.append(asyncio.ensure_future(_profile_on_signal(action))),
+        )
+    policy_file = os.getenv("POLICY_FILE")
+    watch_interval = float(os.getenv("POLICY_WATCH_INTERVAL", "2.0"))
+    if policy_file and watch_interval > 0:
+        background_tasks.append(
+            asyncio.create_task(watch_policy_file(policy_file, watch_interval))
         )
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="cli-mcp-server",
+                    server_version="0.2.6",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(tools_changed=True),
+                        experimental_capabilities={},
+                    ),
+                ),
+            )
+    finally:
+        if watchdog is not None:
+            watchdog.stop()
+        for task in background_tasks:
+            task.cancel()
+        if hasattr(signal, "SIGHUP"):
+            loop.remove_signal_handler(signal.SIGHUP)
+        for signal_name in profile_signals:
+            loop.remove_signal_handler(getattr(signal, signal_name))
+        if recorder is not None:
+            recorder.close()
+        if audit_log is not None:
+            audit_log.close()
+        if _history is not None:
+            _history.close()
+        if _tree_cache is not None:
+            _tree_cache.close()
+        for index in _search_indexes.values():
+            index.close()
+        if _change_waiters is not None:
+            _change_waiters.close()
+        uploads.close()
+        if _archives is not None:
+            _archives.close()
+        scheduler.estimator.save()
@@ -0,0 +1,305 @@
+import errno
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
+
+SPAWN_BACKENDS = ("subprocess", "forkserver")
+
+# Largest message exchanged with the helper; commands are limited far below this
+_MAX_MESSAGE = 1024 * 1024
+
+
+def _send(sock: socket.socket, message: Dict[str, Any], fds: List[int] = ()) -> None:
+    data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    if fds:
+        socket.send_fds(sock, [data], list(fds))
+    else:
+        sock.send(data)
+
+
+class ForkServerProcess:
+    """
+    A command started by the fork server, with the parts of ``subprocess.Popen``
+    that ``run_process`` uses.
+    """
+
+    def __init__(self, server: "ForkServer", request_id: int, args, stdin, stdout, stderr):
+        self.args = args
+        self.pid: Optional[int] = None
+        self.returncode: Optional[int] = None
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self._server = server
+        self._id = request_id
+        self._started = threading.Event()
+        self._exited = threading.Event()
+        self._error: Optional[OSError] = None
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def kill(self) -> None:
+        if self.returncode is None:
+            self._server.kill(self._id)
+
+    def __enter__(self) -> "ForkServerProcess":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for stream in (self.stdin, self.stdout, self.stderr):
+            if stream is not None:
+                stream.close()
+        self.wait()
+
+
+class ForkServer:
+    """
+    A helper process that starts commands on request.
+
+    The helper is a fresh interpreter running this file as a script, without
+    the package or site-packages, so it only holds the few standard library
+    modules it needs and starting a command from it stays cheap however large
+    the server grows. Commands get the server's environment at the time of
+    the request, as with ``subprocess``.
+    Requests go over a socket pair, with the pipe ends for the command's stdin,
+    stdout and stderr passed as file descriptors, so output flows from the
+    command straight to the server. The helper reports each command's exit
+    status, and kills commands on request.
+    """
+
+    def __init__(self):
+        self._sock, helper_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            # -I keeps this file's directory off sys.path, so its modules cannot shadow the standard library
+            self._helper = subprocess.Popen(
+                [sys.executable, "-I", "-S", os.path.abspath(__file__), str(helper_sock.fileno())],
+                pass_fds=[helper_sock.fileno()],
+                stdin=subprocess.DEVNULL,
+            )
+        finally:
+            helper_sock.close()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._processes: Dict[int, ForkServerProcess] = {}
+        self.alive = True
+        self._reader = threading.Thread(target=self._read, name="forkserver-reader", daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        while True:
+            try:
+                data = self._sock.recv(_MAX_MESSAGE)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            message = json.loads(data)
+            with self._lock:
+                process = self._processes.get(message["id"])
+            if process is None:
+                continue
+            if "error" in message:
+                process._error = OSError(message.get("errno") or errno.EIO, message["error"], message.get("filename"))
+                process._started.set()
+            elif "pid" in message:
+                process.pid = message["pid"]
+                process._started.set()
+            elif "returncode" in message:
+                process.returncode = message["returncode"]
+                with self._lock:
+                    self._processes.pop(message["id"], None)
+                process._exited.set()
+        # The helper has gone: fail everything still waiting on it
+        self.alive = False
+        with self._lock:
+            processes, self._processes = list(self._processes.values()), {}
+        for process in processes:
+            if not process._started.is_set():
+                process._error = OSError(errno.EPIPE, "Fork server exited")
+                process._started.set()
+            process.returncode = -signal.SIGKILL
+            process._exited.set()
+
+    def popen(
+        self,
+        args: Union[str, List[str]],
+        *,
+        shell: bool = False,
+        cwd: Optional[str] = None,
+        stdin: int = subprocess.DEVNULL,
+        stdout: int = subprocess.PIPE,
+        stderr: int = subprocess.PIPE,
+    ) -> ForkServerProcess:
+        """Starts a command like ``subprocess.Popen``; stdout and stderr must be pipes."""
+        if stdout != subprocess.PIPE or stderr != subprocess.PIPE:
+            raise ValueError("The fork server only supports piped stdout and stderr")
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        child_fds = [stdout_write, stderr_write]
+        parent_fds = [stdout_read, stderr_read]
+        stdin_write = None
+        if stdin == subprocess.PIPE:
+            stdin_read, stdin_write = os.pipe()
+            child_fds.append(stdin_read)
+            parent_fds.append(stdin_write)
+        try:
+            with self._lock:
+                self._next_id += 1
+                request_id = self._next_id
+                process = ForkServerProcess(
+                    self,
+                    request_id,
+                    args,
+                    open(stdin_write, "wb", buffering=0) if stdin_write is not None else None,
+                    open(stdout_read, "rb", buffering=0),
+                    open(stderr_read, "rb", buffering=0),
+                )
+                self._processes[request_id] = process
+            _send(
+                self._sock,
+                {"op": "spawn", "id": request_id, "args": args, "shell": shell, "cwd": cwd, "env": dict(os.environ)},
+                child_fds,
+            )
+        except BaseException:
+            for fd in parent_fds:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            raise
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+        process._started.wait()
+        if process._error is not None:
+            with self._lock:
+                self._processes.pop(request_id, None)
+            for stream in (process.stdin, process.stdout, process.stderr):
+                if stream is not None:
+                    stream.close()
+            raise process._error
+        return process
+
+    def kill(self, request_id: int) -> None:
+        try:
+            _send(self._sock, {"op": "kill", "id": request_id})
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        self._sock.close()
+        try:
+            self._helper.wait(5)
+        except subprocess.TimeoutExpired:
+            self._helper.kill()
+
+
+_forkserver: Optional[ForkServer] = None
+_forkserver_lock = threading.Lock()
+
+
+def get_forkserver() -> ForkServer:
+    """Returns the process-wide fork server, starting it again if its helper has exited."""
+    global _forkserver
+    with _forkserver_lock:
+        if _forkserver is None or not _forkserver.alive:
+            _forkserver = ForkServer()
+        return _forkserver
+
+
+def forkserver_popen(args, **kwargs) -> ForkServerProcess:
+    return get_forkserver().popen(args, **kwargs)
+
+
+def load_spawner(env: Optional[Dict[str, str]] = None) -> Callable[..., Any]:
+    """
+    Returns the function that starts commands, chosen by environment variables.
+
+    Environment Variables:
+        SPAWN_BACKEND: 'subprocess' to start commands from the server process, or
+                       'forkserver' to start them from a helper process (default: subprocess)
+    """
+    env = os.environ if env is None else env
+    backend = env.get("SPAWN_BACKEND", "subprocess").lower()
+    if backend not in SPAWN_BACKENDS:
+        raise ValueError(f"Invalid SPAWN_BACKEND '{backend}', expected one of: {', '.join(SPAWN_BACKENDS)}")
+    if backend == "forkserver":
+        # Start the helper now rather than on the first command
+        get_forkserver()
+        return forkserver_popen
+    return subprocess.Popen
+
+
+def _serve(sock: socket.socket) -> None:
+    """The helper's loop: starts and kills commands until the server goes away."""
+    send_lock = threading.Lock()
+    processes: Dict[int, subprocess.Popen] = {}
+
+    def reply(message: Dict[str, Any]) -> None:
+        with send_lock:
+            try:
+                _send(sock, message)
+            except OSError:
+                pass
+
+    def wait(request_id: int, process: subprocess.Popen) -> None:
+        returncode = process.wait()
+        processes.pop(request_id, None)
+        reply({"id": request_id, "returncode": returncode})
+
+    while True:
+        try:
+            data, fds, _, _ = socket.recv_fds(sock, _MAX_MESSAGE, 3)
+        except OSError:
+            break
+        if not data:
+            break
+        message = json.loads(data)
+        request_id = message["id"]
+        if message["op"] == "kill":
+            process = processes.get(request_id)
+            if process is not None and process.poll() is None:
+                process.kill()
+            continue
+        stdout_fd, stderr_fd = fds[0], fds[1]
+        stdin_fd = fds[2] if len(fds) > 2 else subprocess.DEVNULL
+        try:
+            process = subprocess.Popen(
+                message["args"],
+                shell=message["shell"],
+                cwd=message["cwd"],
+                env=message["env"],
+                stdin=stdin_fd,
+                stdout=stdout_fd,
+                stderr=stderr_fd,
+            )
+        except OSError as e:
+            reply({"id": request_id, "error": e.strerror or str(e), "errno": e.errno, "filename": e.filename})
+            continue
+        finally:
+            for fd in fds:
+                os.close(fd)
+        processes[request_id] = process
+        reply({"id": request_id, "pid": process.pid})
+        threading.Thread(target=wait, args=(request_id, process), daemon=True).start()
+
+    # Nobody is left to read the output of the remaining commands
+    for process in list(processes.values()):
+        if process.poll() is None:
+            process.kill()
+
+
+# The fork server runs this file as its helper process
+if __name__ == "__main__":
+    _serve(socket.socket(fileno=int(sys.argv[1])))
@@ -0,0 +1,275 @@
+import collections
+import os
+import stat
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .watcher import InotifyWatcher, WatchEvent
+
+
+@dataclass
+class DirEntry:
+    """
+    A directory entry as returned by os.scandir, without following symlinks
+    """
+
+    name: str
+    type: str
+    size: int
+    mtime: float
+    mode: int
+
+
+def _entry_type(mode: int) -> str:
+    if stat.S_ISDIR(mode):
+        return "dir"
+    if stat.S_ISREG(mode):
+        return "file"
+    if stat.S_ISLNK(mode):
+        return "symlink"
+    return "other"
+
+
+def _scan(directory: str) -> List[DirEntry]:
+    entries = []
+    with os.scandir(directory) as iterator:
+        for entry in iterator:
+            try:
+                info = entry.stat(follow_symlinks=False)
+            except OSError:
+                # Removed between listing and stat
+                continue
+            entries.append(
+                DirEntry(
+                    name=entry.name,
+                    type=_entry_type(info.st_mode),
+                    size=info.st_size,
+                    mtime=info.st_mtime,
+                    mode=info.st_mode,
+                )
+            )
+    entries.sort(key=lambda entry: entry.name)
+    return entries
+
+
+class TreeCache:
+    """
+    LRU cache of directory listings kept current by inotify.
+
+    Each cached directory is watched through the shared ``InotifyWatcher``; any
+    event inside it drops its listing, and the next lookup rescans it. Where
+    inotify is unavailable, or the watch limit is reached, a cached listing is
+    revalidated against the directory's mtime on every lookup instead.
+
+    An event that arrives while a directory is being scanned bumps the
+    directory's change count, and a scan that saw the count change is returned
+    but not cached, as it may already be stale.
+    """
+
+    def __init__(self, watcher: Optional[InotifyWatcher] = None, max_dirs: int = 4096):
+        self.watcher = watcher
+        self.max_dirs = max_dirs
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # directory -> (mtime_ns, watched, entries)
+        self._listings: "collections.OrderedDict[str, Tuple[int, bool, List[DirEntry]]]" = (
+            collections.OrderedDict()
+        )
+        # directory being scanned -> (scans in progress, events seen)
+        self._scanning: Dict[str, List[int]] = {}
+        self._unsubscribe = watcher.subscribe(self._on_event) if watcher else None
+
+    def __len__(self) -> int:
+        return len(self._listings)
+
+    def listdir(self, directory: str) -> List[DirEntry]:
+        """
+        Returns the sorted entries of a directory, from the cache when valid.
+
+        Raises:
+            OSError: If the directory cannot be listed.
+        """
+        with self._lock:
+            cached = self._listings.get(directory)
+        if cached is not None:
+            mtime_ns, watched, entries = cached
+            if watched or os.stat(directory).st_mtime_ns == mtime_ns:
+                with self._lock:
+                    if directory in self._listings:
+                        self._listings.move_to_end(directory)
+                self.hits += 1
+                return entries
+            self._invalidate(directory)
+
+        self.misses += 1
+        with self._lock:
+            scanning = self._scanning.setdefault(directory, [0, 0])
+            scanning[0] += 1
+            changes = scanning[1]
+        # Watch before scanning so that changes made during the scan raise the change count
+        watched = self.watcher.add(directory) if self.watcher else False
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+            entries = _scan(directory)
+        except OSError:
+            if watched:
+                self.watcher.remove(directory)
+            raise
+        finally:
+            with self._lock:
+                scanning[0] -= 1
+                changed = scanning[1] != changes
+                if not scanning[0]:
+                    del self._scanning[directory]
+        if changed:
+            if watched:
+                self.watcher.remove(directory)
+            return entries
+        evicted = []
+        with self._lock:
+            previous = self._listings.pop(directory, None)
+            if previous is not None and previous[1]:
+                evicted.append(directory)
+            self._listings[directory] = (mtime_ns, watched, entries)
+            while len(self._listings) > self.max_dirs:
+                evicted_dir, (_, evicted_watched, _) = self._listings.popitem(last=False)
+                if evicted_watched:
+                    evicted.append(evicted_dir)
+        for evicted_dir in evicted:
+            self.watcher.remove(evicted_dir)
+        return entries
+
+    def _invalidate(self, directory: str) -> None:
+        with self._lock:
+            cached = self._listings.pop(directory, None)
+        if cached is not None and cached[1]:
+            self.watcher.remove(directory)
+
+    def clear(self) -> None:
+        with self._lock:
+            listings, self._listings = self._listings, collections.OrderedDict()
+        for directory, (_, watched, _) in listings.items():
+            if watched:
+                self.watcher.remove(directory)
+
+    def close(self) -> None:
+        if self._unsubscribe:
+            self._unsubscribe()
+        self.clear()
+
+    def _on_event(self, event: WatchEvent) -> None:
+        with self._lock:
+            if event.kind == "overflow":
+                for scanning in self._scanning.values():
+                    scanning[1] += 1
+            elif os.path.dirname(event.path) in self._scanning:
+                self._scanning[os.path.dirname(event.path)][1] += 1
+        if event.kind == "overflow":
+            self.clear()
+            return
+        self._invalidate(os.path.dirname(event.path))
+        if event.is_dir and event.kind == "deleted":
+            self._invalidate(event.path)
+
+
+def walk(
+    cache: TreeCache,
+    root: str,
+    depth: int = 1,
+    include_hidden: bool = True,
+) -> Iterator[Tuple[str, DirEntry]]:
+    """
+    Yields ``(relative_path, entry)`` for the tree under ``root`` in depth-first,
+    name-sorted order, descending at most ``depth`` levels. Symlinked directories
+    are listed but not followed.
+
+    Raises:
+        OSError: If ``root`` cannot be listed. Subdirectories that cannot be
+            listed are skipped.
+    """
+    entries = cache.listdir(root)
+    yield from _walk(cache, root, "", entries, 1, depth, include_hidden)
+
+
+def _walk(
+    cache: TreeCache,
+    directory: str,
+    prefix: str,
+    entries: List[DirEntry],
+    level: int,
+    depth: int,
+    include_hidden: bool,
+) -> Iterator[Tuple[str, DirEntry]]:
+    for entry in entries:
+        if not include_hidden and entry.name.startswith("."):
+            continue
+        relative = f"{prefix}{entry.name}"
+        yield relative, entry
+        if entry.type != "dir" or level >= depth:
+            continue
+        child = os.path.join(directory, entry.name)
+        try:
+            children = cache.listdir(child)
+        except OSError:
+            continue
+        yield from _walk(cache, child, f"{relative}/", children, level + 1, depth, include_hidden)
+
+
+def list_tree(
+    cache: TreeCache,
+    root: str,
+    depth: int = 1,
+    offset: int = 0,
+    limit: int = 200,
+    include_hidden: bool = True,
+) -> Dict[str, Any]:
+    """
+    Lists a page of the tree under ``root``.
+
+    Returns:
+        Dict[str, Any]: ``entries`` (relative path, type, size, mtime), ``offset``
+            and ``next_offset``, which is None on the last page.
+    """
+    page = []
+    has_more = False
+    for index, (relative, entry) in enumerate(walk(cache, root, depth, include_hidden)):
+        if index < offset:
+            continue
+        if len(page) == limit:
+            has_more = True
+            break
+        page.append(
+            {"path": relative, "type": entry.type, "size": entry.size, "mtime": entry.mtime}
+        )
+    return {
+        "entries": page,
+        "offset": offset,
+        "next_offset": offset + len(page) if has_more else None,
+    }
+
+
+def stat_path(path: str) -> Dict[str, Any]:
+    """
+    Returns the metadata of a path without following a final symlink.
+
+    Raises:
+        OSError: If the path cannot be stat'ed.
+    """
+    info = os.lstat(path)
+    result = {
+        "type": _entry_type(info.st_mode),
+        "size": info.st_size,
+        "mode": stat.filemode(info.st_mode),
+        "permissions": oct(stat.S_IMODE(info.st_mode)),
+        "uid": info.st_uid,
+        "gid": info.st_gid,
+        "nlink": info.st_nlink,
+        "mtime": info.st_mtime,
+        "atime": info.st_atime,
+        "ctime": info.st_ctime,
+    }
+    if stat.S_ISLNK(info.st_mode):
+        result["target"] = os.readlink(path)
+    return result
@@ -0,0 +1,117 @@
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Deque, Optional
+
+from .metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stall:
+    """A period during which the event loop did not run, with what it was running instead"""
+
+    started_at: float
+    duration_ms: float
+    stack: str
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop lag and reports the code that blocks the loop.
+
+    A task on the loop sleeps for ``interval`` seconds at a time; how late it
+    wakes up is the lag, recorded in the ``event_loop_lag_ms`` histogram. The
+    task also leaves a heartbeat that a separate thread checks. When the loop
+    has not beaten for ``threshold`` seconds, the thread captures the loop
+    thread's stack while the blocking code is still running, logs it and keeps
+    the last stalls, so a slow synchronous step in any handler shows up with
+    the place it blocked.
+    """
+
+    def __init__(
+        self,
+        metrics: MetricsRegistry,
+        interval: float = 0.1,
+        threshold: float = 0.5,
+        max_stalls: int = 20,
+    ):
+        self.metrics = metrics
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: Deque[Stall] = collections.deque(maxlen=max_stalls)
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Starts measuring; must be called from the event loop to watch."""
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _measure(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            self.metrics.observe("event_loop_lag_ms", max(0.0, now - expected) * 1000)
+
+    def _watch(self) -> None:
+        reported_beat, stall = None, None
+        while not self._stopped.wait(self.threshold / 4):
+            beat = self._beat
+            if stall is not None and beat != reported_beat:
+                # The loop is running again, so the stall's full length is known
+                stall.duration_ms = (beat - reported_beat) * 1000
+                self.metrics.observe("event_loop_stall_ms", stall.duration_ms)
+                stall = None
+            blocked = time.monotonic() - beat
+            if blocked < self.threshold + self.interval or beat == reported_beat:
+                continue
+            # Capture the stack once per stall, while the blocking code still runs
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            stall = Stall(started_at=time.time() - blocked, duration_ms=blocked * 1000, stack=stack)
+            self.stalls.append(stall)
+            self.metrics.inc("event_loop_stalls_total")
+            logger.warning("Event loop blocked for %.0f ms in:\n%s", blocked * 1000, stack)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+        if self._thread is not None:
+            self._thread.join(self.threshold)
+
+
+def load_loop_watchdog(metrics: MetricsRegistry) -> Optional[LoopWatchdog]:
+    """
+    Creates the event-loop watchdog from environment variables.
+
+    Environment Variables:
+        LOOP_LAG_INTERVAL: Seconds between lag measurements (default: 0.1)
+        LOOP_STALL_THRESHOLD: Seconds the loop must be blocked before its stack is
+                              captured; 0 disables the watchdog (default: 0.5)
+    """
+    threshold = float(os.getenv("LOOP_STALL_THRESHOLD", "0.5"))
+    if threshold <= 0:
+        return None
+    return LoopWatchdog(
+        metrics,
+        interval=float(os.getenv("LOOP_LAG_INTERVAL", "0.1")),
+        threshold=threshold,
+    )
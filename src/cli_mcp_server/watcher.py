@@ -0,0 +1,227 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+@dataclass
+class WatchEvent:
+    """
+    A change to an entry of a watched directory
+
+    ``kind`` is one of ``created``, ``modified``, ``deleted`` or ``overflow``.
+    For ``overflow`` events, events were lost and ``path`` is empty.
+    """
+
+    path: str
+    kind: str
+    is_dir: bool = False
+
+
+def _event_kind(mask: int) -> Optional[str]:
+    if mask & IN_Q_OVERFLOW:
+        return "overflow"
+    if mask & (IN_CREATE | IN_MOVED_TO):
+        return "created"
+    if mask & (IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF | IN_MOVE_SELF):
+        return "deleted"
+    if mask & (IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB):
+        return "modified"
+    return None
+
+
+class InotifyWatcher:
+    """
+    One inotify instance shared by everything in the process that watches files.
+
+    Directories are watched non-recursively and reference counted, so several
+    consumers can watch the same directory. Events are read by a single
+    background thread and passed to every subscriber; subscribers are called on
+    that thread and must not block.
+    """
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self._lock = threading.Lock()
+        self._paths: Dict[int, str] = {}
+        self._watches: Dict[str, int] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._subscribers: List[Callable[[WatchEvent], None]] = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+        self._thread.start()
+
+    def add(self, directory: str) -> bool:
+        """
+        Starts watching a directory, or adds a reference to an existing watch.
+
+        Returns:
+            bool: True if the directory is watched, False if the watch could not be
+                added (for example when the inotify watch limit is reached).
+        """
+        with self._lock:
+            if directory in self._watches:
+                self._refcounts[directory] += 1
+                return True
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    logger.warning("inotify watch limit reached, not watching %s", directory)
+                return False
+            self._watches[directory] = wd
+            self._paths[wd] = directory
+            self._refcounts[directory] = 1
+            return True
+
+    def remove(self, directory: str) -> None:
+        """
+        Drops a reference to a directory watch, removing the watch with the last one.
+        """
+        with self._lock:
+            if directory not in self._watches:
+                return
+            self._refcounts[directory] -= 1
+            if self._refcounts[directory] > 0:
+                return
+            wd = self._watches.pop(directory)
+            del self._refcounts[directory]
+            self._paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def is_watched(self, directory: str) -> bool:
+        return directory in self._watches
+
+    def subscribe(self, callback: Callable[[WatchEvent], None]) -> Callable[[], None]:
+        """
+        Registers a callback for all events.
+
+        Returns:
+            Callable[[], None]: A function that removes the subscription.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def close(self) -> None:
+        self._closed = True
+        self._thread.join(2.0)
+        os.close(self._fd)
+
+    def _dispatch(self, event: WatchEvent) -> None:
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Watch subscriber failed")
+
+    def _handle(self, buffer: bytes) -> None:
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            name = buffer[offset + _EVENT_HEADER.size : offset + _EVENT_HEADER.size + length]
+            offset += _EVENT_HEADER.size + length
+            kind = _event_kind(mask)
+            if kind == "overflow":
+                self._dispatch(WatchEvent(path="", kind="overflow"))
+                continue
+            with self._lock:
+                directory = self._paths.get(wd)
+                if mask & IN_IGNORED and directory is not None:
+                    # The kernel dropped the watch, e.g. because the directory was deleted
+                    self._paths.pop(wd, None)
+                    self._watches.pop(directory, None)
+                    self._refcounts.pop(directory, None)
+            if directory is None or kind is None:
+                continue
+            name = os.fsdecode(name.rstrip(b"\0"))
+            path = os.path.join(directory, name) if name else directory
+            self._dispatch(WatchEvent(path=path, kind=kind, is_dir=bool(mask & IN_ISDIR) or not name))
+
+    def _run(self) -> None:
+        while not self._closed:
+            try:
+                readable, _, _ = select.select([self._fd], [], [], 0.5)
+            except (OSError, ValueError):
+                return
+            if not readable:
+                continue
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            self._handle(buffer)
+
+
+_watcher: Optional[InotifyWatcher] = None
+_watcher_lock = threading.Lock()
+_watcher_unavailable = False
+
+
+def get_watcher() -> Optional[InotifyWatcher]:
+    """
+    Returns the process-wide inotify watcher, or None where inotify is unavailable.
+    """
+    global _watcher, _watcher_unavailable
+    if _watcher is not None or _watcher_unavailable:
+        return _watcher
+    with _watcher_lock:
+        if _watcher is None and not _watcher_unavailable:
+            if not sys.platform.startswith("linux"):
+                _watcher_unavailable = True
+                return None
+            try:
+                _watcher = InotifyWatcher()
+            except (OSError, AttributeError) as e:
+                logger.info("inotify is not available: %s", e)
+                _watcher_unavailable = True
+    return _watcher
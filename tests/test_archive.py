@@ -0,0 +1,209 @@
+import os
+import io
+import base64
+import asyncio
+import importlib
+import tarfile
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from cli_mcp_server import archive
+from cli_mcp_server.archive import ArchiveError, ArchiveTransfers, Transfer, build_archive, extract_archive
+
+
+def _tar(members):
+    """Builds an uncompressed archive from (TarInfo, data) pairs."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for info, data in members:
+            if data is not None:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            else:
+                tar.addfile(info)
+    buffer.seek(0)
+    return buffer
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tempdir.name)
+        self.source = os.path.join(self.root, "source")
+        os.makedirs(os.path.join(self.source, "nested"))
+        with open(os.path.join(self.source, "a.txt"), "w") as f:
+            f.write("alpha")
+        with open(os.path.join(self.source, "nested", "b.bin"), "wb") as f:
+            f.write(os.urandom(100000))
+        os.symlink("a.txt", os.path.join(self.source, "link"))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_round_trip(self):
+        for compression in ("none", "gzip"):
+            transfer = build_archive([self.source], self.root, compression=compression)
+            destination = os.path.join(self.root, f"out-{compression}")
+            os.makedirs(destination)
+            extracted = extract_archive(transfer.file, destination, self.root, 10**9)
+            self.assertIn("source/nested/b.bin", extracted)
+            with open(os.path.join(destination, "source", "a.txt")) as f:
+                self.assertEqual(f.read(), "alpha")
+            self.assertEqual(os.readlink(os.path.join(destination, "source", "link")), "a.txt")
+            with open(os.path.join(self.source, "nested", "b.bin"), "rb") as f, open(
+                os.path.join(destination, "source", "nested", "b.bin"), "rb"
+            ) as g:
+                self.assertEqual(f.read(), g.read())
+
+    def test_archive_size_limit(self):
+        with self.assertRaises(ArchiveError):
+            build_archive([self.source], self.root, max_bytes=1000)
+
+    def test_size_limit_stops_writing_inside_a_large_file(self):
+        with open(os.path.join(self.source, "large.bin"), "wb") as f:
+            f.write(os.urandom(4 * 1024 * 1024))
+        written = []
+
+        class Spool(tempfile.SpooledTemporaryFile):
+            def write(self, data):
+                written.append(len(data))
+                return super().write(data)
+
+        for compression in ("none", "gzip"):
+            written.clear()
+            with mock.patch.object(archive.tempfile, "SpooledTemporaryFile", Spool):
+                with self.assertRaises(ArchiveError):
+                    build_archive([self.source], self.root, compression=compression, max_bytes=200000)
+            self.assertLessEqual(sum(written), 200000)
+
+    def test_concurrent_chunk_reads(self):
+        data = os.urandom(64 * 1024)
+        file = tempfile.SpooledTemporaryFile()
+        file.write(data)
+        transfers = ArchiveTransfers(chunk_bytes=1024)
+        transfer_id = transfers.add(Transfer(file=file, size=len(data) + 1))
+        offsets = list(range(0, len(data), 1024)) * 4
+        with ThreadPoolExecutor(8) as pool:
+            chunks = list(pool.map(lambda offset: transfers.read_chunk(transfer_id, offset), offsets))
+        for offset, chunk in zip(offsets, chunks):
+            self.assertEqual(chunk, data[offset : offset + 1024])
+        transfers.close()
+
+    def test_rejects_members_outside_root(self):
+        traversal = tarfile.TarInfo("../escape.txt")
+        absolute = tarfile.TarInfo("/tmp/escape.txt")
+        symlink = tarfile.TarInfo("evil")
+        symlink.type = tarfile.SYMTYPE
+        symlink.linkname = "../../etc"
+        hardlink = tarfile.TarInfo("passwd")
+        hardlink.type = tarfile.LNKTYPE
+        hardlink.linkname = "/etc/passwd"
+        device = tarfile.TarInfo("dev")
+        device.type = tarfile.CHRTYPE
+        for member, data in ((traversal, b"x"), (absolute, b"x"), (symlink, None), (hardlink, None), (device, None)):
+            with self.assertRaises(ArchiveError, msg=member.name):
+                extract_archive(_tar([(member, data)]), self.source, self.source, 10**9)
+
+    def test_rejects_writes_through_symlinks(self):
+        os.symlink(self.root, os.path.join(self.source, "up"))
+        with self.assertRaises(ArchiveError):
+            extract_archive(_tar([(tarfile.TarInfo("up/x.txt"), b"x")]), self.source, self.source, 10**9)
+
+    def test_rejects_symlink_retargeted_by_a_later_member(self):
+        # dlink is inside the root while e does not exist, and would point at its parent once e -> .
+        dlink = tarfile.TarInfo("dlink")
+        dlink.type = tarfile.SYMTYPE
+        dlink.linkname = "e/.."
+        e = tarfile.TarInfo("e")
+        e.type = tarfile.SYMTYPE
+        e.linkname = "."
+        with self.assertRaises(ArchiveError):
+            extract_archive(_tar([(dlink, None), (e, None)]), self.source, self.source, 10**9)
+        self.assertFalse(os.path.lexists(os.path.join(self.source, "dlink")))
+        self.assertFalse(os.path.lexists(os.path.join(self.source, "e")))
+
+    def test_failed_extraction_removes_what_it_created(self):
+        link = tarfile.TarInfo("new/link")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "file.txt"
+        members = [
+            (tarfile.TarInfo("new/deeper/file.txt"), b"x"),
+            (link, None),
+            (tarfile.TarInfo("a.txt"), b"replaced"),
+            (tarfile.TarInfo("../escape.txt"), b"x"),
+        ]
+        with self.assertRaises(ArchiveError):
+            extract_archive(_tar(members), self.source, self.source, 10**9)
+        self.assertFalse(os.path.lexists(os.path.join(self.source, "new")))
+        with open(os.path.join(self.source, "a.txt")) as f:
+            self.assertEqual(f.read(), "replaced")
+
+    def test_extracted_size_limit(self):
+        with self.assertRaises(ArchiveError):
+            extract_archive(_tar([(tarfile.TarInfo("big"), b"x" * 100)]), self.source, self.source, 10)
+
+
+class TestArchiveTools(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["NATIVE_TOOLS"] = "export_archive,import_archive"
+        os.environ["ARCHIVE_CHUNK_BYTES"] = "1000"
+        os.makedirs(os.path.join(self.tempdir.name, "fixtures"))
+        for n in range(20):
+            with open(os.path.join(self.tempdir.name, "fixtures", f"f{n}.json"), "w") as f:
+                f.write(f'{{"n": {n}}}' * 50)
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("NATIVE_TOOLS", None)
+        os.environ.pop("ARCHIVE_CHUNK_BYTES", None)
+        self.server.archives.close()
+        self.tempdir.cleanup()
+
+    def _call(self, name, arguments):
+        return asyncio.run(self.server.handle_call_tool(name, arguments))
+
+    def test_export_then_import_in_chunks(self):
+        chunks = []
+        content, result = self._call("export_archive", {"paths": ["fixtures"], "compression": "none"})
+        chunks.append(content[0].resource.blob)
+        while result["next_offset"] is not None:
+            content, result = self._call(
+                "export_archive", {"archive_id": result["archive_id"], "offset": result["next_offset"]}
+            )
+            chunks.append(content[0].resource.blob)
+        self.assertGreater(len(chunks), 2)
+
+        os.makedirs(os.path.join(self.tempdir.name, "copy"))
+        upload_id = None
+        for index, chunk in enumerate(chunks):
+            arguments = {"content": chunk, "final": index == len(chunks) - 1}
+            if upload_id is None:
+                arguments["destination"] = "copy"
+            else:
+                arguments["upload_id"] = upload_id
+            content, result = self._call("import_archive", arguments)
+            upload_id = result.get("upload_id")
+        self.assertTrue(result["complete"])
+        self.assertEqual(len(os.listdir(os.path.join(self.tempdir.name, "copy", "fixtures"))), 20)
+
+    def test_rejects_paths_outside_allowed_dir(self):
+        result = self._call("export_archive", {"paths": ["/etc"]})
+        self.assertIn("Security violation", result[0].text)
+        archive = base64.b64encode(_tar([(tarfile.TarInfo("../x"), b"x")]).getvalue()).decode()
+        result = self._call("import_archive", {"content": archive})
+        self.assertIn("unsafe path", result[0].text)
+
+
+if __name__ == "__main__":
+    unittest.main()
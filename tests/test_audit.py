@@ -0,0 +1,87 @@
+import os
+import json
+import importlib
+import asyncio
+import tempfile
+import unittest
+
+
+def read_entries(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class TestAuditLog(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.audit_file = os.path.join(self.tempdir.name, "audit.jsonl")
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["AUDIT_LOG_FILE"] = self.audit_file
+
+    def tearDown(self):
+        os.environ.pop("AUDIT_LOG_FILE", None)
+        self.tempdir.cleanup()
+
+    def _reload_server(self):
+        import cli_mcp_server.server as server_module
+
+        return importlib.reload(server_module)
+
+    def test_audits_executed_and_rejected_commands(self):
+        with open(os.path.join(self.tempdir.name, "foo.txt"), "w") as f:
+            f.write("test")
+        server = self._reload_server()
+        asyncio.run(server.handle_call_tool("run_command", {"command": "cat ./foo.txt"}))
+        asyncio.run(server.handle_call_tool("run_command", {"command": "rm foo.txt"}))
+        asyncio.run(server.handle_call_tool("show_security_rules", {}))
+        server.audit_log.close()
+
+        entries = read_entries(self.audit_file)
+        self.assertEqual(len(entries), 2)
+        executed, rejected = entries
+        self.assertEqual(executed["command"], "cat ./foo.txt")
+        self.assertEqual(
+            executed["argv"], ["cat", os.path.join(server.executor.allowed_dir, "foo.txt")]
+        )
+        self.assertEqual(executed["cwd"], server.executor.allowed_dir)
+        self.assertEqual(executed["exit_code"], 0)
+        self.assertIsNone(executed["rejection_reason"])
+        self.assertEqual(rejected["outcome"], "rejected")
+        self.assertIsNone(rejected["argv"])
+        self.assertEqual(rejected["rejection_reason"], "Command 'rm' is not allowed")
+
+    def test_drop_policy_counts_overflow(self):
+        from cli_mcp_server.logwriter import BackgroundLogWriter
+
+        writer = BackgroundLogWriter(
+            self.audit_file, flush_interval=60, queue_size=2, batch_size=100, overflow="drop"
+        )
+        results = [asyncio.run(writer.put({"n": n})) for n in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual(writer.dropped, 3)
+        writer.close()
+        self.assertEqual([e["n"] for e in read_entries(self.audit_file)], [0, 1])
+
+    def test_block_policy_waits_for_room(self):
+        from cli_mcp_server.logwriter import BackgroundLogWriter
+
+        writer = BackgroundLogWriter(
+            self.audit_file, flush_interval=0.05, queue_size=2, batch_size=100, overflow="block"
+        )
+
+        async def put_all():
+            return [await writer.put({"n": n}) for n in range(10)]
+
+        self.assertTrue(all(asyncio.run(put_all())))
+        writer.close()
+        self.assertEqual(writer.dropped, 0)
+        self.assertEqual(len(read_entries(self.audit_file)), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
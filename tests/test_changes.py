@@ -0,0 +1,144 @@
+import os
+import asyncio
+import importlib
+import tempfile
+import unittest
+
+from cli_mcp_server.changes import ChangeWaiters, glob_matcher
+from cli_mcp_server.watcher import get_watcher
+
+
+async def _later(delay, action):
+    await asyncio.sleep(delay)
+    await asyncio.to_thread(action)
+
+
+def _write(path, data=b"x"):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+class ChangeWaitersMixin:
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tempdir.name)
+        self.waiters = ChangeWaiters(self.watcher(), poll_interval=0.05)
+
+    def tearDown(self):
+        self.waiters.close()
+        self.tempdir.cleanup()
+
+    def _wait(self, action, delay=0.1, **kwargs):
+        async def run():
+            waiting = asyncio.create_task(self.waiters.wait(**kwargs))
+            await _later(delay, action)
+            return await waiting
+
+        return asyncio.run(run())
+
+    def test_waits_for_a_matching_file(self):
+        result = self._wait(
+            lambda: _write(os.path.join(self.root, "app.whl")),
+            directory=self.root,
+            matches=glob_matcher("*.whl"),
+            events=["created"],
+            timeout=5,
+        )
+        self.assertTrue(result["changed"])
+        self.assertEqual(result["events"][0], {"path": os.path.join(self.root, "app.whl"), "kind": "created"})
+        self.assertEqual(self.waiters.waiting, 0)
+
+    def test_ignores_other_files_and_times_out(self):
+        result = self._wait(
+            lambda: _write(os.path.join(self.root, "notes.txt")),
+            directory=self.root,
+            matches=glob_matcher("*.whl"),
+            timeout=0.5,
+        )
+        self.assertEqual(result, {"changed": False, "timed_out": True, "events": []})
+
+    def test_min_size(self):
+        log = os.path.join(self.root, "build.log")
+        _write(log, b"12345")
+
+        def grow():
+            for _ in range(3):
+                _write(log, b"12345")
+
+        result = self._wait(
+            grow, directory=self.root, matches=lambda path: path == log, target=log, min_size=12, timeout=5
+        )
+        self.assertEqual(result["events"][0]["kind"], "size")
+        self.assertGreaterEqual(result["events"][0]["size"], 12)
+
+    def test_existing_file_returns_at_once(self):
+        _write(os.path.join(self.root, "done.flag"))
+        result = asyncio.run(
+            self.waiters.wait(self.root, glob_matcher("*.flag"), events=["created"], timeout=5)
+        )
+        self.assertEqual(result["events"][0]["kind"], "exists")
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(self.waiters.wait(self.root, glob_matcher("*"), events=["renamed"]))
+        with self.assertRaises(ValueError):
+            asyncio.run(self.waiters.wait(os.path.join(self.root, "missing"), glob_matcher("*")))
+
+
+@unittest.skipIf(get_watcher() is None, "inotify is not available")
+class TestChangeWaitersInotify(ChangeWaitersMixin, unittest.TestCase):
+    def watcher(self):
+        return get_watcher()
+
+
+class TestChangeWaitersPolling(ChangeWaitersMixin, unittest.TestCase):
+    def watcher(self):
+        return None
+
+
+class TestWaitForChangeTool(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["NATIVE_TOOLS"] = "wait_for_change"
+        os.makedirs(os.path.join(self.tempdir.name, "dist"))
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("NATIVE_TOOLS", None)
+        self.tempdir.cleanup()
+
+    def _call(self, arguments):
+        return asyncio.run(self.server.handle_call_tool("wait_for_change", arguments))
+
+    def test_wait_for_glob(self):
+        async def run():
+            waiting = asyncio.create_task(
+                self.server.handle_call_tool("wait_for_change", {"path": "dist/*.whl", "timeout_seconds": 5})
+            )
+            await _later(0.1, lambda: _write(os.path.join(self.tempdir.name, "dist", "pkg.whl")))
+            return await waiting
+
+        content, result = asyncio.run(run())
+        self.assertEqual(result["events"][0]["path"], os.path.join("dist", "pkg.whl"))
+        self.assertTrue(content[0].text.startswith("created: dist/pkg.whl"))
+
+    def test_timeout(self):
+        content, result = self._call({"path": "dist", "timeout_seconds": 0.1})
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(content[0].text, "No change before the timeout")
+
+    def test_rejects_paths_outside_allowed_dir(self):
+        self.assertIn("Security violation", self._call({"path": "/etc/*.conf"})[0].text)
+        self.assertIn("last path component", self._call({"path": "*/x.txt"})[0].text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,260 @@
+import os
+import sys
+import asyncio
+import importlib
+import socket
+import tempfile
+import threading
+import subprocess
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from cli_mcp_server import daemon
+from cli_mcp_server.daemon import DaemonClient, ExecutorDaemon, encode_frame, recv_frame
+from cli_mcp_server.process import Cancellation, OutputFilter
+
+
+class DaemonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tempdir.name, "executor.sock")
+        self.daemon = ExecutorDaemon(
+            self.socket_path,
+            max_concurrent=self.max_concurrent,
+            coalesce=self.coalesce,
+            cache_seconds=self.cache_seconds,
+        )
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.daemon.start(), self.loop).result(5)
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.daemon.close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.tempdir.cleanup()
+
+    cache_seconds = 0.0
+    coalesce = False
+    max_concurrent = 4
+
+
+class TestExecutorDaemon(DaemonTestCase):
+    def _run(self, client, args, stdin=None, **filters):
+        return client.run(
+            args,
+            shell=False,
+            cwd=self.tempdir.name,
+            timeout=10,
+            stdin=stdin,
+            stdout_filter=OutputFilter(**filters),
+            stderr_filter=OutputFilter(),
+        )
+
+    def test_frames(self):
+        left, right = socket.socketpair()
+        with left, right:
+            left.sendall(encode_frame({"type": "status"}) + encode_frame({"a": [1, "é"]}))
+            self.assertEqual(recv_frame(right), {"type": "status"})
+            self.assertEqual(recv_frame(right), {"a": [1, "é"]})
+
+    def test_run_with_filters_and_binary_output(self):
+        client = DaemonClient(self.socket_path)
+        result = self._run(client, ["cat"], stdin=b"a\nb\nc\n", tail_lines=1)
+        self.assertEqual((result.returncode, result.stdout), (0, "c\n"))
+        self.assertFalse(result.coalesced)
+        result = self._run(client, ["cat"], stdin=bytes(range(256)))
+        self.assertEqual(result.stdout, bytes(range(256)))
+
+    def test_identical_concurrent_commands_all_run_by_default(self):
+        client = DaemonClient(self.socket_path)
+        args = [sys.executable, "-c", "import time, uuid; time.sleep(0.2); print(uuid.uuid4())"]
+        with ThreadPoolExecutor(3) as pool:
+            results = list(pool.map(lambda _: self._run(client, args), range(3)))
+        self.assertEqual(len({result.stdout for result in results}), 3)
+        self.assertFalse(any(result.coalesced for result in results))
+
+    def test_cancelling_a_request_kills_the_command(self):
+        client = DaemonClient(self.socket_path)
+        pid_file = os.path.join(self.tempdir.name, "pid")
+        args = [
+            sys.executable, "-c",
+            f"import os, time; open({pid_file!r}, 'w').write(str(os.getpid())); time.sleep(30)",
+        ]
+        cancellation = Cancellation()
+        with ThreadPoolExecutor(1) as pool:
+            future = pool.submit(
+                client.run, args, shell=False, cwd=None, timeout=60, stdin=None,
+                stdout_filter=OutputFilter(), stderr_filter=OutputFilter(), cancellation=cancellation,
+            )
+            deadline = time.monotonic() + 5
+            while not (os.path.exists(pid_file) and os.path.getsize(pid_file)) and time.monotonic() < deadline:
+                time.sleep(0.02)
+            started = time.monotonic()
+            cancellation.cancel()
+            with self.assertRaisesRegex(OSError, "cancelled"):
+                future.result(5)
+        self.assertLess(time.monotonic() - started, 2)
+        with open(pid_file) as f:
+            pid = int(f.read())
+        deadline = time.monotonic() + 5
+        while self.daemon.running and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(self.daemon.running, 0)
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
+        self.assertEqual(client.request({"type": "status"})["cancelled"], 1)
+
+    def test_cancel_frame(self):
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(self.socket_path)
+            request = {"type": "run", "args": ["sleep", "30"], "timeout": 60, "id": 1,
+                       "stdout_filter": {}, "stderr_filter": {}}
+            sock.sendall(encode_frame(request))
+            time.sleep(0.2)
+            sock.sendall(encode_frame({"type": "cancel"}))
+            sock.settimeout(5)
+            response = recv_frame(sock)
+        self.assertEqual(response["id"], 1)
+        self.assertNotEqual(response.get("returncode"), 0)
+
+
+    def test_errors(self):
+        client = DaemonClient(self.socket_path)
+        with self.assertRaises(OSError):
+            self._run(client, ["/nonexistent/command"])
+        response = client.request({"type": "run", "args": ["true"]})
+        self.assertEqual(response["error"], "protocol")
+
+    def test_missing_daemon_returns_none(self):
+        client = DaemonClient(os.path.join(self.tempdir.name, "missing.sock"))
+        self.assertIsNone(self._run(client, ["true"]))
+
+
+class TestDaemonCoalescing(DaemonTestCase):
+    coalesce = True
+
+    def _run(self, client, args):
+        return client.run(
+            args, shell=False, cwd=None, timeout=10, stdin=None,
+            stdout_filter=OutputFilter(), stderr_filter=OutputFilter(),
+        )
+
+    def test_identical_concurrent_commands_are_coalesced(self):
+        client = DaemonClient(self.socket_path)
+        args = [sys.executable, "-c", "import time, uuid; time.sleep(0.5); print(uuid.uuid4())"]
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda _: self._run(client, args), range(4)))
+        self.assertEqual(len({result.stdout for result in results}), 1)
+        self.assertEqual(sum(result.coalesced for result in results), 3)
+        status = client.request({"type": "status"})
+        self.assertEqual((status["requests"], status["coalesced"]), (4, 3))
+
+    def test_command_runs_on_while_another_client_waits_for_it(self):
+        client = DaemonClient(self.socket_path)
+        args = [sys.executable, "-c", "import time; time.sleep(0.5); print('done')"]
+        cancellation = Cancellation()
+        with ThreadPoolExecutor(2) as pool:
+            cancelled = pool.submit(
+                client.run, args, shell=False, cwd=None, timeout=10, stdin=None,
+                stdout_filter=OutputFilter(), stderr_filter=OutputFilter(), cancellation=cancellation,
+            )
+            time.sleep(0.1)
+            waiting = pool.submit(self._run, client, args)
+            time.sleep(0.1)
+            cancellation.cancel()
+            with self.assertRaises(OSError):
+                cancelled.result(5)
+            result = waiting.result(5)
+        self.assertEqual((result.returncode, result.stdout), (0, "done\n"))
+        self.assertTrue(result.coalesced)
+
+
+class TestDaemonTimeouts(DaemonTestCase):
+    max_concurrent = 1
+
+    def _run(self, client, args, timeout):
+        return client.run(
+            args, shell=False, cwd=None, timeout=timeout, stdin=None,
+            stdout_filter=OutputFilter(), stderr_filter=OutputFilter(),
+        )
+
+    def test_timeout_includes_the_wait_for_a_slot(self):
+        client = DaemonClient(self.socket_path)
+        with ThreadPoolExecutor(1) as pool:
+            busy = pool.submit(self._run, client, ["sleep", "1"], 10)
+            time.sleep(0.2)
+            started = time.monotonic()
+            with self.assertRaises(subprocess.TimeoutExpired):
+                self._run(client, ["true"], 0.3)
+            self.assertLess(time.monotonic() - started, 0.9)
+            self.assertEqual(busy.result().returncode, 0)
+        self.assertEqual(client.request({"type": "status"})["start_timeouts"], 1)
+
+    def test_client_stops_waiting_for_an_unresponsive_daemon(self):
+        path = os.path.join(self.tempdir.name, "silent.sock")
+        with socket.socket(socket.AF_UNIX) as listener:
+            listener.bind(path)
+            listener.listen()
+            client = DaemonClient(path)
+            with mock.patch.object(daemon, "_RESPONSE_MARGIN", 0.2):
+                with self.assertRaises(subprocess.TimeoutExpired):
+                    self._run(client, ["true"], 0.1)
+
+
+class TestDaemonCache(DaemonTestCase):
+    cache_seconds = 60.0
+
+    def test_successful_results_are_cached(self):
+        client = DaemonClient(self.socket_path)
+        args = [sys.executable, "-c", "import uuid; print(uuid.uuid4())"]
+        run = lambda: client.run(
+            args, shell=False, cwd=None, timeout=10, stdin=None,
+            stdout_filter=OutputFilter(), stderr_filter=OutputFilter(),
+        )
+        first, second = run(), run()
+        self.assertEqual(first.stdout, second.stdout)
+        self.assertTrue(second.cached)
+
+
+class TestServerWithDaemon(DaemonTestCase):
+    def setUp(self):
+        super().setUp()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ["ALLOWED_COMMANDS"] = "cat,pwd"
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["EXECUTOR_SOCKET"] = self.socket_path
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("EXECUTOR_SOCKET", None)
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        super().tearDown()
+
+    def _call(self, arguments):
+        return asyncio.run(self.server.handle_call_tool("run_command", arguments))
+
+    def test_commands_run_in_the_daemon(self):
+        content, result = self._call({"command": "cat", "stdin": "hello\n", "structured": True})
+        self.assertEqual(result["executor"], "daemon")
+        self.assertEqual(result["stdout"]["text"], "hello\n")
+        self.assertEqual(self.daemon.stats["requests"], 1)
+
+    def test_falls_back_when_the_daemon_is_gone(self):
+        asyncio.run_coroutine_threadsafe(self.daemon.close(), self.loop).result(5)
+        content, result = self._call({"command": "pwd", "structured": True})
+        self.assertEqual(result["executor"], "local")
+        self.assertEqual(result["stdout"]["text"].strip(), os.path.realpath(self.tempdir.name))
+
+
+if __name__ == "__main__":
+    unittest.main()
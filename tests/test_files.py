@@ -0,0 +1,280 @@
+import os
+import base64
+import importlib
+import asyncio
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cli_mcp_server.files import UploadManager, detect_encoding, read_file, read_file_range
+
+
+class TestReadFileRange(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "log.txt")
+        with open(self.path, "w") as f:
+            f.writelines(f"line {n}\n" for n in range(1, 101))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_byte_range(self):
+        file_slice = read_file_range(self.path, offset=5, length=8)
+        self.assertEqual(file_slice.data, b"1\nline 2")
+        self.assertEqual((file_slice.start, file_slice.end), (5, 13))
+
+    def test_line_range(self):
+        file_slice = read_file_range(self.path, start_line=10, end_line=12)
+        self.assertEqual(file_slice.data, b"line 10\nline 11\nline 12\n")
+        self.assertEqual((file_slice.first_line, file_slice.last_line), (10, 12))
+
+        file_slice = read_file_range(self.path, start_line=99, end_line=500)
+        self.assertEqual(file_slice.data, b"line 99\nline 100\n")
+        self.assertIsNone(file_slice.last_line)
+
+    def test_tail_lines(self):
+        self.assertEqual(read_file_range(self.path, tail_lines=2).data, b"line 99\nline 100\n")
+        with open(self.path, "a") as f:
+            f.write("no newline")
+        self.assertEqual(read_file_range(self.path, tail_lines=2).data, b"line 100\nno newline")
+        self.assertEqual(read_file_range(self.path, tail_lines=1000).start, 0)
+
+    def test_truncates_to_max_bytes(self):
+        file_slice = read_file_range(self.path, max_bytes=10)
+        self.assertTrue(file_slice.truncated)
+        self.assertEqual(file_slice.data, b"line 1\nlin")
+
+        # A tail keeps its newest lines
+        file_slice = read_file_range(self.path, tail_lines=3, max_bytes=10)
+        self.assertTrue(file_slice.truncated)
+        self.assertEqual(file_slice.data, b"\nline 100\n")
+        self.assertEqual(file_slice.end, file_slice.size)
+
+    def test_rejects_files_that_are_not_regular(self):
+        fifo = os.path.join(self.tempdir.name, "fifo")
+        os.mkfifo(fifo)
+        with self.assertRaises(ValueError):
+            read_file_range(fifo)
+        with self.assertRaises(ValueError):
+            read_file(fifo)
+        with self.assertRaises(ValueError):
+            read_file(self.tempdir.name)
+
+    def test_empty_file_and_invalid_ranges(self):
+        empty = os.path.join(self.tempdir.name, "empty")
+        open(empty, "w").close()
+        self.assertEqual(read_file_range(empty, tail_lines=5).data, b"")
+        with self.assertRaises(ValueError):
+            read_file_range(self.path, offset=0, tail_lines=3)
+        with self.assertRaises(ValueError):
+            read_file_range(self.path, start_line=5, end_line=2)
+
+    def test_detect_encoding(self):
+        self.assertEqual(detect_encoding("héllo".encode("utf-8")), "utf-8")
+        self.assertEqual(detect_encoding("﻿hi".encode("utf-16-le")), "utf-16-le")
+        self.assertEqual(detect_encoding("caf\xe9".encode("latin-1")), "latin-1")
+        self.assertIsNone(detect_encoding(b"\x7fELF\x02\x01\x00\x00"))
+
+        path = os.path.join(self.tempdir.name, "bom.txt")
+        with open(path, "wb") as f:
+            f.write("﻿hello".encode("utf-8"))
+        self.assertEqual(read_file(path).text(), "hello")
+
+
+class TestReadFileTool(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["NATIVE_TOOLS"] = "read_file"
+        with open(os.path.join(self.tempdir.name, "notes.txt"), "w") as f:
+            f.write("first\nsecond\nthird\n")
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("NATIVE_TOOLS", None)
+        self.tempdir.cleanup()
+
+    def _call(self, arguments):
+        return asyncio.run(self.server.handle_call_tool("read_file", arguments))
+
+    def test_reads_lines(self):
+        result = self._call({"path": "notes.txt", "start_line": 2, "end_line": 2})
+        self.assertEqual(result[0].text, "second\n")
+        self.assertIn("from line 2 to 2 (utf-8)", result[1].text)
+
+    def test_rejects_paths_outside_allowed_dir(self):
+        result = self._call({"path": "../../etc/passwd"})
+        self.assertIn("Security violation", result[0].text)
+
+    def test_binary_file_is_returned_as_blob(self):
+        with open(os.path.join(self.tempdir.name, "data.bin"), "wb") as f:
+            f.write(b"\x00\x01\x02\xff")
+        result = self._call({"path": "data.bin"})
+        self.assertEqual(result[0].type, "resource")
+        self.assertEqual(base64.b64decode(result[0].resource.blob), b"\x00\x01\x02\xff")
+        self.assertIn("(binary)", result[1].text)
+
+    def test_disabled_by_default(self):
+        os.environ.pop("NATIVE_TOOLS", None)
+        import cli_mcp_server.server as server_module
+
+        server = importlib.reload(server_module)
+        tools = asyncio.run(server.handle_list_tools())
+        self.assertNotIn("read_file", [tool.name for tool in tools])
+        result = asyncio.run(server.handle_call_tool("read_file", {"path": "notes.txt"}))
+        self.assertIn("Tool 'read_file' is not enabled", result[0].text)
+
+
+
+class TestUploadManager(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "out.txt")
+        self.uploads = UploadManager()
+
+    def tearDown(self):
+        self.uploads.close()
+        self.tempdir.cleanup()
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_modes(self):
+        self.uploads.write(b"one\n", self.path, mode="create")
+        with self.assertRaises(FileExistsError):
+            self.uploads.write(b"two\n", self.path, mode="create")
+        self.uploads.write(b"two\n", self.path, mode="append")
+        self.assertEqual(self._read(), b"one\ntwo\n")
+        self.uploads.write(b"three\n", self.path, mode="overwrite")
+        self.assertEqual(self._read(), b"three\n")
+        os.chmod(self.path, 0o640)
+        self.uploads.write(b"four\n", self.path, mode="atomic")
+        self.assertEqual(self._read(), b"four\n")
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.tempdir.name), ["out.txt"])
+        with self.assertRaises(ValueError):
+            self.uploads.write(b"", self.path, mode="truncate")
+
+    def test_chunked_atomic_write(self):
+        upload_id, upload = self.uploads.write(b"a" * 10, self.path, mode="atomic", final=False)
+        self.assertIsNotNone(upload_id)
+        self.assertFalse(os.path.exists(self.path))
+        self.uploads.write(b"b" * 10, upload_id=upload_id, final=False, offset=10)
+        done_id, upload = self.uploads.write(b"c", upload_id=upload_id, offset=20)
+        self.assertIsNone(done_id)
+        self.assertEqual(upload.size, 21)
+        self.assertEqual(self._read(), b"a" * 10 + b"b" * 10 + b"c")
+        with self.assertRaises(ValueError):
+            self.uploads.write(b"d", upload_id=upload_id, offset=21)
+
+    def test_chunks_must_arrive_in_order(self):
+        upload_id, _ = self.uploads.write(b"a", self.path, mode="overwrite", final=False)
+        with self.assertRaises(ValueError):
+            self.uploads.write(b"c", upload_id=upload_id, final=False)
+        with self.assertRaises(ValueError):
+            self.uploads.write(b"c", upload_id=upload_id, final=False, offset=2)
+        # A rejected chunk writes nothing, so the right one can still be sent
+        self.uploads.write(b"b", upload_id=upload_id, final=False, offset=1)
+        self.assertFalse(os.path.exists(self.path))
+        self.uploads.write(b"c", upload_id=upload_id, offset=2)
+        self.assertEqual(self._read(), b"abc")
+
+        # Concurrent chunks at the same offset: exactly one is written
+        upload_id, _ = self.uploads.write(b"0", self.path, mode="overwrite", final=False)
+
+        def send(data):
+            try:
+                self.uploads.write(data, upload_id=upload_id, final=False, offset=1)
+                return True
+            except ValueError:
+                return False
+
+        with ThreadPoolExecutor(8) as pool:
+            accepted = list(pool.map(send, [bytes([byte]) for byte in b"12345678"]))
+        self.assertEqual(sum(accepted), 1)
+        self.uploads.write(b"9", upload_id=upload_id, offset=2)
+        self.assertEqual(len(self._read()), 3)
+
+    def test_failed_overwrite_leaves_the_file_unchanged(self):
+        with open(self.path, "wb") as f:
+            f.write(b"original")
+        upload_id, _ = self.uploads.write(b"x" * 8, self.path, mode="overwrite", final=False, max_bytes=10)
+        with self.assertRaises(ValueError):
+            self.uploads.write(b"x" * 8, upload_id=upload_id, offset=8, max_bytes=10)
+        self.assertEqual(self._read(), b"original")
+        upload_id, _ = self.uploads.write(b"more", self.path, mode="append", final=False)
+        self.assertEqual(self._read(), b"original")
+        self.uploads.write(b"!", upload_id=upload_id, offset=4)
+        self.assertEqual(self._read(), b"originalmore!")
+        self.assertEqual(os.listdir(self.tempdir.name), ["out.txt"])
+
+    def test_size_limit_and_expiry_abort_the_upload(self):
+        upload_id, _ = self.uploads.write(b"x" * 8, self.path, mode="create", final=False, max_bytes=10)
+        with self.assertRaises(ValueError):
+            self.uploads.write(b"x" * 8, upload_id=upload_id, offset=8, max_bytes=10)
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+
+        self.uploads.idle_timeout = 0
+        upload_id, _ = self.uploads.write(b"x", self.path, mode="atomic", final=False)
+        with self.assertRaises(ValueError):
+            self.uploads.write(b"x", upload_id=upload_id, offset=1)
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+
+
+class TestWriteFileTool(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["NATIVE_TOOLS"] = "write_file"
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("NATIVE_TOOLS", None)
+        self.server.uploads.close()
+        self.tempdir.cleanup()
+
+    def _call(self, arguments):
+        return asyncio.run(self.server.handle_call_tool("write_file", arguments))
+
+    def test_chunked_base64_write(self):
+        content, structured = self._call(
+            {"path": "data.bin", "content": base64.b64encode(b"\x00\x01").decode(), "encoding": "base64", "final": False}
+        )
+        self.assertFalse(structured["complete"])
+        content, structured = self._call(
+            {
+                "upload_id": structured["upload_id"],
+                "offset": structured["bytes_written"],
+                "content": base64.b64encode(b"\xff").decode(),
+                "encoding": "base64",
+            }
+        )
+        self.assertTrue(structured["complete"])
+        self.assertIn("Wrote 3 bytes", content[0].text)
+        with open(os.path.join(self.tempdir.name, "data.bin"), "rb") as f:
+            self.assertEqual(f.read(), b"\x00\x01\xff")
+
+    def test_rejects_paths_outside_allowed_dir(self):
+        result = self._call({"path": "../escape.txt", "content": "x"})
+        self.assertIn("Security violation", result[0].text)
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.tempdir.name), "escape.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
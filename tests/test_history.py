@@ -0,0 +1,157 @@
+import os
+import importlib
+import asyncio
+import json
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from cli_mcp_server.history import ExecutionHistory
+from cli_mcp_server.recorder import CallRecord
+
+
+class TestExecutionHistory(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ["ALLOWED_COMMANDS"] = "ls,cat,pwd,false"
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["HISTORY_DB"] = os.path.join(self.tempdir.name, "history.db")
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("HISTORY_DB", None)
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("PROFILES_FILE", None)
+        self.tempdir.cleanup()
+
+    def _call(self, name, arguments):
+        return asyncio.run(self.server.handle_call_tool(name, arguments))
+
+    def test_query_history_tool_is_listed(self):
+        tools = asyncio.run(self.server.handle_list_tools())
+        self.assertIn("query_history", [tool.name for tool in tools])
+
+    def test_reports_per_command_statistics(self):
+        for command in ["pwd", "pwd", "false", "ls", "rm x"]:
+            self._call("run_command", {"command": command})
+        self.server.history.close()
+
+        history = self.server.history
+        failures = {row["command"]: row for row in history.query("failures")}
+        self.assertEqual(failures["false"]["failure_rate"], 1.0)
+        self.assertEqual(failures["pwd"]["failures"], 0)
+        self.assertEqual(failures["rm"]["failures"], 1)
+
+        runtime = {row["command"]: row for row in history.query("runtime", command="pwd")}
+        self.assertEqual(list(runtime), ["pwd"])
+        self.assertEqual(runtime["pwd"]["runs"], 2)
+        self.assertGreaterEqual(runtime["pwd"]["max_ms"], runtime["pwd"]["p95_ms"])
+
+        output = {row["command"]: row for row in history.query("output")}
+        self.assertEqual(output["pwd"]["total_bytes"], 2 * (len(self.tempdir.name) + 1))
+
+        slowest = history.query("slowest", limit=2)
+        self.assertEqual(len(slowest), 2)
+        self.assertGreaterEqual(slowest[0]["duration_ms"], slowest[1]["duration_ms"])
+
+    def test_query_history_formats_table(self):
+        self._call("run_command", {"command": "pwd"})
+        self.server.history.close()
+        result = self._call("query_history", {"report": "runtime"})
+        text = result[0].text
+        self.assertTrue(text.startswith("command | runs"), text)
+        self.assertIn("pwd", text)
+
+        result = self._call("query_history", {"report": "bogus"})
+        self.assertIn("Unknown report", result[0].text)
+
+    def test_runtime_p95(self):
+        history = ExecutionHistory(os.path.join(self.tempdir.name, "p95.db"))
+        for duration in range(100, 0, -1):
+            call = CallRecord(tool="run_command", arguments={"command": "ls"}, started_at=0.0)
+            call.duration_ms = float(duration)
+            history.record(call)
+        call = CallRecord(tool="run_command", arguments={"command": "pwd"}, started_at=0.0)
+        history.record(call)
+        history.close()
+
+        runtime = {row["command"]: row for row in history.query("runtime")}
+        self.assertEqual(runtime["ls"]["runs"], 100)
+        self.assertEqual(runtime["ls"]["p95_ms"], 95.0)
+        self.assertEqual(runtime["ls"]["max_ms"], 100.0)
+        self.assertEqual(runtime["ls"]["avg_ms"], 50.5)
+        self.assertEqual(runtime["pwd"]["p95_ms"], 0.0)
+        self.assertEqual(list(runtime), ["ls", "pwd"])
+
+    def test_adds_profile_column_to_existing_database(self):
+        path = os.path.join(self.tempdir.name, "old.db")
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE executions (id INTEGER PRIMARY KEY, ts REAL NOT NULL, command TEXT NOT NULL,"
+            " command_line TEXT NOT NULL, outcome TEXT NOT NULL, exit_code INTEGER,"
+            " duration_ms REAL NOT NULL, stdout_bytes INTEGER NOT NULL, stderr_bytes INTEGER NOT NULL)"
+        )
+        connection.execute(
+            "INSERT INTO executions (ts, command, command_line, outcome, exit_code, duration_ms,"
+            " stdout_bytes, stderr_bytes) VALUES (0, 'pwd', 'pwd', 'ok', 0, 1.0, 0, 0)"
+        )
+        connection.commit()
+        connection.close()
+
+        history = ExecutionHistory(path)
+        history.record(
+            CallRecord(tool="run_command", arguments={"command": "ls"}, started_at=0.0),
+            profile="web",
+        )
+        history.close()
+        self.assertEqual([row["command_line"] for row in history.query("slowest", profile="web")], ["ls"])
+        rows = history.query("slowest", profile="web", include_unprofiled=True)
+        self.assertEqual(sorted(row["command_line"] for row in rows), ["ls", "pwd"])
+
+    def test_unusable_database_drops_records_without_stopping_the_writer(self):
+        # A directory cannot be opened as a database
+        history = ExecutionHistory(self.tempdir.name, flush_interval=0.01)
+        history.record(CallRecord(tool="run_command", arguments={"command": "ls"}, started_at=0.0))
+        deadline = time.monotonic() + 5
+        while history.writer.dropped < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        history.record(CallRecord(tool="run_command", arguments={"command": "ls"}, started_at=0.0))
+        history.close()
+        self.assertEqual(history.writer.dropped, 2)
+        self.assertEqual(history.writer.written, 0)
+
+    def test_failed_query_is_recorded_as_an_error(self):
+        self._call("query_history", {"report": "bogus"})
+        _, snapshot = self._call("show_metrics", {})
+        self.assertEqual(snapshot["counters"]['tool_calls_total{outcome="error",tool="query_history"}'], 1)
+
+    def test_query_history_only_reports_the_callers_profile(self):
+        web_dir = os.path.join(self.tempdir.name, "web")
+        os.makedirs(web_dir)
+        profiles_file = os.path.join(self.tempdir.name, "profiles.json")
+        with open(profiles_file, "w") as f:
+            json.dump({"web": {"ALLOWED_DIR": web_dir, "ALLOWED_COMMANDS": "ls"}}, f)
+        os.environ["PROFILES_FILE"] = profiles_file
+        self.server = importlib.reload(self.server)
+
+        self._call("run_command", {"command": "pwd"})
+        self._call("run_command", {"command": "ls", "profile": "web"})
+        self.server.history.close()
+
+        text = self._call("query_history", {"report": "slowest"})[0].text
+        self.assertIn("pwd", text)
+        self.assertNotIn("ls", text)
+        text = self._call("query_history", {"report": "slowest", "profile": "web"})[0].text
+        self.assertIn("ls", text)
+        self.assertNotIn("pwd", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
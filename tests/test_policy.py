@@ -0,0 +1,88 @@
+import os
+import importlib
+import asyncio
+import json
+import tempfile
+import unittest
+
+
+class FakeSession:
+    def __init__(self):
+        self.tool_list_changed = 0
+
+    async def send_tool_list_changed(self):
+        self.tool_list_changed += 1
+
+
+class TestPolicyReload(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.policy_file = os.path.join(self.tempdir.name, "policy.env")
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        with open(self.policy_file, "w") as f:
+            f.write("# initial policy\nALLOWED_COMMANDS=ls,pwd\nCOMMAND_TIMEOUT='12'\n")
+        os.environ["POLICY_FILE"] = self.policy_file
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("POLICY_FILE", None)
+        self.tempdir.cleanup()
+
+    def test_read_policy_file_formats(self):
+        from cli_mcp_server.policy import read_policy_file
+
+        env_file = os.path.join(self.tempdir.name, "other.env")
+        with open(env_file, "w") as f:
+            f.write('export SHELL_EXEC_ARGS="-Eeuo pipefail -c"\nALLOWED_FLAGS=-l # comment\n')
+        self.assertEqual(
+            read_policy_file(env_file),
+            {"SHELL_EXEC_ARGS": "-Eeuo pipefail -c", "ALLOWED_FLAGS": "-l"},
+        )
+
+        json_file = os.path.join(self.tempdir.name, "policy.json")
+        with open(json_file, "w") as f:
+            json.dump({"ALLOWED_COMMANDS": ["ls", "cat"], "ALLOW_SHELL_OPERATORS": True}, f)
+        self.assertEqual(
+            read_policy_file(json_file),
+            {"ALLOWED_COMMANDS": "ls,cat", "ALLOW_SHELL_OPERATORS": "true"},
+        )
+
+    def test_policy_file_applies_at_startup(self):
+        config = self.server.executor.security_config
+        self.assertEqual(config.allowed_commands, {"ls", "pwd"})
+        self.assertEqual(config.command_timeout, 12)
+
+    def test_reload_swaps_policy_and_notifies_sessions(self):
+        session = FakeSession()
+        self.server.sessions.add(session)
+        old_executor = self.server.executor
+        with open(self.policy_file, "w") as f:
+            f.write("ALLOWED_COMMANDS=cat\n")
+
+        self.assertTrue(asyncio.run(self.server.reload_policy()))
+        self.assertIsNot(self.server.executor, old_executor)
+        self.assertEqual(self.server.executor.security_config.allowed_commands, {"cat"})
+        self.assertEqual(old_executor.security_config.allowed_commands, {"ls", "pwd"})
+        self.assertEqual(session.tool_list_changed, 1)
+
+        result = asyncio.run(self.server.handle_call_tool("run_command", {"command": "pwd"}))
+        self.assertIn("Command 'pwd' is not allowed", result[0].text)
+
+    def test_invalid_policy_keeps_current(self):
+        old_executor = self.server.executor
+        with open(self.policy_file, "w") as f:
+            f.write("COMMAND_TIMEOUT=soon\n")
+        with self.assertLogs("cli_mcp_server.server", level="ERROR"):
+            self.assertFalse(asyncio.run(self.server.reload_policy()))
+        self.assertIs(self.server.executor, old_executor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+import os
+import json
+import sys
+import base64
+import asyncio
+import importlib
+import subprocess
+import tempfile
+import unittest
+
+from cli_mcp_server.process import OutputFilter, run_process
+
+
+class TestRunProcess(unittest.TestCase):
+    def _run(self, args, stdin=None, timeout=10):
+        stdout, stderr = bytearray(), bytearray()
+        returncode = run_process(
+            args, timeout=timeout, stdin=stdin, on_stdout=stdout.extend, on_stderr=stderr.extend
+        )
+        return returncode, bytes(stdout), bytes(stderr)
+
+    def test_large_stdin_and_output_do_not_deadlock(self):
+        # The child echoes its input before reading all of it, so both pipes fill up
+        payload = os.urandom(4 * 1024 * 1024)
+        script = (
+            "import sys\n"
+            "while True:\n"
+            "    chunk = sys.stdin.buffer.read(65536)\n"
+            "    if not chunk: break\n"
+            "    sys.stdout.buffer.write(chunk)\n"
+            "    sys.stderr.buffer.write(b'.')\n"
+        )
+        returncode, stdout, stderr = self._run([sys.executable, "-c", script], stdin=payload)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stdout, payload)
+        self.assertTrue(stderr)
+
+    def test_child_that_ignores_stdin(self):
+        returncode, stdout, _ = self._run(["true"], stdin=b"x" * (1024 * 1024))
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stdout, b"")
+
+    def test_stdin_is_devnull_by_default(self):
+        self.assertEqual(self._run(["cat"])[1], b"")
+
+    def test_timeout_kills_the_process(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self._run(["sleep", "5"], timeout=0.2)
+
+
+class TestOutputFilter(unittest.TestCase):
+    LINES = b"".join(b"line %d\n" % n for n in range(1, 101))
+
+    def _filter(self, chunk_size=7, **kwargs):
+        output_filter = OutputFilter(**kwargs)
+        for start in range(0, len(self.LINES), chunk_size):
+            output_filter.feed(self.LINES[start : start + chunk_size])
+        return output_filter, output_filter.finish()
+
+    def test_head_and_tail(self):
+        output_filter, kept = self._filter(head_lines=2)
+        self.assertEqual(kept, "line 1\nline 2\n")
+        self.assertEqual((output_filter.kept_lines, output_filter.total_lines), (2, 100))
+        _, kept = self._filter(tail_lines=2)
+        self.assertEqual(kept, "line 99\nline 100\n")
+
+    def test_grep(self):
+        _, kept = self._filter(grep=r"^line 9\d$", tail_lines=2)
+        self.assertEqual(kept, "line 98\nline 99\n")
+        output_filter, kept = self._filter(grep="line 5")
+        self.assertEqual(kept, "line 5\nline 50\nline 51\nline 52\nline 53\nline 54\nline 55\nline 56\nline 57\nline 58\nline 59\n")
+        self.assertIn("kept 11 of 100 lines", output_filter.summary())
+
+    def test_grep_matches_decoded_text(self):
+        data = "Größe: 5\nSIZE: 6\nÉTAT ok\nnaïve\n".encode("utf-8")
+        output_filter = OutputFilter(grep=r"(?i)^(größe|état)\b", encoding="utf-8")
+        output_filter.feed(data)
+        self.assertEqual(output_filter.finish(), "Größe: 5\nÉTAT ok\n")
+
+        output_filter = OutputFilter(grep=r"^\w+$", encoding="utf-8")
+        output_filter.feed(data)
+        self.assertEqual(output_filter.finish(), "naïve\n")
+        self.assertEqual(OutputFilter(grep="é").options()["grep"], "é")
+
+    def test_max_bytes(self):
+        output_filter, kept = self._filter(max_bytes=10)
+        self.assertEqual(kept, "line 1\nlin")
+        self.assertTrue(output_filter.truncated)
+        self.assertEqual(output_filter.total_bytes, len(self.LINES))
+        _, kept = self._filter(tail_lines=3, max_bytes=10)
+        self.assertEqual(kept, "\nline 100\n")
+        self.assertFalse(self._filter()[0].active)
+
+    def test_truncated_lines_are_not_counted_as_kept(self):
+        output_filter, kept = self._filter(grep="line", max_bytes=10)
+        self.assertEqual(kept, "line 1\nlin")
+        self.assertEqual((output_filter.kept_lines, output_filter.total_lines), (2, 100))
+        self.assertIn("kept 2 of 100 lines, kept 10 of", output_filter.summary())
+        output_filter, _ = self._filter(head_lines=5, max_bytes=7)
+        self.assertEqual(output_filter.kept_lines, 1)
+        output_filter, _ = self._filter(tail_lines=3, max_bytes=10)
+        self.assertEqual(output_filter.kept_lines, 2)
+        output_filter, _ = self._filter(tail_lines=3, max_bytes=0)
+        self.assertEqual(output_filter.kept_lines, 0)
+
+    def test_incremental_decoding(self):
+        data = "héllo wörld\n".encode("utf-8") * 2000
+        output_filter = OutputFilter(encoding="utf-8")
+        # Chunks of 3 bytes split most multi-byte characters
+        for start in range(0, len(data), 3):
+            output_filter.feed(data[start : start + 3])
+        self.assertEqual(output_filter.finish(), "héllo wörld\n" * 2000)
+        self.assertFalse(output_filter.binary)
+
+        output_filter = OutputFilter(encoding="utf-8")
+        output_filter.feed(b"ok \xff\xfe done\n")
+        self.assertEqual(output_filter.finish(), "ok \ufffd\ufffd done\n")
+
+    def test_binary_output(self):
+        data = bytes(range(256)) * 100
+        output_filter = OutputFilter()
+        for start in range(0, len(data), 1000):
+            output_filter.feed(data[start : start + 1000])
+        self.assertEqual(output_filter.finish(), data)
+        self.assertTrue(output_filter.binary)
+
+    def test_binary_output_starting_like_a_byte_order_mark(self):
+        for data in (b"\xff\xfe" + bytes(range(256)) * 20, b"\xfe\xff" + bytes(range(255, -1, -1)) * 20):
+            output_filter = OutputFilter()
+            output_filter.feed(data)
+            self.assertEqual(output_filter.finish(), data)
+            self.assertTrue(output_filter.binary)
+
+        output_filter = OutputFilter()
+        output_filter.feed("héllo\n".encode("utf-16"))
+        self.assertEqual(output_filter.finish(), "héllo\n")
+        self.assertFalse(output_filter.binary)
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            OutputFilter(head_lines=1, tail_lines=1)
+        with self.assertRaises(ValueError):
+            OutputFilter(grep="(")
+        with self.assertRaises(ValueError):
+            OutputFilter(encoding="no-such-encoding")
+
+
+class TestRunCommandStdin(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ["ALLOWED_COMMANDS"] = "cat,wc"
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["STDIN_MAX_BYTES"] = "1000"
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("STDIN_MAX_BYTES", None)
+        self.tempdir.cleanup()
+
+    def _call(self, arguments):
+        return asyncio.run(self.server.handle_call_tool("run_command", arguments))
+
+    def test_stdin_is_passed_without_a_shell(self):
+        result = self._call({"command": "cat", "stdin": "hello\nworld\n"})
+        self.assertEqual(result[0].text, "hello\nworld\n")
+
+    def test_stdin_has_its_own_limit(self):
+        result = self._call({"command": "cat", "stdin": "x" * 900})
+        self.assertEqual(len(result[0].text), 900)
+        result = self._call({"command": "cat", "stdin": "x" * 1001})
+        self.assertIn("stdin exceeds maximum size of 1000 bytes", result[0].text)
+
+    def test_binary_output_is_returned_as_resource(self):
+        with open(os.path.join(self.tempdir.name, "data.bin"), "wb") as f:
+            f.write(b"\x00\x01\x02\xff" * 10)
+        result = self._call({"command": "cat data.bin"})
+        self.assertEqual(result[0].type, "resource")
+        self.assertEqual(base64.b64decode(result[0].resource.blob), b"\x00\x01\x02\xff" * 10)
+        self.assertIn("return code: 0", result[-1].text)
+
+    def test_output_filters(self):
+        lines = "".join(f"row {n}\n" for n in range(1000))
+        result = self._call({"command": "cat", "stdin": lines[:900], "tail_lines": 1})
+        self.assertEqual(result[0].text, lines[:900].splitlines(keepends=True)[-1])
+        self.assertTrue(result[1].text.startswith("Output filtered: kept 1 of"))
+        result = self._call({"command": "cat", "stdin": "abc", "head_lines": 1, "tail_lines": 1})
+        self.assertIn("cannot be combined", result[0].text)
+
+    def test_structured_result(self):
+        content, result = self._call(
+            {"command": "cat", "stdin": "a\nb\nc\n", "tail_lines": 1, "structured": True}
+        )
+        self.assertEqual(json.loads(content[0].text), result)
+        self.assertIsNone(result["error"])
+        self.assertFalse(result["timed_out"])
+        self.assertEqual(result["exit_code"], 0)
+        self.assertIsNone(result["signal"])
+        self.assertEqual(result["stdout"]["text"], "c\n")
+        self.assertEqual((result["stdout"]["total_bytes"], result["stdout"]["kept_bytes"]), (6, 2))
+        self.assertTrue(result["stdout"]["filtered"])
+        self.assertFalse(result["stdout"]["truncated"])
+        self.assertGreaterEqual(result["duration_ms"], 0)
+
+        content, result = self._call({"command": "wc missing.txt", "structured": True})
+        self.assertNotEqual(result["exit_code"], 0)
+        self.assertIn("missing.txt", result["stderr"]["text"])
+
+    def test_structured_errors(self):
+        content, result = self._call({"command": "rm -rf x", "structured": True})
+        self.assertEqual(result["error"]["type"], "rejected")
+        self.assertIsNone(result["exit_code"])
+        self.assertFalse(result["success"])
+        self.assertEqual(json.loads(content[0].text), result)
+
+        content, result = self._call({"command": "cat", "head_lines": -1, "structured": True})
+        self.assertEqual(result["error"]["type"], "invalid")
+        self.assertEqual(result["stdout"]["text"], "")
+
+    def test_structured_timeout_keeps_partial_output(self):
+        os.environ["ALLOWED_COMMANDS"] = "all"
+        os.environ["ALLOWED_FLAGS"] = "all"
+        os.environ["COMMAND_TIMEOUT"] = "1"
+        try:
+            server = importlib.reload(self.server)
+            content, result = asyncio.run(
+                server.handle_call_tool(
+                    "run_command",
+                    {
+                        "command": "python3 -c \"print('partial', flush=True), __import__('time').sleep(10)\"",
+                        "structured": True,
+                    },
+                )
+            )
+        finally:
+            os.environ.pop("ALLOWED_FLAGS", None)
+            os.environ.pop("COMMAND_TIMEOUT", None)
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(result["error"]["type"], "timeout")
+        self.assertIsNone(result["exit_code"])
+        self.assertEqual(result["stdout"]["text"], "partial\n")
+        self.assertGreaterEqual(result["duration_ms"], 900)
+
+
+if __name__ == "__main__":
+    unittest.main()
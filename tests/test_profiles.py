@@ -0,0 +1,86 @@
+import os
+import importlib
+import asyncio
+import json
+import tempfile
+import unittest
+
+
+class TestWorkspaceProfiles(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.web_dir = os.path.join(self.tempdir.name, "web")
+        self.api_dir = os.path.join(self.tempdir.name, "api")
+        os.makedirs(self.web_dir)
+        os.makedirs(self.api_dir)
+        self.profiles_file = os.path.join(self.tempdir.name, "profiles.json")
+        with open(self.profiles_file, "w") as f:
+            json.dump(
+                {
+                    "web": {"ALLOWED_DIR": self.web_dir, "ALLOWED_COMMANDS": ["pwd"]},
+                    "api": {"ALLOWED_DIR": self.api_dir, "ALLOWED_COMMANDS": "pwd,ls"},
+                },
+                f,
+            )
+        os.environ.pop("ALLOWED_DIR", None)
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["PROFILES_FILE"] = self.profiles_file
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("PROFILES_FILE", None)
+        self.tempdir.cleanup()
+
+    def _call(self, name, arguments):
+        return asyncio.run(self.server.handle_call_tool(name, arguments))
+
+    def test_runs_commands_in_each_profile(self):
+        result = self._call("run_command", {"command": "pwd", "profile": "api"})
+        self.assertEqual(result[0].text.strip(), os.path.realpath(self.api_dir))
+
+        result = self._call("run_command", {"command": "pwd", "profile": "web"})
+        self.assertEqual(result[0].text.strip(), os.path.realpath(self.web_dir))
+
+        result = self._call("run_command", {"command": "ls", "profile": "web"})
+        self.assertIn("Command 'ls' is not allowed", result[0].text)
+
+    def test_without_profile_uses_first_profile(self):
+        self.assertNotIn(self.server.DEFAULT_PROFILE, self.server.executors)
+        result = self._call("run_command", {"command": "pwd"})
+        self.assertEqual(result[0].text.strip(), os.path.realpath(self.web_dir))
+
+    def test_default_profile_from_environment(self):
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        try:
+            import cli_mcp_server.server as server_module
+
+            server = importlib.reload(server_module)
+            self.assertEqual(list(server.executors), ["default", "web", "api"])
+        finally:
+            os.environ.pop("ALLOWED_DIR", None)
+        result = asyncio.run(server.handle_call_tool("run_command", {"command": "pwd"}))
+        self.assertEqual(result[0].text.strip(), os.path.realpath(self.tempdir.name))
+
+    def test_unknown_profile(self):
+        result = self._call("run_command", {"command": "pwd", "profile": "nope"})
+        self.assertIn("Unknown profile 'nope'", result[0].text)
+
+    def test_tools_take_profile_argument(self):
+        tools = {tool.name: tool for tool in asyncio.run(self.server.handle_list_tools())}
+        for name in ("run_command", "show_security_rules"):
+            self.assertEqual(tools[name].inputSchema["properties"]["profile"]["enum"], ["web", "api"])
+        self.assertIn(f"- api: {os.path.realpath(self.api_dir)}", tools["run_command"].description)
+
+        result = self._call("show_security_rules", {"profile": "api"})
+        self.assertIn("Profile: api", result[0].text)
+        self.assertIn("ls, pwd", result[0].text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import asyncio
+import importlib
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+
+from cli_mcp_server.profiling import Profiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.profiler = Profiler(os.path.join(self.tempdir.name, "profiles"), max_seconds=5)
+
+    def tearDown(self):
+        self.profiler.memory_stop()
+        self.tempdir.cleanup()
+
+    def test_cpu_profile_writes_collapsed_stacks(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+        thread.start()
+        try:
+            result = self.profiler.cpu(0.3, interval=0.01)
+        finally:
+            stop.set()
+            thread.join()
+        with open(result["path"]) as f:
+            lines = f.read().splitlines()
+        busy = [line for line in lines if line.startswith("busy;")]
+        self.assertTrue(busy)
+        stack, count = busy[0].rsplit(" ", 1)
+        self.assertIn("busy_loop (test_profiling.py:", stack)
+        self.assertGreater(int(count), 0)
+        with self.assertRaises(ValueError):
+            self.profiler.cpu(10)
+
+    def test_memory_snapshots_are_compared(self):
+        first = self.profiler.memory_snapshot()
+        self.assertNotIn("diff_path", first)
+        retained = [bytearray(1000) for _ in range(1000)]
+        second = self.profiler.memory_snapshot(limit=5)
+        self.assertTrue(os.path.exists(second["path"]))
+        self.assertTrue(os.path.exists(second["diff_path"]))
+        self.assertIn("test_profiling.py", second["top"][0]["site"])
+        self.assertGreaterEqual(second["top"][0]["size_diff"], 1000 * 1000)
+        del retained
+
+
+class TestProfileTool(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["PROFILE_DIR"] = os.path.join(self.tempdir.name, "profiles")
+        os.environ["NATIVE_TOOLS"] = "profile_server"
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("PROFILE_DIR", None)
+        os.environ.pop("NATIVE_TOOLS", None)
+        self.server.profiler.memory_stop()
+        self.tempdir.cleanup()
+
+    def test_tool_is_listed_only_with_profile_dir(self):
+        tools = asyncio.run(self.server.handle_list_tools())
+        self.assertIn("profile_server", [tool.name for tool in tools])
+
+    def test_tool_must_be_enabled_by_name(self):
+        for native_tools in ("", "all"):
+            os.environ["NATIVE_TOOLS"] = native_tools
+            server = importlib.reload(self.server)
+            tools = asyncio.run(server.handle_list_tools())
+            self.assertNotIn("profile_server", [tool.name for tool in tools])
+            result = asyncio.run(server.handle_call_tool("profile_server", {"action": "memory_start"}))
+            self.assertIn("Tool 'profile_server' is not enabled", result[0].text)
+            self.assertFalse(tracemalloc.is_tracing())
+        self.server = server
+
+    def test_cpu_profile_includes_the_event_loop(self):
+        async def run():
+            profiling = asyncio.create_task(
+                self.server.handle_call_tool("profile_server", {"action": "cpu", "seconds": 0.3})
+            )
+            deadline = time.monotonic() + 0.3
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.001)
+            return await profiling
+
+        content, result = asyncio.run(run())
+        self.assertTrue(content[0].text.startswith("Wrote "))
+        with open(result["path"]) as f:
+            self.assertIn("MainThread;", f.read())
+
+    def test_invalid_action(self):
+        result = asyncio.run(self.server.handle_call_tool("profile_server", {"action": "heap"}))
+        self.assertIn("Invalid action", result[0].text)
+
+
+if __name__ == "__main__":
+    unittest.main()
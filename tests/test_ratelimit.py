@@ -0,0 +1,157 @@
+import os
+import asyncio
+import importlib
+import subprocess
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from cli_mcp_server.metrics import MetricsRegistry, percentile
+from cli_mcp_server.ratelimit import AdmissionController, RateLimitExceeded
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_token_bucket(self):
+        controller = AdmissionController()
+        with mock.patch("cli_mcp_server.ratelimit.time.monotonic", return_value=100.0) as clock:
+            for _ in range(3):
+                controller.admit("a", rate=2, burst=3)
+            with self.assertRaises(RateLimitExceeded) as raised:
+                controller.admit("a", rate=2, burst=3)
+            self.assertEqual(raised.exception.reason, "rate")
+            self.assertAlmostEqual(raised.exception.retry_after, 0.5)
+            # Other clients have their own bucket
+            controller.admit("b", rate=2, burst=3)
+            clock.return_value = 100.5
+            controller.admit("a", rate=2, burst=3)
+
+    def test_concurrency_quota(self):
+        controller = AdmissionController()
+        controller.admit("a", rate=0, burst=1, max_concurrent=2)
+        controller.admit("a", rate=0, burst=1, max_concurrent=2)
+        with self.assertRaises(RateLimitExceeded) as raised:
+            controller.admit("a", rate=0, burst=1, max_concurrent=2)
+        self.assertEqual(raised.exception.reason, "concurrency")
+        # Calls that are not commands are not counted against the quota
+        controller.admit("a", rate=0, burst=1)
+        controller.release("a")
+        controller.admit("a", rate=0, burst=1, max_concurrent=2)
+        self.assertEqual(controller.gauges()["admission_active_commands"], 2)
+
+    def test_rejection_takes_no_token(self):
+        controller = AdmissionController()
+        with mock.patch("cli_mcp_server.ratelimit.time.monotonic", return_value=100.0):
+            controller.admit("a", rate=1, burst=2, max_concurrent=1)
+            with self.assertRaises(RateLimitExceeded):
+                controller.admit("a", rate=1, burst=2, max_concurrent=1)
+            controller.release("a")
+            controller.admit("a", rate=1, burst=2, max_concurrent=1)
+
+    def test_invalid_key(self):
+        with self.assertRaises(ValueError):
+            AdmissionController(key="ip")
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_snapshot(self):
+        registry = MetricsRegistry()
+        registry.inc("calls_total", tool="ls")
+        registry.inc("calls_total", tool="ls")
+        registry.register(lambda: {"queued": 3})
+        for value in range(1, 101):
+            registry.observe("duration_ms", value)
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["counters"], {'calls_total{tool="ls"}': 2})
+        self.assertEqual(snapshot["gauges"], {"queued": 3})
+        self.assertEqual(snapshot["histograms"]["duration_ms"]["p90"], 90)
+        self.assertIn("duration_ms:p99 99", registry.format())
+
+    def test_percentile(self):
+        self.assertEqual(percentile([5], 99), 5)
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2)
+
+
+class TestRateLimitedServer(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["RATE_LIMIT_PER_SECOND"] = "0.001"
+        os.environ["RATE_LIMIT_BURST"] = "2"
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("RATE_LIMIT_PER_SECOND", None)
+        os.environ.pop("RATE_LIMIT_BURST", None)
+        os.environ.pop("MAX_CONCURRENT_PER_CLIENT", None)
+        self.tempdir.cleanup()
+
+    def _call(self, name, arguments):
+        return asyncio.run(self.server.handle_call_tool(name, arguments))
+
+    def test_calls_over_the_limit_are_rejected_before_validation(self):
+        self._call("run_command", {"command": "pwd"})
+        self._call("run_command", {"command": "pwd"})
+        with mock.patch.object(self.server.CommandExecutor, "validate_command") as validate:
+            result = self._call("run_command", {"command": "pwd"})
+        validate.assert_not_called()
+        self.assertTrue(result[0].text.startswith("Rate limited: more than 0.001 calls per second"))
+        self.assertIn("Retry after", result[0].text)
+
+        content, snapshot = self._call("show_metrics", {})
+        self.assertEqual(snapshot["counters"]['rate_limited_total{reason="rate"}'], 1)
+        self.assertEqual(snapshot["counters"]['tool_calls_total{outcome="ok",tool="run_command"}'], 2)
+        self.assertIn('tool_calls_total{outcome="rejected",tool="run_command"} 1', content[0].text)
+
+    def test_unknown_tool_names_share_one_label(self):
+        os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+        server = importlib.reload(self.server)
+        for name in ["bogus-1", "bogus-2", "bogus-3"]:
+            with self.assertRaises(ValueError):
+                asyncio.run(server.handle_call_tool(name, {}))
+
+        _, snapshot = asyncio.run(server.handle_call_tool("show_metrics", {}))
+        self.assertEqual(snapshot["counters"]['tool_calls_total{outcome="error",tool="unknown"}'], 3)
+        self.assertFalse([key for key in snapshot["counters"] if "bogus" in key])
+        self.assertFalse([key for key in snapshot["histograms"] if "bogus" in key])
+
+    def test_cancelled_command_holds_its_quota_until_it_finishes(self):
+        os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+        os.environ["MAX_CONCURRENT_PER_CLIENT"] = "1"
+        server = importlib.reload(self.server)
+        release = threading.Event()
+
+        def execute(executor, command_string, **kwargs):
+            # A worker that does not stop when its call is cancelled
+            release.wait(5)
+            return subprocess.CompletedProcess([command_string], 0, "", "")
+
+        async def main():
+            with mock.patch.object(server.CommandExecutor, "execute", execute):
+                first = asyncio.create_task(server.handle_call_tool("run_command", {"command": "pwd"}))
+                await asyncio.sleep(0.1)
+                first.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await first
+                result = await server.handle_call_tool("run_command", {"command": "pwd"})
+                self.assertTrue(result[0].text.startswith("Rate limited: 1 commands already running"), result[0].text)
+                release.set()
+                while server.scheduler.running:
+                    await asyncio.sleep(0.01)
+                result = await server.handle_call_tool("run_command", {"command": "pwd"})
+                self.assertIn("return code: 0", result[-1].text)
+
+        asyncio.run(main())
+        _, snapshot = asyncio.run(server.handle_call_tool("show_metrics", {}))
+        self.assertEqual(snapshot["counters"]['tool_calls_total{outcome="cancelled",tool="run_command"}'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import json
+import importlib
+import asyncio
+import tempfile
+import unittest
+
+from cli_mcp_server.logwriter import BackgroundLogWriter
+
+
+def read_records(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class TestBackgroundLogWriter(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "calls.jsonl")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_writes_compact_json_lines(self):
+        writer = BackgroundLogWriter(self.path)
+        writer.write({"tool": "run_command", "n": 1})
+        writer.write({"tool": "run_command", "n": 2})
+        writer.close()
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], '{"tool":"run_command","n":1}')
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(writer.written, 2)
+
+    def test_rotates_by_size(self):
+        writer = BackgroundLogWriter(self.path, max_bytes=100, backup_count=2)
+        for n in range(20):
+            writer.write({"payload": "x" * 30, "n": n})
+        writer.close()
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertTrue(os.path.exists(self.path + ".2"))
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        self.assertLessEqual(os.path.getsize(self.path), 100)
+        self.assertEqual(read_records(self.path)[-1]["n"], 19)
+
+
+class TestCallRecording(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.record_file = os.path.join(self.tempdir.name, "log", "calls.jsonl")
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["RECORD_FILE"] = self.record_file
+        os.environ.pop("RECORD_REDACT", None)
+
+    def tearDown(self):
+        os.environ.pop("RECORD_FILE", None)
+        os.environ.pop("RECORD_REDACT", None)
+        os.environ.pop("RECORD_PAYLOADS", None)
+        os.environ.pop("RECORD_MAX_ARGUMENT_LENGTH", None)
+        self.tempdir.cleanup()
+
+    def _reload_server(self):
+        import cli_mcp_server.server as server_module
+
+        return importlib.reload(server_module)
+
+    def test_records_outcome_and_sizes(self):
+        server = self._reload_server()
+        asyncio.run(server.handle_call_tool("run_command", {"command": "pwd"}))
+        asyncio.run(server.handle_call_tool("run_command", {"command": "rm -rf x"}))
+        server.recorder.close()
+
+        records = read_records(self.record_file)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["arguments"], {"command": "pwd"})
+        self.assertEqual(records[0]["outcome"], "ok")
+        self.assertEqual(records[0]["returncode"], 0)
+        self.assertEqual(records[0]["stdout_bytes"], len(self.tempdir.name) + 1)
+        self.assertGreaterEqual(records[0]["duration_ms"], 0)
+        self.assertEqual(records[1]["outcome"], "rejected")
+        self.assertIn("not allowed", records[1]["error"])
+
+    def test_redacts_payloads(self):
+        os.environ["RECORD_REDACT"] = "true"
+        server = self._reload_server()
+        asyncio.run(server.handle_call_tool("run_command", {"command": "pwd"}))
+        server.recorder.close()
+
+        command = read_records(self.record_file)[0]["arguments"]["command"]
+        self.assertTrue(command["redacted"])
+        self.assertEqual(command["length"], 3)
+        self.assertNotIn("pwd", json.dumps(command))
+
+    def test_payloads_and_long_arguments_are_not_recorded(self):
+        os.environ["RECORD_MAX_ARGUMENT_LENGTH"] = "10"
+        server = self._reload_server()
+        asyncio.run(server.handle_call_tool("run_command", {"command": "cat", "stdin": "secret" * 100}))
+        asyncio.run(server.handle_call_tool("run_command", {"command": "cat " + "x" * 50}))
+        server.recorder.close()
+
+        records = read_records(self.record_file)
+        self.assertEqual(records[0]["arguments"]["stdin"], {"redacted": True, "length": 600})
+        self.assertEqual(
+            records[1]["arguments"]["command"], {"truncated": True, "length": 54, "prefix": "cat xxxxxx"}
+        )
+        self.assertNotIn("secret", json.dumps(records))
+
+        os.environ["RECORD_PAYLOADS"] = "true"
+        server = self._reload_server()
+        asyncio.run(server.handle_call_tool("run_command", {"command": "cat", "stdin": "hi"}))
+        server.recorder.close()
+        self.assertEqual(read_records(self.record_file)[-1]["arguments"]["stdin"], "hi")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import os
+import importlib
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+
+
+class TestCommandScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        from cli_mcp_server import scheduler
+
+        self.scheduler = scheduler
+
+    def tearDown(self):
+        os.environ.pop("DEADLINE_POLICY", None)
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("RUNTIME_ESTIMATES_FILE", None)
+        self.tempdir.cleanup()
+
+    def test_runtime_key(self):
+        runtime_key = self.scheduler.runtime_key
+        self.assertEqual(runtime_key("git", ["status", "-s"]), "git status")
+        self.assertEqual(runtime_key("cat", ["/tmp/foo.txt"]), "cat")
+        self.assertEqual(runtime_key("ls", ["-l"]), "ls")
+        self.assertEqual(runtime_key("/usr/bin/make", ["test"]), "make test")
+        self.assertEqual(runtime_key("make build && ls", []), "make build")
+
+    def test_estimates_decay_and_persist(self):
+        path = os.path.join(self.tempdir.name, "estimates.json")
+        estimator = self.scheduler.RuntimeEstimator(decay=0.5, path=path)
+        estimator.update("make", 10.0)
+        estimator.update("make", 2.0)
+        self.assertAlmostEqual(estimator.estimate("make"), 6.0)
+        self.assertIsNone(estimator.estimate("ls"))
+        estimator.save()
+
+        reloaded = self.scheduler.RuntimeEstimator(path=path)
+        self.assertAlmostEqual(reloaded.estimate("make"), 6.0)
+
+    def test_sjf_runs_shortest_expected_first(self):
+        estimator = self.scheduler.RuntimeEstimator()
+        estimator.update("slow", 100.0)
+        estimator.update("fast", 0.1)
+        scheduler = self.scheduler.CommandScheduler(
+            estimator, max_concurrent=1, policy="sjf", aging=0.0
+        )
+        order = []
+
+        async def main():
+            blocker = asyncio.create_task(scheduler.run("blocker", lambda: time.sleep(0.1)))
+            await asyncio.sleep(0.01)
+            queued = [
+                asyncio.create_task(scheduler.run(key, lambda key=key: order.append(key)))
+                for key in ["slow", "fast", "slow", "fast"]
+            ]
+            await asyncio.sleep(0.01)
+            self.assertEqual(scheduler.queued, 4)
+            await asyncio.gather(blocker, *queued)
+
+        asyncio.run(main())
+        self.assertEqual(order, ["fast", "fast", "slow", "slow"])
+        self.assertEqual(scheduler.running, 0)
+
+    def test_fifo_keeps_arrival_order(self):
+        estimator = self.scheduler.RuntimeEstimator()
+        estimator.update("slow", 100.0)
+        scheduler = self.scheduler.CommandScheduler(estimator, max_concurrent=1)
+        order = []
+
+        async def main():
+            blocker = asyncio.create_task(scheduler.run("blocker", lambda: time.sleep(0.05)))
+            await asyncio.sleep(0.01)
+            queued = []
+            for key in ["slow", "fast"]:
+                queued.append(
+                    asyncio.create_task(scheduler.run(key, lambda key=key: order.append(key)))
+                )
+                await asyncio.sleep(0)
+            await asyncio.gather(blocker, *queued)
+
+        asyncio.run(main())
+        self.assertEqual(order, ["slow", "fast"])
+
+    def test_cancelled_run_keeps_its_slot_until_the_worker_finishes(self):
+        scheduler = self.scheduler.CommandScheduler(self.scheduler.RuntimeEstimator(), max_concurrent=1)
+        stop = threading.Event()
+        active = []
+        peak = []
+
+        def work():
+            active.append(1)
+            peak.append(len(active))
+            stop.wait(5)
+            time.sleep(0.05)
+            active.pop()
+
+        async def main():
+            first = asyncio.create_task(scheduler.run("work", work, on_cancel=stop.set))
+            await asyncio.sleep(0.05)
+            second = asyncio.create_task(scheduler.run("work", work))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            self.assertTrue(stop.is_set())
+            # The cancelled worker is still running, so the second call waits
+            self.assertEqual(scheduler.running, 1)
+            self.assertEqual(scheduler.queued, 1)
+            await second
+
+        asyncio.run(main())
+        self.assertEqual(peak, [1, 1])
+        self.assertEqual(scheduler.running, 0)
+
+    def test_cancelling_run_command_kills_the_process(self):
+        os.environ["ALLOWED_COMMANDS"] = "sleep"
+        import cli_mcp_server.server as server_module
+
+        server = importlib.reload(server_module)
+
+        async def main():
+            task = asyncio.create_task(server.handle_call_tool("run_command", {"command": "sleep 30"}))
+            await asyncio.sleep(0.3)
+            self.assertEqual(server.scheduler.running, 1)
+            started = time.monotonic()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            while server.scheduler.running:
+                await asyncio.sleep(0.01)
+            self.assertLess(time.monotonic() - started, 5)
+
+        asyncio.run(main())
+
+    def test_deadline_rejection(self):
+        path = os.path.join(self.tempdir.name, "estimates.json")
+        estimator = self.scheduler.RuntimeEstimator(path=path)
+        estimator.update("pwd", 5.0)
+        estimator.save()
+        os.environ["RUNTIME_ESTIMATES_FILE"] = path
+        os.environ["DEADLINE_POLICY"] = "reject"
+        import cli_mcp_server.server as server_module
+
+        server = importlib.reload(server_module)
+        result = asyncio.run(
+            server.handle_call_tool("run_command", {"command": "pwd", "deadline_seconds": 1})
+        )
+        self.assertTrue(result[0].text.startswith("Rejected: Expected runtime of 'pwd'"))
+
+        result = asyncio.run(
+            server.handle_call_tool("run_command", {"command": "pwd", "deadline_seconds": 10})
+        )
+        self.assertEqual(result[0].text.strip(), self.tempdir.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
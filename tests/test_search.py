@@ -0,0 +1,165 @@
+import os
+import asyncio
+import importlib
+import tempfile
+import time
+import unittest
+
+from cli_mcp_server.ignore import IgnoreRules, parse_gitignore
+from cli_mcp_server.search import SearchIndex, required_literals
+from cli_mcp_server.watcher import get_watcher
+
+
+def _write(root, path, text):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class TestIgnoreRules(unittest.TestCase):
+    def test_patterns(self):
+        with tempfile.TemporaryDirectory() as root:
+            _write(root, ".gitignore", "*.log\n/build/\n!keep.log\nnode_modules\n")
+            _write(root, "sub/.gitignore", "*.tmp\n")
+            rules = IgnoreRules(root)
+            self.assertTrue(rules.is_ignored("app.log", False))
+            self.assertFalse(rules.is_ignored("keep.log", False))
+            self.assertTrue(rules.is_ignored("build", True))
+            self.assertFalse(rules.is_ignored("src/build", True))
+            self.assertTrue(rules.is_ignored("a/node_modules/x.js", False))
+            self.assertTrue(rules.is_ignored("sub/x.tmp", False))
+            self.assertFalse(rules.is_ignored("x.tmp", False))
+            self.assertTrue(rules.is_ignored(".git/config", False))
+
+    def test_double_star(self):
+        (regex, _, _), = parse_gitignore("docs/**/*.md")
+        self.assertTrue(regex.match("docs/a.md"))
+        self.assertTrue(regex.match("docs/a/b/c.md"))
+        self.assertFalse(regex.match("src/docs/a.md"))
+
+
+class TestRequiredLiterals(unittest.TestCase):
+    def test_literals(self):
+        self.assertEqual(required_literals(r"def \w+_handler\("), ["def ", "_handler("])
+        self.assertEqual(required_literals(r"(foo)+bar"), ["foo", "bar"])
+        self.assertEqual(required_literals(r"foo|bar"), [])
+        self.assertEqual(required_literals(r"x?abc"), ["abc"])
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(os.path.realpath(self.tempdir.name), "repo")
+        self.db = os.path.join(self.tempdir.name, "index", "search.db")
+        _write(self.root, ".gitignore", "ignored/\n")
+        _write(self.root, "src/app.py", "import os\n\ndef handle_request(req):\n    return req\n")
+        _write(self.root, "src/util.py", "def helper():\n    return 'Request'\n")
+        _write(self.root, "ignored/app.py", "def handle_request(): pass\n")
+        with open(os.path.join(self.root, "blob.bin"), "wb") as f:
+            f.write(b"handle_request\x00\x01")
+        self.index = None
+
+    def tearDown(self):
+        if self.index is not None:
+            self.index.close()
+        self.tempdir.cleanup()
+
+    def _index(self, watcher=None):
+        self.index = SearchIndex(self.root, self.db, watcher=watcher, workers=2)
+        self.assertTrue(self.index.ready.wait(10))
+        return self.index
+
+    def test_search_uses_index(self):
+        index = self._index()
+        result = index.search(r"handle_\w+\(")
+        self.assertTrue(result["indexed"])
+        self.assertEqual(
+            result["matches"], [{"path": "src/app.py", "line": 3, "text": "def handle_request(req):"}]
+        )
+        # Only the one candidate file containing the trigrams was read
+        self.assertEqual(result["files_searched"], 1)
+
+    def test_case_insensitive_glob_and_pagination(self):
+        index = self._index()
+        result = index.search("request", case_sensitive=False, limit=1)
+        self.assertEqual(len(result["matches"]), 1)
+        self.assertEqual(result["next_offset"], 1)
+        rest = index.search("request", case_sensitive=False, offset=1, limit=10)
+        self.assertEqual(
+            [(m["path"], m["line"]) for m in rest["matches"]],
+            [("src/util.py", 2)],
+        )
+        self.assertIsNone(rest["next_offset"])
+        only_util = index.search("request", case_sensitive=False, glob="util.*")
+        self.assertEqual({m["path"] for m in only_util["matches"]}, {"src/util.py"})
+
+    def test_fallback_scan_matches_index(self):
+        index = self._index()
+        indexed = index.search("return", path="src")
+        # Pretend the first build has not finished
+        index.ready.clear()
+        scanned = index.search("return", path="src")
+        self.assertTrue(indexed["indexed"])
+        self.assertFalse(scanned["indexed"])
+        self.assertEqual(scanned["matches"], indexed["matches"])
+
+    def test_invalid_pattern(self):
+        with self.assertRaises(ValueError):
+            self._index().search("(unclosed")
+
+    @unittest.skipIf(get_watcher() is None, "inotify is not available")
+    def test_incremental_updates(self):
+        index = self._index(get_watcher())
+        _write(self.root, "src/new.py", "needle_value = 1\n")
+        os.remove(os.path.join(self.root, "src", "util.py"))
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if index.search("needle_value")["matches"] and not index.search("helper")["matches"]:
+                break
+            time.sleep(0.05)
+        self.assertEqual(index.search("needle_value")["matches"][0]["path"], "src/new.py")
+        self.assertEqual(index.search("helper")["matches"], [])
+        self.assertEqual(index.search("helper")["files_searched"], 0)
+
+
+class TestSearchTool(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.workspace = os.path.join(self.tempdir.name, "workspace")
+        _write(self.workspace, "notes.txt", "alpha\nbeta\n")
+        os.environ["ALLOWED_DIR"] = self.workspace
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["NATIVE_TOOLS"] = "search"
+        os.environ["SEARCH_INDEX_DIR"] = os.path.join(self.tempdir.name, "index")
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        for index in self.server._search_indexes.values():
+            index.close()
+        os.environ.pop("NATIVE_TOOLS", None)
+        os.environ.pop("SEARCH_INDEX_DIR", None)
+        self.tempdir.cleanup()
+
+    def test_search(self):
+        content, structured = asyncio.run(
+            self.server.handle_call_tool("search", {"pattern": "be.a"})
+        )
+        self.assertTrue(content[0].text.startswith("notes.txt:2:beta"))
+        self.assertEqual(structured["matches"], [{"path": "notes.txt", "line": 2, "text": "beta"}])
+
+    def test_rejects_paths_outside_allowed_dir(self):
+        result = asyncio.run(
+            self.server.handle_call_tool("search", {"pattern": "root", "path": "/etc"})
+        )
+        self.assertIn("Security violation", result[0].text)
+
+
+if __name__ == "__main__":
+    unittest.main()
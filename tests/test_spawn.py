@@ -0,0 +1,109 @@
+import os
+import sys
+import asyncio
+import importlib
+import subprocess
+import tempfile
+import unittest
+
+from cli_mcp_server.process import run_process
+from cli_mcp_server.spawn import forkserver_popen, get_forkserver, load_spawner
+
+
+class TestForkServer(unittest.TestCase):
+    def _run(self, args, stdin=None, timeout=10, cwd=None):
+        stdout, stderr = bytearray(), bytearray()
+        returncode = run_process(
+            args,
+            cwd=cwd,
+            timeout=timeout,
+            stdin=stdin,
+            on_stdout=stdout.extend,
+            on_stderr=stderr.extend,
+            spawn=forkserver_popen,
+        )
+        return returncode, bytes(stdout), bytes(stderr)
+
+    def test_output_stdin_and_exit_status(self):
+        script = "import sys; data = sys.stdin.buffer.read(); sys.stdout.buffer.write(data); sys.stderr.write('e'); sys.exit(3)"
+        payload = os.urandom(1024 * 1024)
+        self.assertEqual(self._run([sys.executable, "-c", script], stdin=payload), (3, payload, b"e"))
+        with tempfile.TemporaryDirectory() as cwd:
+            self.assertEqual(self._run(["pwd"], cwd=cwd)[1].decode().strip(), os.path.realpath(cwd))
+
+    def test_environment_matches_subprocess(self):
+        get_forkserver()
+        os.environ["SPAWN_TEST_VARIABLE"] = "set after the helper started"
+        try:
+            environments = []
+            for spawn in (subprocess.Popen, forkserver_popen):
+                stdout = bytearray()
+                run_process(["env", "-0"], on_stdout=stdout.extend, on_stderr=lambda data: None, spawn=spawn)
+                variables = dict(line.split(b"=", 1) for line in bytes(stdout).split(b"\0")[:-1])
+                # Only os.environ is visible to the fork server, not variables set with os.putenv
+                environments.append({name: value for name, value in variables.items() if name.decode() in os.environ})
+            variable_count = len(os.environ)
+        finally:
+            del os.environ["SPAWN_TEST_VARIABLE"]
+        self.assertEqual(environments[0], environments[1])
+        self.assertEqual(environments[1][b"SPAWN_TEST_VARIABLE"], b"set after the helper started")
+        self.assertEqual(len(environments[1]), variable_count)
+
+    def test_shell(self):
+        stdout, stderr = bytearray(), bytearray()
+        run_process(
+            "echo $((1 + 2))", shell=True, on_stdout=stdout.extend, on_stderr=stderr.extend, spawn=forkserver_popen
+        )
+        self.assertEqual(bytes(stdout), b"3\n")
+
+    def test_timeout_kills_the_process(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self._run(["sleep", "5"], timeout=0.2)
+
+    def test_missing_command(self):
+        with self.assertRaises(FileNotFoundError):
+            self._run(["/nonexistent/command"])
+
+    def test_restarts_after_the_helper_exits(self):
+        server = get_forkserver()
+        server._helper.kill()
+        server._helper.wait()
+        server._reader.join(5)
+        self.assertFalse(server.alive)
+        self.assertEqual(self._run(["true"])[0], 0)
+        self.assertIsNot(get_forkserver(), server)
+
+    def test_load_spawner(self):
+        self.assertIs(load_spawner({}), subprocess.Popen)
+        self.assertIs(load_spawner({"SPAWN_BACKEND": "forkserver"}), forkserver_popen)
+        with self.assertRaises(ValueError):
+            load_spawner({"SPAWN_BACKEND": "vfork"})
+
+
+class TestServerWithForkServer(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ["ALLOWED_COMMANDS"] = "cat"
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["SPAWN_BACKEND"] = "forkserver"
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("SPAWN_BACKEND", None)
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        self.tempdir.cleanup()
+
+    def test_run_command(self):
+        result = asyncio.run(self.server.handle_call_tool("run_command", {"command": "cat", "stdin": "hi\n"}))
+        self.assertEqual(result[0].text, "hi\n")
+        self.assertIs(self.server.get_executors()["default"].spawn, forkserver_popen)
+
+
+if __name__ == "__main__":
+    unittest.main()
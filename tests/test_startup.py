@@ -0,0 +1,76 @@
+import os
+import sys
+import importlib
+import asyncio
+import subprocess
+import tempfile
+import unittest
+
+
+class TestLazyStartup(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_invalid_allowed_dir_is_reported_on_first_request(self):
+        os.environ["ALLOWED_DIR"] = os.path.join(self.tempdir.name, "missing")
+        import cli_mcp_server.server as server_module
+
+        server = importlib.reload(server_module)
+        self.assertIsNone(server._executors)
+        with self.assertRaisesRegex(ValueError, "Valid ALLOWED_DIR is required"):
+            asyncio.run(server.handle_call_tool("run_command", {"command": "pwd"}))
+
+    def test_executors_are_built_on_first_request(self):
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        import cli_mcp_server.server as server_module
+
+        server = importlib.reload(server_module)
+        self.assertIsNone(server._executors)
+        asyncio.run(server.handle_list_tools())
+        self.assertIn("default", server._executors)
+
+    def test_features_are_not_imported_at_startup(self):
+        env = dict(os.environ, ALLOWED_DIR=self.tempdir.name)
+        for name in ("HISTORY_DB", "PROFILE_DIR", "EXECUTOR_SOCKET", "NATIVE_TOOLS"):
+            env.pop(name, None)
+        modules = ["tarfile", "sqlite3", "ctypes", "tracemalloc"]
+        completed = subprocess.run(
+            [
+                sys.executable, "-c",
+                "import sys, cli_mcp_server.server; "
+                f"print(','.join(name for name in {modules!r} if name in sys.modules))",
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(completed.stdout.strip(), "")
+
+    def test_startup_profile_reports_phases(self):
+        env = dict(os.environ, ALLOWED_DIR=self.tempdir.name)
+        completed = subprocess.run(
+            [sys.executable, "-c", "import sys, cli_mcp_server; sys.argv[1:] = ['--startup-profile']; cli_mcp_server.main()"],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(completed.stdout, "")
+        self.assertIn("Startup profile:", completed.stderr)
+        for phase in ("import mcp", "build executors", "total"):
+            self.assertIn(phase, completed.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
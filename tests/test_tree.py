@@ -0,0 +1,179 @@
+import os
+import asyncio
+import importlib
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from cli_mcp_server import tree
+from cli_mcp_server.tree import TreeCache, list_tree, stat_path
+from cli_mcp_server.watcher import WatchEvent, get_watcher
+
+
+class TestTreeCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tempdir.name)
+        os.makedirs(os.path.join(self.root, "src", "pkg"))
+        os.makedirs(os.path.join(self.root, ".git"))
+        for path in ("README.md", "src/a.py", "src/b.py", "src/pkg/c.py"):
+            with open(os.path.join(self.root, path), "w") as f:
+                f.write("x" * 10)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_depth_and_order(self):
+        cache = TreeCache()
+        paths = [entry["path"] for entry in list_tree(cache, self.root, depth=1)["entries"]]
+        self.assertEqual(paths, [".git", "README.md", "src"])
+
+        listing = list_tree(cache, self.root, depth=3, include_hidden=False)
+        paths = [entry["path"] for entry in listing["entries"]]
+        self.assertEqual(paths, ["README.md", "src", "src/a.py", "src/b.py", "src/pkg", "src/pkg/c.py"])
+        self.assertEqual(listing["entries"][0], {
+            "path": "README.md",
+            "type": "file",
+            "size": 10,
+            "mtime": listing["entries"][0]["mtime"],
+        })
+
+    def test_pagination(self):
+        cache = TreeCache()
+        first = list_tree(cache, self.root, depth=3, limit=4)
+        self.assertEqual(len(first["entries"]), 4)
+        self.assertEqual(first["next_offset"], 4)
+        rest = list_tree(cache, self.root, depth=3, offset=first["next_offset"], limit=4)
+        self.assertEqual([entry["path"] for entry in rest["entries"]], ["src/b.py", "src/pkg", "src/pkg/c.py"])
+        self.assertIsNone(rest["next_offset"])
+
+    def test_symlinked_directories_are_not_followed(self):
+        os.symlink(os.path.join(self.root, "src"), os.path.join(self.root, "link"))
+        paths = [entry["path"] for entry in list_tree(TreeCache(), self.root, depth=3)["entries"]]
+        self.assertIn("link", paths)
+        self.assertFalse(any(path.startswith("link/") for path in paths))
+
+    def test_mtime_validation_without_watcher(self):
+        cache = TreeCache(max_dirs=2)
+        src = os.path.join(self.root, "src")
+        self.assertEqual(len(cache.listdir(src)), 3)
+        self.assertEqual(len(cache.listdir(src)), 3)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        open(os.path.join(src, "new.py"), "w").close()
+        stat = os.stat(src)
+        os.utime(src, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        self.assertEqual(len(cache.listdir(src)), 4)
+
+        cache.listdir(self.root)
+        cache.listdir(os.path.join(src, "pkg"))
+        self.assertEqual(len(cache), 2)
+
+    @unittest.skipIf(get_watcher() is None, "inotify is not available")
+    def test_inotify_invalidation(self):
+        cache = TreeCache(get_watcher())
+        try:
+            src = os.path.join(self.root, "src")
+            self.assertEqual(len(cache.listdir(src)), 3)
+            self.assertTrue(get_watcher().is_watched(src))
+            open(os.path.join(src, "new.py"), "w").close()
+            deadline = time.monotonic() + 5
+            while len(cache) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(cache.listdir(src)), 4)
+        finally:
+            cache.close()
+        self.assertFalse(get_watcher().is_watched(src))
+
+    def test_change_during_scan_is_not_cached(self):
+        class FakeWatcher:
+            def subscribe(self, callback):
+                return lambda: None
+
+            def add(self, directory):
+                return True
+
+            def remove(self, directory):
+                pass
+
+        cache = TreeCache(FakeWatcher())
+        src = os.path.join(self.root, "src")
+        scan = tree._scan
+
+        def scan_then_change(directory):
+            entries = scan(directory)
+            new_file = os.path.join(directory, "new.py")
+            open(new_file, "w").close()
+            cache._on_event(WatchEvent(path=new_file, kind="created"))
+            return entries
+
+        with mock.patch.object(tree, "_scan", scan_then_change):
+            self.assertEqual(len(cache.listdir(src)), 3)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(len(cache.listdir(src)), 4)
+        self.assertEqual(len(cache.listdir(src)), 4)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_stat_path(self):
+        info = stat_path(os.path.join(self.root, "README.md"))
+        self.assertEqual(info["type"], "file")
+        self.assertEqual(info["size"], 10)
+        self.assertTrue(info["mode"].startswith("-"))
+
+
+class TestListDirTools(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["ALLOWED_DIR"] = self.tempdir.name
+        os.environ.pop("ALLOWED_COMMANDS", None)
+        os.environ.pop("ALLOWED_FLAGS", None)
+        os.environ.pop("ALLOW_SHELL_OPERATORS", None)
+        os.environ.pop("SHELL_EXEC", None)
+        os.environ.pop("SHELL_EXEC_ARGS", None)
+        os.environ["NATIVE_TOOLS"] = "list_dir,stat"
+        os.makedirs(os.path.join(self.tempdir.name, "docs"))
+        with open(os.path.join(self.tempdir.name, "docs", "guide.md"), "w") as f:
+            f.write("guide")
+        import cli_mcp_server.server as server_module
+
+        self.server = importlib.reload(server_module)
+
+    def tearDown(self):
+        os.environ.pop("NATIVE_TOOLS", None)
+        self.server.get_tree_cache().close()
+        self.tempdir.cleanup()
+
+    def test_list_dir(self):
+        content, structured = asyncio.run(
+            self.server.handle_call_tool("list_dir", {"depth": 2})
+        )
+        self.assertEqual(content[0].text, "docs/\ndocs/guide.md (5 bytes)")
+        self.assertEqual([entry["path"] for entry in structured["entries"]], ["docs", "docs/guide.md"])
+        self.assertIsNone(structured["next_offset"])
+
+    def test_stat(self):
+        content, structured = asyncio.run(
+            self.server.handle_call_tool("stat", {"path": "docs/guide.md"})
+        )
+        self.assertEqual(structured["type"], "file")
+        self.assertIn('"size": 5', content[0].text)
+
+    def test_stat_does_not_follow_a_final_symlink(self):
+        os.symlink("docs/guide.md", os.path.join(self.tempdir.name, "link"))
+        os.symlink("/etc/passwd", os.path.join(self.tempdir.name, "outside"))
+        for name, target in (("link", "docs/guide.md"), ("outside", "/etc/passwd")):
+            content, structured = asyncio.run(self.server.handle_call_tool("stat", {"path": name}))
+            self.assertEqual((structured["type"], structured["target"]), ("symlink", target))
+        content, structured = asyncio.run(self.server.handle_call_tool("stat", {"path": self.tempdir.name}))
+        self.assertEqual(structured["type"], "dir")
+
+    def test_rejects_paths_outside_allowed_dir(self):
+        for tool in ("list_dir", "stat"):
+            for path in ("../..", "../x", "/etc/passwd"):
+                result = asyncio.run(self.server.handle_call_tool(tool, {"path": path}))
+                self.assertIn("Security violation", result[0].text)
+
+
+if __name__ == "__main__":
+    unittest.main()
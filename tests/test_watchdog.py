@@ -0,0 +1,46 @@
+import asyncio
+import time
+import unittest
+
+from cli_mcp_server.metrics import MetricsRegistry
+from cli_mcp_server.watchdog import LoopWatchdog
+
+
+def slow_synchronous_step():
+    time.sleep(0.5)
+
+
+class TestLoopWatchdog(unittest.TestCase):
+    def _run(self, watchdog, blocking):
+        async def run():
+            watchdog.start()
+            await asyncio.sleep(0.1)
+            if blocking:
+                slow_synchronous_step()
+            await asyncio.sleep(0.2)
+            watchdog.stop()
+
+        asyncio.run(run())
+
+    def test_captures_the_blocking_stack(self):
+        metrics = MetricsRegistry()
+        watchdog = LoopWatchdog(metrics, interval=0.02, threshold=0.2)
+        self._run(watchdog, blocking=True)
+        self.assertEqual(len(watchdog.stalls), 1)
+        self.assertIn("slow_synchronous_step", watchdog.stalls[0].stack)
+        self.assertGreaterEqual(watchdog.stalls[0].duration_ms, 400)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["event_loop_stalls_total"], 1)
+        self.assertGreaterEqual(snapshot["histograms"]["event_loop_lag_ms"]["max"], 400)
+        self.assertEqual(snapshot["histograms"]["event_loop_stall_ms"]["count"], 1)
+
+    def test_idle_loop_has_no_stalls(self):
+        metrics = MetricsRegistry()
+        watchdog = LoopWatchdog(metrics, interval=0.02, threshold=0.2)
+        self._run(watchdog, blocking=False)
+        self.assertEqual(len(watchdog.stalls), 0)
+        self.assertGreater(metrics.snapshot()["histograms"]["event_loop_lag_ms"]["count"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()